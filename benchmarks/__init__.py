@@ -0,0 +1 @@
+from .generator import DIALECTS, generate_result, generate_rows, format_rows
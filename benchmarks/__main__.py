@@ -0,0 +1,179 @@
+"""Time the parse of synthetic Splunk search results and write the results as JSON.
+
+Example:
+python -m benchmarks --output bench_output.txt
+python -m benchmarks --baseline bench_output.txt --threshold 0.1
+python -m benchmarks --crossover
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from splunk_format_parser import Engine, Format
+from splunk_format_parser import splunk_format_parser as parser_module
+
+from .generator import DIALECTS, generate_result
+
+SCENARIOS = {
+    'small': dict(rows=1000, columns=10),
+    'large': dict(rows=50000, columns=10),
+    'wide': dict(rows=5000, columns=60),
+    'long_values': dict(rows=5000, columns=10, value_length=256),
+    'multivalue': dict(rows=10000, columns=10, multivalue_ratio=0.5),
+    'escaped': dict(rows=10000, columns=10, escape_density=0.05),
+    'csv_escaped': dict(rows=10000, columns=10, escape_density=0.05, dialect='csv'),
+    'brackets': dict(rows=10000, columns=10, dialect='brackets'),
+}
+
+FORMATS = (Format.FLAT_JSON, Format.JSON, Format.CSV)
+
+CROSSOVER_ROWS = (1, 2, 5, 10, 20, 50, 100, 1000, 10000, 100000)
+
+
+def run_scenario(name, settings, formats, repeat, engine=Engine.SLICE):
+    settings = dict(settings)
+    dialect = DIALECTS[settings.pop('dialect', 'default')]
+    result = generate_result(dialect=dialect, **settings)
+    size = len(result.encode())
+    results = []
+    for format in formats:
+        seconds = min(_time_parse(result, dialect, format, engine) for _ in range(repeat))
+        results.append({
+            'scenario': name,
+            'format': format.value,
+            'rows': settings['rows'],
+            'bytes': size,
+            'seconds': seconds,
+            'mb_per_s': size / seconds / 1e6,
+            'rows_per_s': settings['rows'] / seconds,
+            'peak_memory': _peak_memory(result, dialect, format, engine),
+        })
+    return results
+
+
+def run_crossover(rows, repeat):
+    """Time Engine.SLICE and Engine.PRESCAN on results of growing size. The
+    prescan is used from the first size on, instead of only from
+    _PRESCAN_MIN_LENGTH, so that the size it starts to pay off at shows."""
+    min_length = parser_module._PRESCAN_MIN_LENGTH
+    parser_module._PRESCAN_MIN_LENGTH = 0
+    try:
+        results = []
+        for count in rows:
+            result = generate_result(rows=count, columns=10)
+            number = max(1, 1000 // count)
+            seconds = {engine: min(_time_parse(result, DIALECTS['default'], Format.FLAT_JSON,
+                                               engine, number) for _ in range(repeat))
+                       for engine in (Engine.SLICE, Engine.PRESCAN)}
+            results.append({
+                'rows': count,
+                'bytes': len(result.encode()),
+                'slice_seconds': seconds[Engine.SLICE],
+                'prescan_seconds': seconds[Engine.PRESCAN],
+                'speedup': seconds[Engine.SLICE] / seconds[Engine.PRESCAN],
+            })
+        return results
+    finally:
+        parser_module._PRESCAN_MIN_LENGTH = min_length
+
+
+def compare(results, baseline, threshold):
+    baseline = {(result['scenario'], result['format']): result
+                for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = baseline.get((result['scenario'], result['format']))
+        if before and result['seconds'] > before['seconds'] * (1 + threshold):
+            regressions.append((result, before))
+    return regressions
+
+
+def _time_parse(result, dialect, format, engine=Engine.SLICE, number=1):
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(number):
+        dialect.parse(result, format=format, engine=engine)
+    return (time.perf_counter() - start) / number
+
+
+def _peak_memory(result, dialect, format, engine=Engine.SLICE):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        dialect.parse(result, format=format, engine=engine)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run, all scenarios if not given')
+    parser.add_argument('--format', action='append', choices=[f.value for f in FORMATS],
+                        help='format to parse into, all formats if not given')
+    parser.add_argument('--engine', choices=[e.value for e in Engine], default='slice',
+                        help='scanning engine to parse with')
+    parser.add_argument('--crossover', action='store_true',
+                        help='time Engine.SLICE against Engine.PRESCAN on growing results '
+                             'instead of running the scenarios')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed parses, the fastest is kept')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare to')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown over the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    if args.crossover:
+        return _report_crossover(run_crossover(CROSSOVER_ROWS, args.repeat), args.output)
+
+    formats = [Format(value) for value in args.format] if args.format else FORMATS
+    results = []
+    for name in args.scenario or SCENARIOS:
+        for result in run_scenario(name, SCENARIOS[name], formats, args.repeat,
+                                   Engine(args.engine)):
+            print('%-12s %-10s %8.1f MB/s %10.0f rows/s %8.1f MB peak' % (
+                result['scenario'], result['format'], result['mb_per_s'],
+                result['rows_per_s'], result['peak_memory'] / 1e6))
+            results.append(result)
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        for result, before in regressions:
+            print('regression: %s %s %.3fs -> %.3fs' % (
+                result['scenario'], result['format'], before['seconds'],
+                result['seconds']))
+        return 1 if regressions else 0
+    return 0
+
+
+def _report_crossover(results, output):
+    for result in results:
+        print('%8d rows %12d bytes %10.1f us slice %10.1f us prescan %6.2fx' % (
+            result['rows'], result['bytes'], result['slice_seconds'] * 1e6,
+            result['prescan_seconds'] * 1e6, result['speedup']))
+    faster = [result['bytes'] for result in results if result['speedup'] > 1]
+    print('prescan is faster from %s bytes on' % (faster[0] if faster else 'no size'))
+    if output:
+        with open(output, 'w') as file:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'crossover': results}, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import random
+
+from splunk_format_parser import Dialect, SplunkFormatParser
+
+DIALECTS = {
+    'default': SplunkFormatParser.compile(),
+    'csv': Dialect.for_output_mode('csv'),
+    'brackets': SplunkFormatParser.compile('[', '[', '&&', ']', '||', ']'),
+}
+
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ./:-_()'
+
+
+def generate_rows(rows: int = 1000,
+                  columns: int = 10,
+                  multivalue_ratio: float = 0.0,
+                  value_length: int = 16,
+                  escape_density: float = 0.0,
+                  escape_char: str = '\\',
+                  seed: int = 0) -> list:
+    """Generate rows of random Splunk search results.
+
+    Every other field has a dotted key, e.g. 'group1.field3', so that the rows
+    nest with Format.JSON.
+
+    Args:
+        rows (int, optional): The number of rows. Defaults to 1000.
+        columns (int, optional): The number of fields per row. Defaults to 10.
+        multivalue_ratio (float, optional): The share of fields that hold two or
+            three values instead of one. Defaults to 0.0.
+        value_length (int, optional): The number of characters per value.
+            Defaults to 16.
+        escape_density (float, optional): The share of value characters that are
+            double quotes or escape characters, which have to be escaped.
+            Defaults to 0.0.
+        escape_char (str, optional): The escape character of the dialect the rows
+            are formatted with. Defaults to '\\'.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+
+    Returns:
+        List: One dict per row, the same as Format.FLAT_JSON returns.
+    """
+
+    rand = random.Random(seed)
+    keys = ['field%d' % column if column % 2 == 0
+            else 'group%d.field%d' % (column % 3, column) for column in range(columns)]
+    specials = '"' + escape_char
+
+    def value():
+        return ''.join(rand.choice(specials) if rand.random() < escape_density
+                       else rand.choice(_ALPHABET) for _ in range(value_length))
+
+    results = []
+    for _ in range(rows):
+        row = {}
+        for key in keys:
+            if rand.random() < multivalue_ratio:
+                row[key] = [value() for _ in range(rand.randint(2, 3))]
+            else:
+                row[key] = value()
+        results.append(row)
+    return results
+
+
+def format_rows(rows: list, dialect: Dialect = DIALECTS['default']) -> str:
+    """Format rows the way the Splunk format command does, see
+    SplunkFormatParser.format.
+
+    Args:
+        rows (list): Rows as returned by Format.FLAT_JSON.
+        dialect (Dialect, optional): The delimiter and escape settings to format
+            the rows with. Defaults to the default dialect of parse.
+
+    Returns:
+        Str: The Splunk search result string of the rows.
+    """
+
+    return dialect.format(rows)
+
+
+def generate_result(rows: int = 1000,
+                    columns: int = 10,
+                    multivalue_ratio: float = 0.0,
+                    value_length: int = 16,
+                    escape_density: float = 0.0,
+                    dialect: Dialect = DIALECTS['default'],
+                    seed: int = 0) -> str:
+    """Generate a random Splunk search result string, see generate_rows for the
+    arguments.
+
+    Returns:
+        Str: The Splunk search result string.
+    """
+
+    return format_rows(generate_rows(rows, columns, multivalue_ratio, value_length,
+                                     escape_density, dialect.escape_char, seed),
+                       dialect)
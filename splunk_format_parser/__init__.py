@@ -1,5 +1,20 @@
 from .splunk_format_parser import (
     SplunkFormatParser,
     SplunkFormatParserException,
-    Format
+    Format,
+    Engine,
+    RowType,
+    ColumnType,
+    ValueType,
+    ConversionErrors,
+    ParseErrors,
+    Dialect,
+    Interner,
+    Row,
+    NestedRow,
+    ParseStats,
+    ParseResult,
+    ParseError,
+    ResultCache,
+    IncrementalParser
 )
\ No newline at end of file
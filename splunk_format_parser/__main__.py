@@ -0,0 +1,333 @@
+"""Parse files of Splunk search result strings from format commands and write
+their rows as NDJSON, CSV or nested JSON.
+
+Example:
+python -m splunk_format_parser 'saved/*.txt' --to csv --output-dir parsed --jobs 8
+python -m splunk_format_parser - --output-mode csv < result.txt > rows.ndjson
+"""
+
+import argparse
+import codecs
+import glob
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from .splunk_format_parser import (
+    Dialect,
+    Format,
+    IncrementalParser,
+    SplunkFormatParser,
+    SplunkFormatParserException
+)
+
+OUTPUTS = {'ndjson': '.ndjson', 'csv': '.csv', 'json': '.json'}
+
+# The bytes of stdin read at a time.
+_STDIN_CHUNK = 1 << 16
+
+DIALECT_OPTIONS = ('row_prefix', 'column_prefix', 'column_separator', 'column_end',
+                   'row_separator', 'row_end', 'mvsep', 'emptystr', 'escape_char')
+
+
+def convert_file(path, to, output, dialect, encoding='utf-8', fields=None,
+                 partial=False):
+    """Parse one file, '-' for stdin, and write its rows. Files are memory mapped
+    as parse_file does and stdin is parsed in chunks as it is read. Line breaks
+    at the end of the input are ignored.
+
+    Args:
+        path (str): The file to parse.
+        to (str): The output format, one of OUTPUTS.
+        output (str): The file to write the rows to. They are written to a
+            '.part' file first, which replaces output once the whole file has
+            been parsed. The rows are written to stdout as they are parsed if
+            not given, so rows before an error in the file are written too.
+        dialect (Dialect): The delimiter and escape settings of the file.
+        encoding (str, optional): The encoding of the file. Defaults to 'utf-8'.
+        fields (list, optional): The only fields to parse, see parse.
+        partial (bool, optional): Write the rows to output as they are parsed
+            and keep them if the file fails, as on stdout. Defaults to False.
+
+    Returns:
+        Dict: The path, rows written, bytes, seconds and error of the file.
+    """
+
+    start = time.perf_counter()
+    summary = {'path': path, 'rows': 0, 'bytes': 0, 'seconds': 0.0, 'error': None}
+    try:
+        with _read_input(path, encoding) as (data, size):
+            # Errors are handled before the file is unmapped, as the traceback
+            # of a parse error keeps a view of the file open.
+            try:
+                _convert(data, to, output, dialect, encoding, fields, partial, summary)
+            except (SplunkFormatParserException, OSError, UnicodeError) as error:
+                summary['error'] = str(error)
+            summary['bytes'] = size if size is not None else data.size
+    except OSError as error:
+        summary['error'] = str(error)
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _convert(data, to, output, dialect, encoding, fields, partial, summary):
+    def written(row):
+        summary['rows'] += 1
+
+    if output is None:
+        try:
+            write_rows(data, to, sys.stdout, dialect, encoding, fields, written)
+        finally:
+            sys.stdout.flush()
+        return
+    if partial:
+        with open(output, 'w', newline='', encoding='utf-8') as out_file:
+            write_rows(data, to, out_file, dialect, encoding, fields, written)
+        return
+    part = output + '.part'
+    try:
+        with open(part, 'w', newline='', encoding='utf-8') as out_file:
+            write_rows(data, to, out_file, dialect, encoding, fields, written)
+        os.replace(part, output)
+    except BaseException:
+        # None of the rows are left in output.
+        summary['rows'] = 0
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+@contextmanager
+def _read_input(path, encoding):
+    # Yields the result without its trailing line breaks, which saved results
+    # usually end with, and the size of the input in bytes, or None for stdin,
+    # whose reader counts the bytes it has read. A file is mapped and passed on
+    # as a memoryview, which parse scans in place.
+    if path == '-':
+        yield _StdinReader(sys.stdin.buffer, encoding), None
+        return
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b'', 0
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            end = len(buffer)
+            while end and buffer[end - 1] in b'\r\n':
+                end -= 1
+            with memoryview(buffer) as view, view[:end] as data:
+                yield data, len(buffer)
+
+
+class _StdinReader:
+    """Reads the text of a binary stream a chunk at a time. Line breaks at the
+    end of a chunk are held back until text follows them, so the line breaks at
+    the end of the stream are left out."""
+
+    def __init__(self, stream, encoding):
+        self.size = 0
+        self._stream = stream
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._pending = ''
+        self._done = False
+
+
+    def read(self, size=-1):
+        while not self._done:
+            data = self._stream.read(_STDIN_CHUNK)
+            self.size += len(data)
+            self._done = not data
+            text = self._pending + self._decoder.decode(data, final=self._done)
+            chunk = text.rstrip('\r\n')
+            self._pending = text[len(chunk):]
+            if chunk:
+                return chunk
+        return ''
+
+
+def write_rows(data, to, out_file, dialect, encoding='utf-8', fields=None,
+               on_row=None):
+    """Parse a result, or a readable text file in chunks, and write its rows to
+    out_file as they are parsed. on_row is called with every row once it is
+    written.
+
+    Returns:
+        Int: The number of rows written.
+    """
+
+    if to == 'csv':
+        return dialect.write_csv(data, out_file, fields=fields, encoding=encoding,
+                                 on_row=on_row)
+
+    format = Format.JSON if to == 'json' else Format.FLAT_JSON
+    if hasattr(data, 'read'):
+        rows = _iter_chunks(data, format, dialect, fields)
+    else:
+        rows = dialect.iter_parse(data, format=format, encoding=encoding, fields=fields)
+    count = 0
+    if to == 'ndjson':
+        for row in rows:
+            out_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+            if on_row is not None:
+                on_row(row)
+        return count
+
+    out_file.write('[')
+    for row in rows:
+        out_file.write((',\n' if count else '\n') + json.dumps(row, ensure_ascii=False))
+        count += 1
+        if on_row is not None:
+            on_row(row)
+    out_file.write('\n]\n' if count else ']\n')
+    return count
+
+
+def _iter_chunks(reader, format, dialect, fields):
+    parser = IncrementalParser(format=format, dialect=dialect, fields=fields)
+    for chunk in iter(reader.read, ''):
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def expand_paths(patterns):
+    """Expand glob patterns into file paths in order, without duplicates.
+
+    Returns:
+        Tuple: The paths, and the patterns that matched no file.
+    """
+
+    paths, unmatched = {}, []
+    for pattern in patterns:
+        if pattern == '-':
+            matches = ['-']
+        else:
+            matches = sorted(path for path in glob.glob(pattern, recursive=True)
+                             if os.path.isfile(path))
+        if not matches:
+            unmatched.append(pattern)
+        paths.update(dict.fromkeys(matches))
+    return list(paths), unmatched
+
+
+def output_path(path, output_dir, to):
+    """The file in output_dir that the rows of path are written to."""
+    name = 'stdin' if path == '-' else os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, name + OUTPUTS[to])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m splunk_format_parser',
+                                     description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=['-'],
+                        help="files or glob patterns to parse, '-' for stdin, "
+                             "stdin if not given")
+    parser.add_argument('--to', choices=sorted(OUTPUTS), default='ndjson',
+                        help='output format: one flat row per line, CSV, or a JSON '
+                             'list of nested rows, defaults to ndjson')
+    parser.add_argument('--output-dir',
+                        help='directory to write one output file per input file to, '
+                             'stdout if not given, which takes several input files '
+                             'only with --to ndjson')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of processes to parse files with')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of the files')
+    parser.add_argument('--field', action='append', dest='fields',
+                        help='field to parse, all fields if not given')
+    parser.add_argument('--output-mode', choices=('json', 'csv'),
+                        help='Splunk search API output mode the files were saved '
+                             'from, instead of the delimiter options')
+    for option in DIALECT_OPTIONS:
+        parser.add_argument('--' + option.replace('_', '-'),
+                            help='%s of parse' % option)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.output_mode:
+            dialect = Dialect.for_output_mode(args.output_mode)
+        else:
+            dialect = SplunkFormatParser.compile(**{
+                option: getattr(args, option) for option in DIALECT_OPTIONS
+                if getattr(args, option) is not None})
+    except SplunkFormatParserException as error:
+        parser.error(str(error))
+
+    paths, unmatched = expand_paths(args.paths)
+    for pattern in unmatched:
+        print('error: %s: no files match' % pattern, file=sys.stderr)
+
+    outputs = dict.fromkeys(paths)
+    if not args.output_dir and args.to != 'ndjson' and len(paths) > 1:
+        # One JSON list or CSV header per file would not make one valid output.
+        parser.error('several input files can only be written to stdout as ndjson, '
+                     'use --output-dir for --to %s' % args.to)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        outputs = {path: output_path(path, args.output_dir, args.to) for path in paths}
+        if len(set(outputs.values())) < len(outputs):
+            parser.error('input files with the same name would be written to the '
+                         'same output file')
+
+    start = time.perf_counter()
+    totals = {'files': 0, 'rows': 0, 'bytes': 0, 'errors': len(unmatched)}
+    convert = [(path, args.to, outputs[path], dialect, args.encoding, args.fields)
+               for path in paths]
+    if args.jobs > 1 and len(paths) > 1:
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                ProcessPoolExecutor(args.jobs) as executor:
+            futures = {}
+            for index, arguments in enumerate(convert):
+                if arguments[0] == '-':
+                    continue
+                if arguments[2] is None:
+                    # Workers write the rows for stdout to a file of their own,
+                    # which is copied to stdout once the file is parsed, also
+                    # the rows before an error, as in-process files do.
+                    output = os.path.join(temp_dir, '%d%s' % (index, OUTPUTS[args.to]))
+                    arguments = arguments[:2] + (output,) + arguments[3:] + (True,)
+                    futures[executor.submit(convert_file, *arguments)] = output
+                else:
+                    futures[executor.submit(convert_file, *arguments)] = None
+            for arguments in convert:
+                if arguments[0] == '-':
+                    _report(convert_file(*arguments), totals)
+            for future in as_completed(futures):
+                _report(future.result(), totals, futures[future])
+    else:
+        for arguments in convert:
+            _report(convert_file(*arguments), totals)
+
+    seconds = time.perf_counter() - start
+    print('%d files, %d rows, %.1f MB in %.2fs (%.1f MB/s, %.0f rows/s), %d errors' % (
+        totals['files'], totals['rows'], totals['bytes'] / 1e6, seconds,
+        totals['bytes'] / seconds / 1e6 if seconds else 0.0,
+        totals['rows'] / seconds if seconds else 0.0, totals['errors']),
+        file=sys.stderr)
+    return 1 if totals['errors'] else 0
+
+
+def _report(summary, totals, output=None):
+    # output is the file a worker wrote the rows for stdout to.
+    if output is not None and os.path.exists(output):
+        with open(output, newline='', encoding='utf-8') as rows:
+            shutil.copyfileobj(rows, sys.stdout)
+        os.remove(output)
+        sys.stdout.flush()
+    # The rows written before an error count as well.
+    totals['rows'] += summary['rows']
+    if summary['error'] is not None:
+        print('error: %s: %s' % (summary['path'], summary['error']), file=sys.stderr)
+        totals['errors'] += 1
+        return
+    totals['files'] += 1
+    totals['bytes'] += summary['bytes']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,67 @@
+import asyncio
+import codecs
+import csv
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
 from enum import Enum
+from functools import lru_cache, partial
+from itertools import chain, islice
+from typing import IO, AsyncIterator, Callable, Iterable, Iterator, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Format(Enum):
     FLAT_JSON = 'flat.json'
     JSON = 'json'
     CSV= 'csv'
+    COLUMNAR = 'columnar'
+
+class Engine(Enum):
+    SLICE = 'slice'
+    ITERATOR = 'iterator'
+    PRESCAN = 'prescan'
+
+class RowType(Enum):
+    DICT = 'dict'
+    COMPACT = 'compact'
+    LAZY = 'lazy'
+
+class ColumnType(Enum):
+    LIST = 'list'
+    ARRAY = 'array'
+    NUMPY = 'numpy'
+
+class ValueType(Enum):
+    STR = 'str'
+    INT = 'int'
+    FLOAT = 'float'
+    BOOL = 'bool'
+    TIME = 'time'
+
+class ConversionErrors(Enum):
+    RAISE = 'raise'
+    STR = 'str'
+
+class ParseErrors(Enum):
+    RAISE = 'raise'
+    SKIP = 'skip'
+    COLLECT = 'collect'
 
 class SplunkFormatParserException(Exception):
     pass
@@ -12,7 +70,7 @@ class SplunkFormatParser:
     
     @classmethod
     def parse(cls,
-              result: str,
+              result: Union[str, bytes],
               row_prefix: str = '(',
               column_prefix: str ='(',
               column_separator: str ='AND',
@@ -22,7 +80,27 @@ class SplunkFormatParser:
               mvsep: str ='OR',
               emptystr: str ='NOT()',
               escape_char: str ='\\',
-              format: Format = Format.FLAT_JSON) -> list:
+              format: Format = Format.FLAT_JSON,
+              engine: Engine = Engine.SLICE,
+              encoding: str = 'utf-8',
+              dialect: 'Dialect' = None,
+              workers: int = 1,
+              fields: list = None,
+              exclude: list = None,
+              interner: 'Interner' = None,
+              row_type: RowType = RowType.DICT,
+              stats: Union[bool, Callable] = False,
+              on_row: Callable = None,
+              cache: 'ResultCache' = None,
+              types: dict = None,
+              infer_types: Union[bool, int] = False,
+              conversion_errors: ConversionErrors = ConversionErrors.RAISE,
+              errors: Union[ParseErrors, Callable] = ParseErrors.RAISE,
+              index_by: list = None,
+              distinct: list = None,
+              executor: Executor = None,
+              column_type: ColumnType = ColumnType.LIST
+              ) -> Union[list, 'ParseResult']:
         """Parse Splunk search result string from a format command into list.
 
         Example:
@@ -41,7 +119,10 @@ class SplunkFormatParser:
         5. Escape character only escape itself or '"' in field value.
 
         Args:
-            result (str): Splunk search result string to parse.
+            result (str, bytes): Splunk search result string to parse. A bytes-like
+                result, such as bytes, memoryview or mmap, is scanned byte by byte
+                and only the keys and values are decoded. Character offsets in
+                errors then count bytes.
             row_prefix (str, optional): The value to use for the row prefix.
                 Defaults to '('.
             column_prefix (str, optional): The value to use for the column prefix. 
@@ -63,241 +144,3732 @@ class SplunkFormatParser:
             escape_char (str, optional): The value to use to escape double quotes in
                 values. Defaults to '\'.
             format (Format, optional): The format of the parsed Splunk search result.
+                Format.COLUMNAR returns a dict with one list of values per field,
+                filled in as the rows are parsed. Rows without a field hold None
+                in its list. A field with multivalues in any row is returned as a
+                dict of 'values', all of its values in row order, and 'offsets',
+                an array where the values of row i are values[offsets[i]:offsets[i + 1]].
+            engine (Engine, optional): The scanning engine to use. Engine.SLICE jumps
+                between delimiters and slices keys and values out of the string,
+                Engine.ITERATOR reads the string one character at a time.
+                Engine.PRESCAN finds the quotes of a large result with NumPy
+                first and builds the rows from the text between them; it parses
+                like Engine.SLICE if NumPy is not installed, for results shorter
+                than 4 KiB, and with stats, on_row, errors other than
+                'raise', index_by or distinct. Defaults to Engine.SLICE. A
+                bytes-like result is scanned with Engine.SLICE unless
+                Engine.PRESCAN is given.
+            encoding (str, optional): The encoding of a bytes-like result. It has to
+                encode the delimiters and the escape character the same way as
+                ASCII does. Defaults to 'utf-8'.
+            dialect (Dialect, optional): Delimiter and escape settings prepared by
+                compile. Replaces row_prefix, column_prefix, column_separator,
+                column_end, row_separator, row_end, mvsep, emptystr and escape_char.
+            workers (int, optional): The number of processes to parse the result with.
+                The result is split into pieces at the row separators between rows,
+                outside of any quoted value, and the pieces are parsed in a process
+                pool. Defaults to 1.
+            fields (list, optional): The only fields to parse. The values of any
+                other field, including whole multivalue fields, are skipped over
+                without being unescaped. All fields are parsed if not given.
+            exclude (list, optional): Fields to skip over in the same way.
+            interner (Interner, optional): Shares one string object between equal
+                values and counts the shared values. Keys are always shared.
+            row_type (RowType, optional): RowType.COMPACT returns each row of
+                Format.FLAT_JSON as a Row, which holds a tuple of values and a key
+                index shared by all rows with the same keys in the same order.
+                RowType.LAZY returns each row of Format.JSON as a NestedRow, which
+                keeps the flat row and only nests a sub-tree when it is accessed.
+                Either the enum or its value, e.g. 'compact'. Defaults to
+                RowType.DICT.
+            stats (bool, callable, optional): Collect ParseStats of the parse. If
+                True, a ParseResult holding the parsed result and the stats is
+                returned. If a callable, it is called with the stats and the parsed
+                result is returned as usual. Defaults to False.
+            on_row (callable, optional): Called with every row as soon as it is
+                parsed, before any format conversion. Not called for
+                Format.COLUMNAR.
+            cache (ResultCache, optional): Returns a copy of the kept result if the
+                same result string was parsed with the same dialect, format and
+                field and type options before, and keeps the result otherwise. Not
+                used if stats, on_row or a callable errors is given, as they need
+                a parse, if a ParseResult is returned, or if types has a callable,
+                which cannot be told apart from another.
+            types (dict, optional): The type to convert the values of a field to
+                while they are parsed, by flat key. Either a ValueType, its value,
+                e.g. 'int', or a callable taking the value string. ValueType.BOOL
+                accepts true, false, 1 and 0, and ValueType.TIME epoch seconds such
+                as _time or ISO 8601 strings, which are taken as UTC if they have
+                no offset. Every value of a multivalue field is converted. Values
+                are kept as strings if not given.
+            infer_types (bool, int, optional): Infer the types of the fields that
+                are not in types from their values in the first rows, 100 rows if
+                True or the given number of rows. A field is inferred as the first
+                of ValueType.INT, FLOAT, BOOL and TIME that all of its sampled
+                values convert to, or kept as strings. _time is tried as
+                ValueType.TIME first. Later values that do not convert are
+                handled by conversion_errors. Defaults to False.
+            conversion_errors (ConversionErrors, optional): ConversionErrors.RAISE
+                raises a SplunkFormatParserException at the value that cannot be
+                converted, ConversionErrors.STR keeps it as a string. Either the
+                enum or its value. Defaults to ConversionErrors.RAISE.
+            errors (ParseErrors, callable, optional): ParseErrors.RAISE raises a
+                SplunkFormatParserException at the first malformed row.
+                ParseErrors.SKIP skips a malformed row, and any rows after it that
+                do not parse either, up to the next row separator from which a
+                row parses, or the end of the result. ParseErrors.COLLECT also
+                returns a ParseResult whose errors hold a ParseError per skipped
+                span. If a callable, rows are skipped and it is called with each
+                ParseError as soon as the span is skipped. Errors before the first
+                row are still raised. Either the enum or its value. Defaults to
+                ParseErrors.RAISE.
+            index_by (list, optional): The flat keys to index the rows by while
+                they are built, see ParseResult.indexes and ParseResult.lookup.
+            distinct (list, optional): The flat keys to collect the distinct
+                values of while the rows are built, see ParseResult.distinct.
+            executor (Executor, optional): The process pool to parse the pieces
+                on if workers is more than 1, so that the processes are started
+                once for any number of parses. A new ProcessPoolExecutor with
+                workers processes is used for each parse if not given.
+            column_type (ColumnType, optional): ColumnType.ARRAY returns the
+                columns of Format.COLUMNAR that types converts with 'int' or
+                'float' as an array, and ColumnType.NUMPY those converted with
+                'int', 'float' or 'bool' as a NumPy array, which needs NumPy.
+                The values of a multivalue field are converted the same way.
+                Columns with a missing or unconverted value, and all others,
+                stay lists. Either the enum or its value. Defaults to
+                ColumnType.LIST.
 
         Returns:
-            List: Parsed Splunk search result as a list.
+            List: Parsed Splunk search result as a list, or a ParseResult if stats
+                is True, errors is ParseErrors.COLLECT, or index_by or distinct
+                is given.
         """
 
-        if len(escape_char) != 1:
-            raise SplunkFormatParserException(
-                'escape character can only be 1 character long: "%s"'
-                % escape_char)
-        
-        cls._mvsep = mvsep
-        cls._row_prefix = row_prefix
-        cls._column_prefix = column_prefix
-        cls._column_separator = column_separator
-        cls._column_end = column_end
-        cls._row_separator = row_separator
-        cls._row_end = row_end
-        cls._emptystr = emptystr
-        cls._escape_char = escape_char
-
-        cls._token = None
-        cls._keyword = None
-        cls._iterator = iter(result)
-        cls._char_index = -1
-        cls._fields = set()
-        
+        if dialect is None:
+            dialect = cls.compile(row_prefix, column_prefix, column_separator,
+                                  column_end, row_separator, row_end, mvsep,
+                                  emptystr, escape_char)
+        column_type = _check_column_type(column_type, format)
+        options = {'fields': fields, 'exclude': exclude, 'interner': interner,
+                   'row_type': _check_row_type(row_type, format), 'format': format,
+                   'stats': bool(stats), 'on_row': on_row,
+                   'types': _resolve_types(None, dialect, engine, encoding, types,
+                                           False, fields, exclude),
+                   'conversion_errors': _check_conversion_errors(conversion_errors),
+                   'errors': _check_errors(errors),
+                   'on_error': errors if callable(errors) else None,
+                   'index_by': index_by, 'distinct': distinct}
+        collect = options['errors'] == ParseErrors.COLLECT
+        indexed = index_by is not None or distinct is not None
+        key = None
+        if (cache is not None and not stats and on_row is None and not collect
+                and not indexed and options['on_error'] is None
+                and _cacheable_types(options['types'])):
+            key = cache._key(result, dialect, encoding, options, infer_types,
+                             column_type)
+            data = cache._load(key)
+            if data is not None:
+                return data
+        if infer_types:
+            # Only a parse that is not found in the cache samples the rows.
+            options['types'] = _resolve_types(result, dialect, engine, encoding, types,
+                                              infer_types, fields, exclude)
+
+        if workers > 1:
+            data, parse_stats, parse_errors, index = _parse_parallel(
+                result, dialect, format, engine, encoding, workers, options, executor)
+        else:
+            data, parse_stats, parse_errors, index = _parse_whole(
+                result, dialect, format, engine, encoding, options)
+        if column_type != ColumnType.LIST and options['types']:
+            data = _typed_columns(data, options['types'], column_type)
+
+        if key is not None:
+            cache._store(key, data)
+        if callable(stats):
+            stats(parse_stats)
+            parse_stats = None
+        if parse_stats is None and not collect and not indexed:
+            return data
+        result = ParseResult(data, parse_stats, parse_errors if collect else None)
+        if index is not None:
+            result.indexes = index.indexes if index_by is not None else None
+            result.distinct = index.distinct if distinct is not None else None
+        return result
+
+
+    @classmethod
+    def iter_parse(cls,
+                   result: Union[str, bytes],
+                   row_prefix: str = '(',
+                   column_prefix: str ='(',
+                   column_separator: str ='AND',
+                   column_end: str =')',
+                   row_separator: str ='OR',
+                   row_end: str =')',
+                   mvsep: str ='OR',
+                   emptystr: str ='NOT()',
+                   escape_char: str ='\\',
+                   format: Format = Format.FLAT_JSON,
+                   engine: Engine = Engine.SLICE,
+                   encoding: str = 'utf-8',
+                   dialect: 'Dialect' = None,
+                   fields: list = None,
+                   exclude: list = None,
+                   interner: 'Interner' = None,
+                   row_type: RowType = RowType.DICT,
+                   stats: Callable = None,
+                   on_row: Callable = None,
+                   types: dict = None,
+                   infer_types: Union[bool, int] = False,
+                   conversion_errors: ConversionErrors = ConversionErrors.RAISE,
+                   errors: Union[ParseErrors, Callable] = ParseErrors.RAISE
+                   ) -> Iterator[dict]:
+        """Parse Splunk search result string from a format command row by row.
+
+        Each row is yielded as soon as its column end is matched, so only one row
+        is held in memory at a time. Structural errors such as extra data after the
+        row end are raised once the iteration reaches them.
+
+        Example:
+        for row in SplunkFormatParser.iter_parse(result):
+            print(row['host'])
+
+        Args:
+            result (str, bytes): Splunk search result string to parse.
+            format (Format, optional): The format of the yielded rows, either
+                Format.FLAT_JSON or Format.JSON. Format.CSV and Format.COLUMNAR need
+                every row before they can be returned and cannot be streamed.
+            stats (callable, optional): Called with the ParseStats of the parse
+                once the last row has been yielded.
+            errors (ParseErrors, callable, optional): Either ParseErrors.RAISE,
+                ParseErrors.SKIP or a callable, see parse. The skipped spans cannot
+                be collected into a list, a callable receives them instead.
+            The other arguments are the same as for parse.
+
+        Returns:
+            Iterator: Parsed rows of the Splunk search result.
+        """
+
+        if dialect is None:
+            dialect = cls.compile(row_prefix, column_prefix, column_separator,
+                                  column_end, row_separator, row_end, mvsep,
+                                  emptystr, escape_char)
+        parser = _create_parser(result, dialect, engine, encoding, fields=fields,
+                                exclude=exclude, interner=interner,
+                                row_type=_check_row_type(row_type, format),
+                                format=format, stats=stats is not None, on_row=on_row,
+                                types=_resolve_types(result, dialect, engine, encoding,
+                                                     types, infer_types, fields, exclude),
+                                conversion_errors=_check_conversion_errors(conversion_errors),
+                                errors=_check_errors(errors, streamed=True),
+                                on_error=errors if callable(errors) else None)
+
         if format == Format.FLAT_JSON:
-            return cls._parse_flat_json()
-        elif format == Format.CSV:
-            return cls._parse_csv()
+            rows = parser._iter_flat_json()
         elif format == Format.JSON:
-            return cls._parse_json()
+            rows = parser._iter_json()
+        elif format in (Format.CSV, Format.COLUMNAR):
+            raise SplunkFormatParserException('format "%s" cannot be streamed' % format)
         else:
             raise SplunkFormatParserException('unsupported format "%s"' % format)
+        if stats is not None:
+            rows = _report_stats(rows, parser, stats)
+        return rows
 
 
     @classmethod
-    def _parse_csv(cls):
-        results = cls._parse_flat_json()
-        fields = sorted(cls._fields)
-        res_lst = [fields]
-        for res in results:
-            values = []
-            for field in fields:
-                values.append(res.get(field, ''))
-            res_lst.append(values)
-        return res_lst
+    def compile(cls,
+                row_prefix: str = '(',
+                column_prefix: str ='(',
+                column_separator: str ='AND',
+                column_end: str =')',
+                row_separator: str ='OR',
+                row_end: str =')',
+                mvsep: str ='OR',
+                emptystr: str ='NOT()',
+                escape_char: str ='\\') -> 'Dialect':
+        """Validate and prepare delimiter and escape settings once for any number
+        of parses. Dialects are cached, so compiling the same settings again
+        returns the same dialect.
+
+        Example:
+        dialect = SplunkFormatParser.compile(escape_char='"')
+        for result in results:
+            rows = dialect.parse(result)
+
+        Args:
+            The arguments are the same as for parse.
+
+        Returns:
+            Dialect: The compiled delimiter and escape settings.
+        """
+
+        return _compile_dialect(row_prefix, column_prefix, column_separator, column_end,
+                                row_separator, row_end, mvsep, emptystr, escape_char)
 
 
     @classmethod
-    def _parse_json(cls):
-        results = cls._parse_flat_json()
-        for i in range(len(results)):
-            results[i] = cls._unflatten_json(results[i])
-        return results
+    def parse_many(cls,
+                   results: list,
+                   executor: Executor = None,
+                   chunksize: int = 1,
+                   **kwargs) -> list:
+        """Parse a list of Splunk search result strings, optionally spread over
+        a thread pool or process pool.
+
+        Example:
+        with ProcessPoolExecutor() as executor:
+            parsed = SplunkFormatParser.parse_many(results, executor=executor)
+
+        Args:
+            results (list): Splunk search result strings to parse.
+            executor (Executor, optional): The executor to run the parses on, e.g. a
+                ThreadPoolExecutor or ProcessPoolExecutor. The results are parsed
+                one after another in the calling thread if not given.
+            chunksize (int, optional): The number of result strings sent to a
+                process pool worker at a time. Ignored by thread pools.
+                Defaults to 1.
+            **kwargs: Keyword arguments passed to parse for every result string.
+
+        Returns:
+            List: One parsed Splunk search result per result string, in the same
+                order as results.
+        """
+
+        parse = partial(cls.parse, **kwargs)
+        if executor is None:
+            return [parse(result) for result in results]
+        return list(executor.map(parse, results, chunksize=chunksize))
+
 
-    
     @classmethod
-    def _unflatten_json(cls, flat_json):
-        json = {}
-        for k, v in flat_json.items():
-            if not '.' in k:
-                json[k] = v
-                continue
+    def parse_file(cls, path: str, encoding: str = 'utf-8', **kwargs) -> list:
+        """Parse a file holding a Splunk search result string from a format command.
+
+        The file is memory mapped and scanned as bytes, so it is never read into
+        memory or decoded as a whole. Character offsets in errors count bytes.
 
-            keys = k.split('.')
-            nest_dict = json
-            for key in keys[:-1]:
-                nest_dict[key] = nest_dict.get(key, {})
-                nest_dict = nest_dict[key]
-            nest_dict[keys[-1]] = v
-        return json
+        Args:
+            path (str): Path of the file to parse.
+            encoding (str, optional): The encoding of the file. Defaults to 'utf-8'.
+            **kwargs: Keyword arguments passed to parse.
+
+        Returns:
+            List: Parsed Splunk search result as a list.
+        """
+
+        with _map_file(path) as buffer:
+            return cls.parse(buffer, encoding=encoding, **kwargs)
 
 
     @classmethod
-    def _parse_flat_json(cls):
-        cls._next_token()
-        cls._next_keyword()
-        if not cls._keyword:
-            return []
-        if cls._keyword == cls._emptystr:
-            cls._match_token(None)
-            return []
-        results = cls._parse_row()
-        
-        cls._next_keyword()
-        if cls._keyword:
+    def iter_parse_file(cls, path: str, encoding: str = 'utf-8', **kwargs) -> Iterator[dict]:
+        """Parse a file holding a Splunk search result string from a format command
+        row by row, see parse_file and iter_parse.
+
+        Args:
+            path (str): Path of the file to parse.
+            encoding (str, optional): The encoding of the file. Defaults to 'utf-8'.
+            **kwargs: Keyword arguments passed to iter_parse.
+
+        Returns:
+            Iterator: Parsed rows of the Splunk search result.
+        """
+
+        with _map_file(path) as buffer:
+            yield from cls.iter_parse(buffer, encoding=encoding, **kwargs)
+
+
+    @classmethod
+    def validate(cls,
+                 result: Union[str, bytes],
+                 row_prefix: str = '(',
+                 column_prefix: str ='(',
+                 column_separator: str ='AND',
+                 column_end: str =')',
+                 row_separator: str ='OR',
+                 row_end: str =')',
+                 mvsep: str ='OR',
+                 emptystr: str ='NOT()',
+                 escape_char: str ='\\',
+                 engine: Engine = Engine.SLICE,
+                 encoding: str = 'utf-8',
+                 dialect: 'Dialect' = None) -> 'ParseStats':
+        """Check that a Splunk search result string from a format command can be
+        parsed, without building the parsed result.
+
+        The result is scanned as by parse, but values are skipped over without
+        being sliced or unescaped and no rows are built.
+
+        Example:
+        try:
+            SplunkFormatParser.validate(result)
+        except SplunkFormatParserException as error:
+            reject(result, error)
+
+        Args:
+            The arguments are the same as for parse.
+
+        Returns:
+            ParseStats: The scanned characters or bytes, rows, fields and
+                multivalue groups of the result. The other counts and the times
+                are not collected.
+
+        Raises:
+            SplunkFormatParserException: The error that parse raises for the
+                result, at the same character offset.
+        """
+
+        if dialect is None:
+            dialect = cls.compile(row_prefix, column_prefix, column_separator,
+                                  column_end, row_separator, row_end, mvsep,
+                                  emptystr, escape_char)
+        parser = _create_parser(result, dialect, engine, encoding, validate=True)
+        for _ in parser._iter_flat_json():
+            pass
+        stats = parser._stats
+        stats.scanned = parser._length
+        return stats
+
+
+    @classmethod
+    async def aparse(cls,
+                     stream,
+                     format: Format = Format.FLAT_JSON,
+                     encoding: str = 'utf-8',
+                     executor: Executor = None,
+                     offload_size: int = 1 << 20,
+                     read_size: int = 1 << 16,
+                     stats: Callable = None,
+                     **kwargs) -> AsyncIterator[dict]:
+        """Parse Splunk search result string from a format command that arrives
+        from an async stream, yielding each row as soon as it is complete.
+
+        Example:
+        async for row in SplunkFormatParser.aparse(reader):
+            print(row['host'])
+
+        Args:
+            stream: An asyncio.StreamReader or any object with an async read(size)
+                method, or an async iterator of str or bytes chunks.
+            format (Format, optional): The format of the yielded rows, either
+                Format.FLAT_JSON or Format.JSON.
+            encoding (str, optional): The encoding of bytes chunks. Defaults to
+                'utf-8'.
+            executor (ThreadPoolExecutor, optional): Thread pool in which chunks of
+                at least offload_size are decoded and scanned, so that they do not
+                block the event loop. The chunks of a stream are still parsed one
+                at a time. Any other executor raises SplunkFormatParserException,
+                as a process pool would advance a copy of the parser. If not
+                given, every chunk is parsed in the event loop.
+            offload_size (int, optional): The size from which chunks are handed to
+                executor. Defaults to 1 MiB.
+            read_size (int, optional): The size of the reads from a stream with a
+                read method. Defaults to 64 KiB.
+            stats (callable, optional): Called with the ParseStats of the parse
+                once the last row has been yielded.
+            **kwargs: The delimiter, dialect, field and row arguments of
+                IncrementalParser.
+
+        Returns:
+            AsyncIterator: Parsed rows of the Splunk search result.
+        """
+
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
             raise SplunkFormatParserException(
-                'extra data "%s" (char %s)' % (cls._keyword, cls._char_index-1))
-        return results
-    
+                'aparse needs a ThreadPoolExecutor, not "%s"' % type(executor).__name__)
+        parser = IncrementalParser(format=format, stats=stats is not None, **kwargs)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        loop = asyncio.get_running_loop()
+        async for chunk in _aiter_chunks(stream, read_size):
+            if executor is not None and len(chunk) >= offload_size:
+                rows = await loop.run_in_executor(executor, _feed_chunk, parser,
+                                                  decoder, chunk)
+            else:
+                rows = _feed_chunk(parser, decoder, chunk)
+            for row in rows:
+                yield row
+        for row in parser.feed(decoder.decode(b'', final=True)) + parser.close():
+            yield row
+        if stats is not None:
+            stats(parser.stats)
+
 
     @classmethod
-    def _parse_row(cls):
-        res_lst = []
-        cls._match_keyword(cls._row_prefix)
-
-        while cls._token:
-            cls._next_keyword()
-            col_dict = cls._parse_column()
-            res_lst.append(col_dict)
-            
-            cls._next_keyword()
-            if cls._keyword != cls._row_separator:
-                break
-        
-        cls._match_keyword(cls._row_end)
-        return res_lst
+    def format(cls,
+               rows: Iterable[Mapping],
+               out_file: IO = None,
+               row_prefix: str = '(',
+               column_prefix: str ='(',
+               column_separator: str ='AND',
+               column_end: str =')',
+               row_separator: str ='OR',
+               row_end: str =')',
+               mvsep: str ='OR',
+               emptystr: str ='NOT()',
+               escape_char: str ='\\',
+               dialect: 'Dialect' = None) -> Union[str, int]:
+        """Format rows into a Splunk search result string as the format command
+        does, the inverse of parse.
+
+        Example:
+        Input: [{'host': 'mylaptop', 'source': ['a.log', 'b.log']}]
+
+        Output: '( ( host="mylaptop" AND ( source="a.log" OR source="b.log" ) ) )'
+
+        Args:
+            rows (iterable): Rows as returned by Format.FLAT_JSON, Format.JSON or
+                any row type. Nested dicts are formatted as dotted keys and lists
+                as multivalue fields, including a list of one value, which parse
+                reads back as a list. Fields that are None or empty lists are left
+                out and other values are formatted with str. Keys that are not
+                made of word characters are quoted.
+            out_file (IO, optional): A writable text file to write the string to,
+                in batches of rows, so that rows can be a generator of any number
+                of rows. The string is returned if not given.
+            The delimiter, escape and dialect arguments are the same as for parse.
+
+        Returns:
+            Str: The Splunk search result string, or the number of rows written if
+                out_file is given.
+
+        Raises:
+            SplunkFormatParserException: A row has no fields, or a key contains
+                "=" or starts or ends with '"' and cannot be parsed back.
+        """
+
+        if dialect is None:
+            dialect = cls.compile(row_prefix, column_prefix, column_separator,
+                                  column_end, row_separator, row_end, mvsep,
+                                  emptystr, escape_char)
+        if out_file is None:
+            parts = []
+            _write_rows(rows, dialect, parts.append)
+            return ''.join(parts)
+        return _write_rows(rows, dialect, out_file.write)
+
 
-    
     @classmethod
-    def _parse_column(cls):
-        col_dict = {}
-        cls._match_keyword(cls._column_prefix)
-        
-        while cls._token:
-            while cls._token and cls._token == ' ':
-                cls._next_token()
-            
-            if cls._token == '(':
-                key, value = cls._get_key_multivalue()
+    def write_csv(cls,
+                  result: Union[str, bytes, IO],
+                  out_file: Union[str, IO],
+                  fields: list = None,
+                  encoding: str = 'utf-8',
+                  engine: Engine = Engine.SLICE,
+                  dialect: 'Dialect' = None,
+                  on_row: Callable = None,
+                  **kwargs) -> int:
+        """Parse Splunk search result string from a format command and write it
+        to a CSV file row by row, without holding the parsed result in memory.
+
+        Example:
+        with open('result.csv', 'w', newline='') as out_file:
+            SplunkFormatParser.write_csv(result, out_file, fields=['host', 'source'])
+
+        Args:
+            result (str, bytes, IO): Splunk search result string to parse, or a
+                readable text or binary file that is read and parsed in chunks.
+            out_file (str, IO): Path of the CSV file to write, or a writable text
+                file opened with newline=''.
+            fields (list, optional): The CSV columns in order. Only these fields are
+                parsed and rows are written as soon as they are parsed. If not
+                given, the columns are every field of the result in sorted order,
+                as for Format.CSV. They are then collected by a first pass over the
+                keys of the result string, or, for a file, by writing the parsed
+                rows to a temporary file first.
+            encoding (str, optional): The encoding of a bytes-like result or binary
+                file, and of out_file if it is a path. Defaults to 'utf-8'.
+            engine (Engine, optional): The scanning engine to use, see parse.
+            dialect (Dialect, optional): Delimiter and escape settings prepared by
+                compile.
+            on_row (callable, optional): Called with every row once it is written,
+                so the rows written before an error can be told.
+            **kwargs: The delimiter and escape arguments of parse, used if dialect
+                is not given.
+
+        Returns:
+            Int: The number of rows written. Fields missing from a row are written
+                as empty strings and multivalues are joined by newlines.
+        """
+
+        if dialect is None:
+            dialect = cls.compile(**kwargs)
+        if isinstance(out_file, (str, os.PathLike)):
+            with open(out_file, 'w', newline='', encoding=encoding) as file:
+                return cls.write_csv(result, file, fields, encoding, engine, dialect,
+                                     on_row)
+
+        with ExitStack() as stack:
+            # An mmap has a read method too, but is scanned in place.
+            if (not isinstance(result, (str, bytes, bytearray, memoryview, mmap.mmap))
+                    and hasattr(result, 'read')):
+                parser = IncrementalParser(dialect=dialect, fields=fields)
+                rows = _iter_stream(parser, result, encoding)
+                if fields is None:
+                    rows = _spill_rows(rows, stack.enter_context(tempfile.TemporaryFile()))
+                    fields = sorted(parser._fields)
             else:
-                key, value = cls._get_key_value()
-            col_dict[key] = value
+                if fields is None:
+                    scanner = _create_parser(result, dialect, engine, encoding, fields=())
+                    for _ in scanner._iter_flat_json():
+                        pass
+                    fields = sorted(scanner._fields)
+                rows = _create_parser(result, dialect, engine, encoding,
+                                      fields=fields)._iter_flat_json()
 
-            cls._next_keyword()
-            if cls._keyword != cls._column_separator:
-                break
+            writer = csv.writer(out_file)
+            writer.writerow(fields)
+            count = 0
+            for row in rows:
+                values = [row.get(field, '') for field in fields]
+                writer.writerow([value if isinstance(value, str) else '\n'.join(value)
+                                 for value in values])
+                count += 1
+                if on_row is not None:
+                    on_row(row)
+            return count
 
-        cls._match_keyword(cls._column_end)
-        return col_dict
+
+class Dialect:
+    """Delimiter and escape settings of Splunk search results from a format command.
+
+    The settings are validated and the scanners built from them are prepared once,
+    so a dialect can be reused for any number of parses. Create dialects with
+    SplunkFormatParser.compile or Dialect.for_output_mode.
+    """
+
+    def __init__(self,
+                 row_prefix: str = '(',
+                 column_prefix: str ='(',
+                 column_separator: str ='AND',
+                 column_end: str =')',
+                 row_separator: str ='OR',
+                 row_end: str =')',
+                 mvsep: str ='OR',
+                 emptystr: str ='NOT()',
+                 escape_char: str ='\\'):
+        _check_escape_char(escape_char)
+        self.row_prefix = row_prefix
+        self.column_prefix = column_prefix
+        self.column_separator = column_separator
+        self.column_end = column_end
+        self.row_separator = row_separator
+        self.row_end = row_end
+        self.mvsep = mvsep
+        self.emptystr = emptystr
+        self.escape_char = escape_char
+
+        self._settings = (row_prefix, column_prefix, column_separator, column_end,
+                          row_separator, row_end, mvsep, emptystr, escape_char)
+        self._value_special = _value_special_pattern(escape_char)
+        self._byte_scanners = {}
 
 
     @classmethod
-    def _get_key_multivalue(cls):
-        cls._match_token('(')
-        cls._next_token()
+    def for_output_mode(cls, output_mode: str) -> 'Dialect':
+        """Get the cached dialect of format command results returned by the Splunk
+        search API with an output_mode, either 'json' or 'csv'.
+
+        Args:
+            output_mode (str): The output_mode of the Splunk search API request.
 
-        main_key, value = cls._get_key_value()
-        values = [value]
+        Returns:
+            Dialect: The delimiter and escape settings of the output mode.
+        """
 
-        cls._next_keyword()
-        while cls._keyword == cls._mvsep:
-            key, value = cls._get_key_value()
-            if key != main_key:
+        if output_mode not in _OUTPUT_MODE_ESCAPE_CHARS:
+            raise SplunkFormatParserException('unsupported output mode "%s"' % output_mode)
+        return SplunkFormatParser.compile(escape_char=_OUTPUT_MODE_ESCAPE_CHARS[output_mode])
+
+
+    def parse(self, result: Union[str, bytes], **kwargs) -> list:
+        """Parse Splunk search result string with this dialect, see
+        SplunkFormatParser.parse for the keyword arguments."""
+        return SplunkFormatParser.parse(result, dialect=self, **kwargs)
+
+
+    def iter_parse(self, result: Union[str, bytes], **kwargs) -> Iterator[dict]:
+        """Parse Splunk search result string with this dialect row by row, see
+        SplunkFormatParser.iter_parse for the keyword arguments."""
+        return SplunkFormatParser.iter_parse(result, dialect=self, **kwargs)
+
+
+    def parse_file(self, path: str, **kwargs) -> list:
+        """Parse a file with this dialect, see SplunkFormatParser.parse_file."""
+        return SplunkFormatParser.parse_file(path, dialect=self, **kwargs)
+
+
+    def iter_parse_file(self, path: str, **kwargs) -> Iterator[dict]:
+        """Parse a file with this dialect row by row, see
+        SplunkFormatParser.iter_parse_file."""
+        return SplunkFormatParser.iter_parse_file(path, dialect=self, **kwargs)
+
+
+    def validate(self, result: Union[str, bytes], **kwargs) -> 'ParseStats':
+        """Check a Splunk search result string with this dialect, see
+        SplunkFormatParser.validate."""
+        return SplunkFormatParser.validate(result, dialect=self, **kwargs)
+
+
+    def aparse(self, stream, **kwargs) -> AsyncIterator[dict]:
+        """Parse an async stream with this dialect row by row, see
+        SplunkFormatParser.aparse."""
+        return SplunkFormatParser.aparse(stream, dialect=self, **kwargs)
+
+
+    def parse_many(self, results: list, **kwargs) -> list:
+        """Parse a list of Splunk search result strings with this dialect, see
+        SplunkFormatParser.parse_many."""
+        return SplunkFormatParser.parse_many(results, dialect=self, **kwargs)
+
+
+    def write_csv(self, result: Union[str, bytes, IO], out_file: Union[str, IO],
+                  **kwargs) -> int:
+        """Write Splunk search result string to a CSV file with this dialect, see
+        SplunkFormatParser.write_csv."""
+        return SplunkFormatParser.write_csv(result, out_file, dialect=self, **kwargs)
+
+
+    def format(self, rows: Iterable[Mapping], out_file: IO = None) -> Union[str, int]:
+        """Format rows into a Splunk search result string with this dialect, see
+        SplunkFormatParser.format."""
+        return SplunkFormatParser.format(rows, out_file, dialect=self)
+
+
+    def incremental(self, format: Format = Format.FLAT_JSON) -> 'IncrementalParser':
+        """Create an IncrementalParser with this dialect."""
+        return IncrementalParser(format=format, dialect=self)
+
+
+    def _byte_scanner(self, encoding):
+        scanner = self._byte_scanners.get(encoding)
+        if scanner is None:
+            escape_byte = self.escape_char.encode(encoding)
+            if len(escape_byte) != 1:
                 raise SplunkFormatParserException(
-                    'multivalue contains different key string: "%s" != "%s" (char %s)' 
-                    % (main_key, key, cls._char_index-1))
-            values.append(value)
-            cls._next_keyword()
-        
-        cls._match_keyword(')')
-        return key, values
+                    'escape character has to be encoded as 1 byte: "%s"'
+                    % self.escape_char)
+            keywords = {keyword.encode(encoding): keyword
+                        for keyword in self._settings[:-1] + (')',)}
+            scanner = (escape_byte, _value_special_pattern(escape_byte), keywords)
+            self._byte_scanners[encoding] = scanner
+        return scanner
 
 
-    @classmethod
-    def _get_key_value(cls):
-        while cls._token and cls._token == ' ':
-            cls._next_token()
-        key = cls._get_key()
-        value = cls._get_value()
-        return  key, value
+    def _latin1_settings(self, encoding):
+        # The settings as latin-1 characters standing for their bytes in the
+        # encoding, so that patterns built from them can be encoded back to
+        # byte patterns. Delimiters are ASCII, so this maps one to one.
+        return tuple(setting.encode(encoding).decode('latin-1')
+                     for setting in self._settings)
 
 
-    @classmethod
-    def _get_key(cls):       
-        key_lst = [cls._token]
-        cls._next_token()
-        while cls._token and cls._token != '=':
-            key_lst.append(cls._token)
-            cls._next_token()
-        
-        cls._next_token()
-        key = ''.join(key_lst).strip('"')
-        cls._fields.add(key)
-        return key
+    def __eq__(self, other):
+        return isinstance(other, Dialect) and self._settings == other._settings
 
 
-    @classmethod
-    def _get_value(cls):
-        cls._match_token('"')
-        cls._next_token()
+    def __hash__(self):
+        return hash(self._settings)
 
-        value_lst = []
-        while cls._token:
-            cur_char = cls._token
-            cls._next_token()
-            
-            if cur_char == cls._escape_char and \
-               (cls._token == '"' or cls._token == cls._escape_char):
-                value_lst.append(cls._token)
-                cls._next_token()
-                continue
-            
-            if cur_char == '"':
-                break
-            value_lst.append(cur_char)
 
-        return ''.join(value_lst)
+    def __reduce__(self):
+        return _compile_dialect, self._settings
 
 
-    @classmethod
-    def _next_keyword(cls):
-        while cls._token and cls._token == ' ':
-            cls._next_token()
-        if not cls._token:
-            cls._keyword = None
-            return
-        
-        keyword_lst = [cls._token]
-        cls._next_token()
-        while cls._token and cls._token != ' ':
-            keyword_lst.append(cls._token)
-            cls._next_token()
-        
-        cls._keyword = ''.join(keyword_lst)
-   
+    def __repr__(self):
+        return 'Dialect(%s)' % ', '.join('%s=%r' % item for item in zip(
+            ('row_prefix', 'column_prefix', 'column_separator', 'column_end',
+             'row_separator', 'row_end', 'mvsep', 'emptystr', 'escape_char'),
+            self._settings))
 
-    @classmethod
-    def _next_token(cls):
-        cls._token = next(cls._iterator, None)
-        cls._char_index += 1
 
+@lru_cache(maxsize=256)
+def _compile_dialect(*settings):
+    return Dialect(*settings)
 
-    @classmethod
-    def _match_keyword(cls, expected):
-        if cls._keyword != expected:
-            raise SplunkFormatParserException(
-                'expecting keyword "%s" but found "%s" (char %s)' 
-                % (expected, cls._keyword, cls._char_index-1))
 
+_OUTPUT_MODE_ESCAPE_CHARS = {'json': '\\', 'csv': '"'}
 
-    @classmethod
-    def _match_token(cls, expected):
-        if cls._token != expected:
-            raise SplunkFormatParserException(
-                'expecting token "%s" but found "%s" (char %s)'
-                % (expected, cls._token, cls._char_index))
\ No newline at end of file
+
+class Interner:
+    """Shares one string object per distinct value between the rows of one or
+    more parses, and counts how often a value was shared.
+
+    Keys are always shared within a parse. Values are only shared when an
+    interner is passed to a parse, as most values of a result, e.g. _raw, are
+    seen once. At most max_values distinct values are kept, values seen after
+    that are not shared. An interner is not thread safe.
+
+    Example:
+    interner = Interner(max_values=10000)
+    rows = SplunkFormatParser.parse(result, interner=interner)
+    print(interner.hit_rate, interner.saved_bytes)
+    """
+
+    def __init__(self, max_values: int = 65536):
+        """Args:
+            max_values (int, optional): The most distinct values to keep.
+                Defaults to 65536.
+        """
+
+        self.max_values = max_values
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes = 0
+        self._values = {}
+
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of values that were replaced by a value seen before."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def clear(self):
+        """Forget the kept values and reset the counts."""
+        self.hits = self.misses = self.saved_bytes = 0
+        self._values.clear()
+
+
+    def _intern(self, value):
+        interned = self._values.get(value)
+        if interned is not None:
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(value)
+            return interned
+        self.misses += 1
+        if len(self._values) < self.max_values:
+            self._values[value] = value
+        return value
+
+
+    def _merge_counts(self, other):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.saved_bytes += other.saved_bytes
+
+
+    def __len__(self):
+        return len(self._values)
+
+
+    def __repr__(self):
+        return 'Interner(values=%d, hits=%d, misses=%d, saved_bytes=%d)' % (
+            len(self._values), self.hits, self.misses, self.saved_bytes)
+
+
+class Row(Mapping):
+    """Read only row of a parse with row_type=RowType.COMPACT.
+
+    The values are kept in a tuple and the index of the keys is shared by all
+    rows of a parse with the same keys in the same order, so a row costs little
+    more than its values. A row supports the read only dict methods, and
+    to_dict returns the row as a dict.
+    """
+
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = values
+
+
+    def __getitem__(self, key):
+        return self._values[self._schema[key]]
+
+
+    def __contains__(self, key):
+        return key in self._schema
+
+
+    def __iter__(self):
+        return iter(self._schema)
+
+
+    def __len__(self):
+        return len(self._values)
+
+
+    def to_dict(self) -> dict:
+        """Return the row as a dict."""
+        return dict(zip(self._schema, self._values))
+
+
+    def __repr__(self):
+        return 'Row(%r)' % self.to_dict()
+
+
+class NestedRow(Mapping):
+    """Read only nested view of a row of a parse with Format.JSON and
+    row_type=RowType.LAZY.
+
+    The row keeps the flat keys it was parsed with and groups them by their
+    next dotted part the first time it is read, so sub-trees that are never
+    accessed are never built. The split keys are shared by all rows of a parse.
+    to_dict returns the row as the nested dicts of Format.JSON.
+    """
+
+    __slots__ = ('_items', '_paths', '_depth', '_children', '_groups')
+
+    def __init__(self, items, paths, depth=0):
+        self._items = items
+        self._paths = paths
+        self._depth = depth
+        self._children = None
+        self._groups = None
+
+
+    def _index(self):
+        children, groups = {}, {}
+        paths, depth = self._paths, self._depth
+        for key, value in self._items:
+            path = paths.get(key)
+            if path is None:
+                path = paths[key] = key.split('.')
+            name = path[depth]
+            if len(path) == depth + 1:
+                children[name] = value
+                groups.pop(name, None)
+            else:
+                if name not in groups:
+                    children[name] = _PENDING
+                    groups[name] = []
+                groups[name].append((key, value))
+        self._children, self._groups = children, groups
+        self._items = None
+        return children
+
+
+    def __getitem__(self, key):
+        children = self._children if self._children is not None else self._index()
+        value = children[key]
+        if value is _PENDING:
+            value = children[key] = NestedRow(self._groups.pop(key), self._paths,
+                                              self._depth + 1)
+        return value
+
+
+    def __iter__(self):
+        children = self._children if self._children is not None else self._index()
+        return iter(children)
+
+
+    def __len__(self):
+        children = self._children if self._children is not None else self._index()
+        return len(children)
+
+
+    def to_dict(self) -> dict:
+        """Return the row as nested dicts."""
+        return {key: value.to_dict() if isinstance(value, NestedRow) else value
+                for key, value in self.items()}
+
+
+    def __reduce__(self):
+        if self._items is not None and self._depth == 0:
+            items = list(self._items)
+        else:
+            items = list(_flatten(self.to_dict()))
+        return NestedRow, (items, self._paths)
+
+
+    def __repr__(self):
+        return 'NestedRow(%r)' % self.to_dict()
+
+
+def _flatten(tree, prefix=''):
+    for key, value in tree.items():
+        if isinstance(value, Mapping):
+            yield from _flatten(value, prefix + key + '.')
+        else:
+            yield prefix + key, value
+
+
+# Placeholder of a NestedRow sub-tree that has not been accessed yet.
+_PENDING = object()
+
+
+class ResultCache:
+    """Keeps the parsed results of recently parsed result strings, so that a
+    result string seen again, e.g. the same host list returned by every run of
+    a scheduled search, is not parsed again.
+
+    Results are looked up by a hash of the result string together with the
+    dialect, format and field options of the parse. They are kept pickled,
+    so every lookup returns a fresh copy that the caller may change. The least
+    recently used results are dropped once more than max_entries results or
+    more than max_bytes pickled bytes are kept. If path is given, results are
+    also written to files in that directory and read back when they are not
+    in memory, e.g. after a restart. The least recently used files are removed
+    once they take more than max_disk_bytes. Only use a directory that no one
+    else can write to, as the files are unpickled.
+
+    Example:
+    cache = ResultCache(max_entries=256, path='/var/cache/splunk_results')
+    rows = SplunkFormatParser.parse(result, cache=cache)
+    print(cache.hits, cache.misses)
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 << 20,
+                 path: str = None, max_disk_bytes: int = 1 << 30):
+        """Args:
+            max_entries (int, optional): The most results to keep in memory.
+                Defaults to 128.
+            max_bytes (int, optional): The most pickled bytes to keep in memory.
+                Larger results are not kept in memory. Defaults to 64 MiB.
+            path (str, optional): Directory to also keep the results in. It is
+                created if it does not exist. Results are only kept in memory
+                if not given.
+            max_disk_bytes (int, optional): The most bytes of files to keep in
+                path. Larger results are not written. Defaults to 1 GiB.
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self.disk_bytes = 0
+        self._entries = OrderedDict()
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._scan_files()
+
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of lookups that found a kept result."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def clear(self):
+        """Forget the results kept in memory and reset the counts. The files in
+        path are kept."""
+        with self._lock:
+            self.hits = self.misses = self.bytes = 0
+            self._entries.clear()
+
+
+    def _key(self, result, dialect, encoding, options, infer_types=False,
+             column_type=ColumnType.LIST):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((dialect._settings, str(options['format']), str(column_type),
+                            str(options['row_type']), _key_list(options['fields']),
+                            _key_list(options['exclude']),
+                            _key_types(options['types']), infer_types,
+                            str(options['conversion_errors']),
+                            str(options['errors']))).encode())
+        if isinstance(result, str):
+            digest.update(b'str:')
+            # Encoded a slice at a time, so the result is not copied as a whole.
+            for start in range(0, len(result), _HASH_SLICE):
+                digest.update(result[start:start + _HASH_SLICE].encode('utf-8', 'surrogatepass'))
+        else:
+            digest.update(('bytes:%s:' % codecs.lookup(encoding).name).encode())
+            digest.update(result)
+        return digest.hexdigest()
+
+
+    def _load(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is None and self.path is not None:
+            data = self._read(key)
+            if data is not None:
+                self._keep(key, data)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(data)
+
+
+    def _store(self, key, result):
+        data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        self._keep(key, data)
+        if self.path is not None:
+            self._write(key, data)
+
+
+    def _keep(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._entries[key] = data
+            self.bytes += len(data)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= len(old)
+
+
+    def _scan_files(self):
+        # The files kept by earlier runs, least recently used first, as reads
+        # touch their modification time.
+        files = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith('.pickle') and entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime_ns, entry.name[:-7], stat.st_size))
+        for _, key, size in sorted(files):
+            self._files[key] = size
+            self.disk_bytes += size
+        with self._lock:
+            self._evict_files()
+
+
+    def _read(self, key):
+        file_path = os.path.join(self.path, key + '.pickle')
+        try:
+            with open(file_path, 'rb') as file:
+                data = file.read()
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.disk_bytes += len(data) - self._files.pop(key, 0)
+            self._files[key] = len(data)
+            self._evict_files()
+        return data
+
+
+    def _write(self, key, data):
+        if len(data) > self.max_disk_bytes:
+            return
+        with tempfile.NamedTemporaryFile(dir=self.path, delete=False) as file:
+            file.write(data)
+        os.replace(file.name, os.path.join(self.path, key + '.pickle'))
+        with self._lock:
+            self.disk_bytes += len(data) - self._files.pop(key, 0)
+            self._files[key] = len(data)
+            self._evict_files()
+
+
+    def _evict_files(self):
+        while self.disk_bytes > self.max_disk_bytes:
+            key, size = self._files.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.remove(os.path.join(self.path, key + '.pickle'))
+            except FileNotFoundError:
+                pass
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __repr__(self):
+        return 'ResultCache(entries=%d, bytes=%d, hits=%d, misses=%d)' % (
+            len(self._entries), self.bytes, self.hits, self.misses)
+
+
+_HASH_SLICE = 1 << 20
+
+
+def _key_list(names):
+    return None if names is None else tuple(names)
+
+
+def _key_types(types):
+    return None if types is None else tuple(sorted(
+        (key, _type_name(converter)) for key, converter in types.items()))
+
+
+def _cacheable_types(types):
+    known = _CONVERTERS.values()
+    return types is None or all(converter in known for converter in types.values())
+
+
+class ParseStats:
+    """Counts and timings of a parse, collected with stats=True.
+
+    Attributes:
+        scanned (int): The characters of a str result, or the bytes of a
+            bytes-like result, that were scanned.
+        rows (int): The number of rows.
+        fields (int): The number of fields in the rows. A multivalue field
+            counts once.
+        values (int): The number of keys and values read. Every value of a
+            multivalue field counts.
+        distinct_keys (int): The number of distinct keys in the rows.
+        multivalue_groups (int): The number of multivalue fields.
+        escapes (int): The number of escape sequences replaced in values.
+        scan_seconds (float): The time spent reading keys and values.
+        build_seconds (float): The rest of the time spent on the rows, matching
+            the delimiters and building each row.
+        convert_seconds (float): The time spent converting the rows into
+            Format.CSV or Format.COLUMNAR.
+    The times of a parallel parse add up the times of all processes.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.rows = 0
+        self.fields = 0
+        self.values = 0
+        self.distinct_keys = 0
+        self.multivalue_groups = 0
+        self.escapes = 0
+        self.scan_seconds = 0.0
+        self.build_seconds = 0.0
+        self.convert_seconds = 0.0
+
+
+    @property
+    def total_seconds(self) -> float:
+        """The time spent scanning, building and converting."""
+        return self.scan_seconds + self.build_seconds + self.convert_seconds
+
+
+    def _merge(self, other):
+        for name in ('scanned', 'rows', 'fields', 'values', 'multivalue_groups',
+                     'escapes', 'scan_seconds', 'build_seconds', 'convert_seconds'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+    def __repr__(self):
+        return 'ParseStats(%s)' % ', '.join('%s=%r' % item for item in vars(self).items())
+
+
+class ParseResult:
+    """A parsed Splunk search result together with the side outputs that were
+    asked for, returned by SplunkFormatParser.parse.
+
+    Attributes:
+        data: The parsed result, as parse returns it otherwise.
+        stats (ParseStats): The stats of the parse if stats=True, else None.
+        errors (list): The ParseErrors of the skipped spans in order if
+            errors=ParseErrors.COLLECT, else None.
+        indexes (dict): For every key of index_by, a dict from each of its values
+            to the positions of the rows holding it in data, in order, else None.
+            Every value of a multivalue field is indexed. Positions of Format.CSV
+            count the header row and positions of Format.COLUMNAR are row numbers.
+        distinct (dict): For every key of distinct, the set of its values, else
+            None. Every value of a multivalue field is collected.
+    """
+
+    def __init__(self, data, stats=None, errors=None, indexes=None, distinct=None):
+        self.data = data
+        self.stats = stats
+        self.errors = errors
+        self.indexes = indexes
+        self.distinct = distinct
+
+
+    def lookup(self, key: str, value) -> list:
+        """Get the rows whose field key holds value from the index of key.
+
+        Args:
+            key (str): A key of index_by.
+            value: The value to look up, converted if key has a type.
+
+        Returns:
+            List: The rows holding the value in order, empty if there are none.
+        """
+
+        if self.indexes is None or key not in self.indexes:
+            raise SplunkFormatParserException('key "%s" is not indexed' % key)
+        if not isinstance(self.data, list):
+            raise SplunkFormatParserException('rows of format "%s" cannot be looked up'
+                                              % Format.COLUMNAR)
+        data = self.data
+        return [data[position] for position in self.indexes[key].get(value, ())]
+
+
+    def __repr__(self):
+        return 'ParseResult(%s)' % ', '.join(
+            '%s=%r' % item for item in vars(self).items()
+            if item[0] in ('data', 'stats') or item[1] is not None)
+
+
+class ParseError:
+    """A malformed span of a result that was skipped instead of raised, see the
+    errors argument of parse.
+
+    Attributes:
+        message (str): The message of the error that was not raised.
+        char_index (int): The character offset the error was found at.
+        start (int): The offset of the first skipped character, where the
+            malformed row starts.
+        end (int): The offset after the last skipped character. The rows
+            after it are parsed as usual.
+    """
+
+    def __init__(self, message, char_index, start, end):
+        self.message = message
+        self.char_index = char_index
+        self.start = start
+        self.end = end
+
+
+    def __repr__(self):
+        return 'ParseError(%s)' % ', '.join('%s=%r' % item for item in vars(self).items())
+
+
+# Returned in place of the value of a field that is not selected.
+_SKIPPED = object()
+
+
+class _Parser:
+    """Parses one Splunk search result string. The scanning state is kept on
+    the instance so that any number of results can be parsed at once.
+
+    The state is kept in slots, as the attributes are read for every character
+    or keyword, and a dict holding more than 30 of them is no longer shared
+    between instances, which makes every access slower. The attributes of the
+    subclasses and mixins go into their dicts.
+    """
+
+    __slots__ = ('_mvsep', '_row_prefix', '_column_prefix', '_column_separator',
+                 '_column_end', '_row_separator', '_row_end', '_emptystr',
+                 '_escape_char', '_value_special', '_token', '_keyword', '_text',
+                 '_length', '_char_index', '_offset', '_fields', '_columns',
+                 '_include', '_exclude', '_project', '_interner', '_schemas',
+                 '_nested_paths', '_lazy_paths', '_types', '_column_types',
+                 '_strict_types', '_stats', '__dict__')
+
+    def __init__(self, text, dialect):
+        self._mvsep = dialect.mvsep
+        self._row_prefix = dialect.row_prefix
+        self._column_prefix = dialect.column_prefix
+        self._column_separator = dialect.column_separator
+        self._column_end = dialect.column_end
+        self._row_separator = dialect.row_separator
+        self._row_end = dialect.row_end
+        self._emptystr = dialect.emptystr
+        self._escape_char = dialect.escape_char
+        self._value_special = dialect._value_special
+
+        self._token = None
+        self._keyword = None
+        self._text = text
+        self._length = len(text)
+        self._char_index = -1
+        self._offset = 0
+        self._fields = {}
+        self._columns = None
+        self._include = None
+        self._exclude = frozenset()
+        self._project = False
+        self._interner = None
+        self._schemas = None
+        self._nested_paths = None
+        self._lazy_paths = None
+        self._types = None
+        self._column_types = None
+        self._strict_types = True
+        self._stats = None
+
+
+    def _configure(self, fields=None, exclude=None, interner=None,
+                   row_type=RowType.DICT, format=Format.FLAT_JSON, types=None,
+                   conversion_errors=ConversionErrors.RAISE):
+        if fields is not None or exclude is not None:
+            self._include = frozenset(fields) if fields is not None else None
+            self._exclude = frozenset(exclude or ())
+            self._project = True
+        self._interner = interner
+        if types:
+            self._strict_types = conversion_errors == ConversionErrors.RAISE
+            if format == Format.COLUMNAR and not self._strict_types:
+                # Without errors to raise at a value, the columns are converted
+                # as a whole once they are filled.
+                self._column_types = types
+            else:
+                self._types = types
+        if row_type == RowType.COMPACT:
+            self._schemas = {}
+        elif row_type == RowType.LAZY:
+            self._lazy_paths = {}
+        elif format == Format.JSON:
+            self._nested_paths = {}
+
+
+    def _selected_fields(self):
+        if not self._project:
+            return self._fields
+        return {field for field in self._fields if not self._skips(field)}
+
+
+    def _skips(self, key):
+        return key in self._exclude or (self._include is not None
+                                         and key not in self._include)
+
+
+    def _parse_csv(self):
+        results = self._parse_flat_json()
+        return self._convert(_to_csv, results, self._selected_fields())
+
+
+    def _parse_columnar(self):
+        self._columns = _Columns()
+        for _ in self._iter_flat_json():
+            pass
+        columns = self._convert(self._columns.to_dict)
+        if self._column_types is not None:
+            columns = self._convert(_convert_columns, columns, self._column_types)
+        return columns
+
+
+    def _convert(self, function, *args):
+        return function(*args)
+
+
+    def _parse_json(self):
+        return list(self._iter_json())
+
+
+    def _iter_json(self):
+        # Rows are nested by _parse_column as they are parsed.
+        return self._iter_flat_json()
+
+
+    def _set_nested(self, json, key, value):
+        path = self._nested_paths.get(key)
+        if path is None:
+            keys = key.split('.')
+            path = self._nested_paths[key] = (keys[:-1], keys[-1])
+
+        parents, last = path
+        for parent in parents:
+            json = json.setdefault(parent, {})
+        json[last] = value
+
+
+    def _parse_flat_json(self):
+        return list(self._iter_flat_json())
+
+
+    def _iter_flat_json(self):
+        self._next_token()
+        self._next_keyword()
+        if not self._keyword:
+            return
+        if self._keyword == self._emptystr:
+            self._match_token(None)
+            return
+        yield from self._parse_row()
+        self._match_end()
+
+
+    def _iter_piece(self, first, last):
+        self._next_token()
+        self._next_keyword()
+        self._match_keyword(self._row_prefix if first else self._row_separator)
+        yield from self._parse_rows()
+        if last:
+            self._match_keyword(self._row_end)
+            self._match_end()
+        else:
+            self._match_keyword(None)
+    
+
+    def _parse_row(self):
+        self._match_keyword(self._row_prefix)
+        yield from self._parse_rows()
+        self._match_keyword(self._row_end)
+
+
+    def _parse_rows(self):
+        while self._token:
+            self._next_keyword()
+            yield self._parse_column()
+            
+            self._next_keyword()
+            if self._keyword != self._row_separator:
+                break
+
+    
+    def _parse_column(self):
+        if self._columns is not None:
+            return self._fill_columns()
+
+        col_dict = {}
+        nested_paths = self._nested_paths
+        self._match_keyword(self._column_prefix)
+        
+        while self._token:
+            self._skip_spaces()
+            
+            if self._token == '(':
+                key, value = self._get_key_multivalue()
+            else:
+                key, value = self._get_key_value()
+            if value is not _SKIPPED:
+                if nested_paths is None or '.' not in key:
+                    col_dict[key] = value
+                else:
+                    self._set_nested(col_dict, key, value)
+
+            self._next_keyword()
+            if self._keyword != self._column_separator:
+                break
+
+        self._match_keyword(self._column_end)
+        return self._finish_row(col_dict)
+
+
+    def _finish_row(self, col_dict):
+        if self._schemas is not None:
+            return self._compact_row(col_dict)
+        if self._lazy_paths is not None:
+            return NestedRow(col_dict.items(), self._lazy_paths)
+        return col_dict
+
+
+    def _compact_row(self, col_dict):
+        keys = tuple(col_dict)
+        schema = self._schemas.get(keys)
+        if schema is None:
+            schema = self._schemas[keys] = {key: index for index, key in enumerate(keys)}
+        return Row(schema, tuple(col_dict.values()))
+
+
+    def _fill_columns(self):
+        columns = self._columns
+        values = columns.values
+        row = columns.count
+        filled = 0
+        self._match_keyword(self._column_prefix)
+
+        while self._token:
+            self._skip_spaces()
+
+            if self._token == '(':
+                key, value = self._get_key_multivalue()
+                columns.multivalue.add(key)
+            else:
+                key, value = self._get_key_value()
+            if value is not _SKIPPED:
+                column = values.get(key)
+                if column is None:
+                    column = values[key] = [None] * row
+                if len(column) > row:
+                    column[row] = value
+                else:
+                    column.append(value)
+                    filled += 1
+
+            self._next_keyword()
+            if self._keyword != self._column_separator:
+                break
+
+        self._match_keyword(self._column_end)
+        columns.count = row = row + 1
+        if filled != len(values):
+            for column in values.values():
+                if len(column) < row:
+                    column.append(None)
+
+
+    def _get_key_multivalue(self):
+        self._match_token('(')
+        self._next_token()
+
+        main_key, value = self._get_key_value()
+        values = [value] if value is not _SKIPPED else None
+
+        self._next_keyword()
+        while self._keyword == self._mvsep:
+            key, value = self._get_key_value()
+            if key != main_key:
+                raise self._error(
+                    'multivalue contains different key string: "%s" != "%s"'
+                    % (main_key, key), self._char_index-1)
+            if values is not None:
+                values.append(value)
+            self._next_keyword()
+        
+        self._match_keyword(')')
+        return main_key, values if values is not None else _SKIPPED
+
+
+    def _get_key_value(self):
+        self._skip_spaces()
+        key = self._get_key()
+        if self._project and self._skips(key):
+            self._skip_value()
+            return key, _SKIPPED
+        if self._types is not None and key in self._types:
+            return key, self._get_typed_value(key)
+        value = self._get_value()
+        if self._interner is not None:
+            value = self._interner._intern(value)
+        return  key, value
+
+
+    def _get_typed_value(self, key):
+        index = self._char_index
+        value = self._get_value()
+        converter = self._types[key]
+        try:
+            return converter(value)
+        except (ValueError, TypeError, OverflowError):
+            if not self._strict_types:
+                return value
+            raise self._error('cannot convert value "%s" of field "%s" to %s'
+                              % (value, key, _type_name(converter)), index) from None
+
+
+    def _get_key(self):
+        text, start = self._text, self._char_index
+        end = text.find('=', start + 1)
+        if end == -1:
+            self._end_of_text()
+            end = self._length
+
+        self._char_index = index = end + 1
+        self._token = text[index] if index < self._length else self._end_of_text()
+        key = text[start:end].strip('"')
+        key = self._fields.setdefault(key, key)
+        return key
+
+
+    def _get_value(self):
+        self._match_token('"')
+
+        text, start = self._text, self._char_index + 1
+        end = text.find('"', start)
+        if end != -1 and (text.find(self._escape_char, start, end) == -1
+                          if self._escape_char != '"'
+                          else text[end + 1:end + 2] != '"'):
+            value = text[start:end]
+            index = end + 1
+        else:
+            value, index = self._get_escaped_value(start)
+
+        self._char_index = index
+        self._token = text[index] if index < self._length else self._end_of_text()
+        return value
+
+
+    def _skip_value(self):
+        self._match_token('"')
+
+        text, start = self._text, self._char_index + 1
+        end = text.find('"', start)
+        if end != -1 and (text.find(self._escape_char, start, end) == -1
+                          if self._escape_char != '"'
+                          else text[end + 1:end + 2] != '"'):
+            index = end + 1
+        else:
+            index = self._skip_escaped_value(start)
+
+        self._char_index = index
+        self._token = text[index] if index < self._length else self._end_of_text()
+
+
+    def _skip_escaped_value(self, start):
+        text, escape_char = self._text, self._escape_char
+        while True:
+            match = self._value_special.search(text, start)
+            if not match:
+                self._end_of_text()
+                return self._length
+
+            index = match.start()
+            char = text[index]
+            if char == escape_char:
+                if index + 1 >= self._length:
+                    self._end_of_text()
+                if text[index + 1:index + 2] in ('"', escape_char):
+                    start = index + 2
+                    continue
+
+            if char == '"':
+                return index + 1
+            start = index + 1
+
+
+    def _get_escaped_value(self, start):
+        text, escape_char = self._text, self._escape_char
+        value_lst = []
+        while True:
+            match = self._value_special.search(text, start)
+            if not match:
+                self._end_of_text()
+                value_lst.append(text[start:])
+                return ''.join(value_lst), self._length
+
+            index = match.start()
+            char = text[index]
+            if char == escape_char:
+                if index + 1 >= self._length:
+                    self._end_of_text()
+                if text[index + 1:index + 2] in ('"', escape_char):
+                    value_lst.append(text[start:index])
+                    value_lst.append(text[index + 1])
+                    start = index + 2
+                    continue
+
+            if char == '"':
+                value_lst.append(text[start:index])
+                return ''.join(value_lst), index + 1
+            value_lst.append(text[start:index + 1])
+            start = index + 1
+
+
+    def _next_keyword(self):
+        text, index, length = self._text, self._char_index, self._length
+        while index < length and text[index] == ' ':
+            index += 1
+        if index >= length:
+            self._end_of_text()
+            self._char_index = index
+            self._token = None
+            self._keyword = None
+            return
+
+        end = text.find(' ', index)
+        if end == -1:
+            self._end_of_text()
+            end = length
+        self._keyword = text[index:end]
+        self._char_index = end
+        self._token = text[end] if end < length else None
+
+
+    def _skip_spaces(self):
+        if self._token != ' ':
+            return
+        text, index, length = self._text, self._char_index + 1, self._length
+        while index < length and text[index] == ' ':
+            index += 1
+        self._char_index = index
+        self._token = text[index] if index < length else self._end_of_text()
+
+
+    def _next_token(self):
+        self._char_index += 1
+        self._token = (self._text[self._char_index] if self._char_index < self._length
+                       else self._end_of_text())
+
+
+    def _seek(self, char_index):
+        self._char_index = char_index - 1
+        self._next_token()
+
+
+    def _end_of_text(self):
+        return None
+
+
+    def _match_keyword(self, expected):
+        if self._keyword != expected:
+            raise self._error('expecting keyword "%s" but found "%s"'
+                              % (expected, self._keyword), self._char_index-1)
+
+
+    def _match_end(self):
+        self._next_keyword()
+        if self._keyword:
+            raise self._error('extra data "%s"' % self._keyword, self._char_index-1)
+
+
+    def _match_token(self, expected):
+        if self._token != expected:
+            raise self._error('expecting token "%s" but found "%s"'
+                              % (expected, self._token), self._char_index)
+
+
+    def _error(self, message, char_index):
+        return SplunkFormatParserException(
+            '%s (char %s)' % (message, char_index + self._offset))
+
+
+def _create_parser(result, dialect, engine, encoding, stats=False, on_row=None,
+                   validate=False, errors=ParseErrors.RAISE, on_error=None,
+                   index_by=None, distinct=None, **options):
+    if not isinstance(result, str):
+        parser_class, args = _BytesParser, (result, dialect, encoding)
+    elif engine in (Engine.SLICE, Engine.PRESCAN):
+        parser_class, args = _Parser, (result, dialect)
+    elif engine == Engine.ITERATOR:
+        parser_class, args = _IteratorParser, (result, dialect)
+    else:
+        raise SplunkFormatParserException('unsupported engine "%s"' % engine)
+    prescan = (engine == Engine.PRESCAN and numpy is not None
+               and len(result) >= _PRESCAN_MIN_LENGTH and not validate
+               and not stats and on_row is None and errors == ParseErrors.RAISE
+               and index_by is None and distinct is None)
+    if prescan:
+        parser_class = _mixed(_PrescanningParser, parser_class)
+    if errors != ParseErrors.RAISE:
+        parser_class = _mixed(_LenientParser, parser_class)
+    if index_by is not None or distinct is not None:
+        parser_class = _mixed(_IndexingParser, parser_class)
+    if validate:
+        parser = _mixed(_ValidatingParser, parser_class)(*args)
+        parser._start_validation(dialect, encoding)
+    elif stats or on_row is not None:
+        parser = _mixed(_InstrumentedParser, parser_class)(*args)
+        parser._start_stats(on_row)
+    else:
+        parser = parser_class(*args)
+    if prescan:
+        parser._start_prescan()
+    if errors != ParseErrors.RAISE:
+        parser._start_recovery(dialect, encoding, on_error)
+    if index_by is not None or distinct is not None:
+        format = options.get('format', Format.FLAT_JSON)
+        parser._index = _RowIndex(index_by, distinct, nested=format == Format.JSON,
+                                  start=1 if format == Format.CSV else 0)
+    parser._configure(**options)
+    return parser
+
+
+def _report_stats(rows, parser, callback):
+    yield from rows
+    callback(parser._finish_stats())
+
+
+@lru_cache(maxsize=None)
+def _mixed(mixin, parser_class):
+    # The optional behaviours of a parse, such as stats, validation, recovery
+    # and indexes, are mixins that are only mixed into the parser class when
+    # they are asked for, so that other parses do not pay for them.
+    return type(mixin.__name__.replace('Parser', '') + parser_class.__name__.lstrip('_'),
+                (mixin, parser_class), {})
+
+
+class _ValidatingParser:
+    """Walks the grammar of a parse for validate without building any rows.
+
+    The slice engines match a whole field and the keyword after it with one
+    _field_pattern match, so a row costs one match per field. The pattern only
+    matches what the grammar methods accept, and a row it does not match is
+    walked again by them from its start, so that errors are raised exactly as
+    by parse.
+    """
+
+    _field_pattern = None
+
+    def _start_validation(self, dialect, encoding):
+        self._stats = ParseStats()
+        settings = dialect._settings
+        if isinstance(self, _BytesParser):
+            settings = dialect._latin1_settings(encoding)
+            pattern = _field_pattern(*settings[2:4], settings[6], settings[8])
+            self._field_pattern = re.compile(pattern.pattern.encode('latin-1'))
+        elif not isinstance(self, _IteratorParser):
+            self._field_pattern = _field_pattern(*settings[2:4], settings[6], settings[8])
+
+
+    def _parse_column(self):
+        stats = self._stats
+        if self._field_pattern is not None and self._keyword == self._column_prefix:
+            match_field, text = self._field_pattern.match, self._text
+            index = self._char_index
+            fields = groups = 0
+            match = match_field(text, index)
+            while match is not None:
+                fields += 1
+                if match.start(1) != -1:
+                    groups += 1
+                index = match.end()
+                if match.start(3) != -1:
+                    self._char_index = index - 1
+                    self._next_token()
+                    self._keyword = self._column_end
+                    stats.fields += fields
+                    stats.multivalue_groups += groups
+                    stats.rows += 1
+                    return
+                match = match_field(text, index)
+
+        self._match_keyword(self._column_prefix)
+
+        while self._token:
+            self._skip_spaces()
+
+            if self._token == '(':
+                self._get_key_multivalue()
+                stats.multivalue_groups += 1
+            else:
+                self._get_key_value()
+            stats.fields += 1
+
+            self._next_keyword()
+            if self._keyword != self._column_separator:
+                break
+
+        self._match_keyword(self._column_end)
+        stats.rows += 1
+
+
+    def _get_key_value(self):
+        self._skip_spaces()
+        key = self._get_key()
+        self._skip_value()
+        return key, _SKIPPED
+
+
+class _LenientParser:
+    """Skips malformed rows instead of raising, for errors=ParseErrors.SKIP and
+    ParseErrors.COLLECT.
+
+    After a row fails, the later row breaks, the column end, row separator and
+    column prefix keywords, are tried in order and the parse carries on at the
+    first one that is followed by a row that parses. Breaks inside quotes,
+    counted from the start of the failed row, are only tried if none outside
+    them is followed by a row, so that a value is not taken for rows, while a
+    value that lost its closing quote, which turns the quotes after it around,
+    is still recovered from.
+    """
+
+    def _start_recovery(self, dialect, encoding, on_error):
+        self._errors = []
+        self._on_error = on_error
+        settings = dialect._settings
+        if isinstance(self, _BytesParser):
+            settings = dialect._latin1_settings(encoding)
+        patterns = _recovery_patterns(settings[3], settings[4], settings[1], settings[5])
+        if isinstance(self, _BytesParser):
+            patterns = (re.compile(pattern.pattern.encode('latin-1'))
+                        for pattern in patterns)
+        self._row_break, self._result_end = patterns
+
+
+    def _parse_rows(self):
+        start, error = self._char_index, None
+        while True:
+            if error is None:
+                try:
+                    row = self._parse_next_row()
+                except SplunkFormatParserException as row_error:
+                    error = row_error
+            if error is not None:
+                row, error = self._recover(error, start), None
+                if row is _SKIPPED:
+                    return
+            yield row
+
+            start = self._char_index
+            self._next_keyword()
+            if self._keyword == self._row_separator:
+                start = self._char_index
+            elif self._keyword == self._row_end:
+                return
+            else:
+                try:
+                    self._match_keyword(self._row_end)
+                except SplunkFormatParserException as row_error:
+                    error = row_error
+
+
+    def _parse_next_row(self):
+        fields, columns = len(self._fields), self._columns
+        width = len(columns.values) if columns is not None else 0
+        try:
+            self._next_keyword()
+            return self._parse_column()
+        except SplunkFormatParserException:
+            # Forget the keys and column values of the part of the row that
+            # was read.
+            for key in list(islice(self._fields, fields, None)):
+                del self._fields[key]
+            if columns is not None:
+                for key in list(islice(columns.values, width, None)):
+                    del columns.values[key]
+                for column in columns.values.values():
+                    del column[columns.count:]
+            raise
+
+
+    def _recover(self, error, start):
+        # Skip from the start of the failed row to the next row break a row
+        # parses after, and return that row, or _SKIPPED at the end of the rows.
+        text, start = self._text, start + 1
+        for inside in (False, True):
+            position = scanned = start
+            quoted = False
+            while True:
+                match = self._row_break.search(text, position)
+                if match is None:
+                    break
+                position = match.start(1)
+                quoted = self._quoted(scanned, match.start(), quoted)
+                scanned = match.start()
+                if quoted != inside:
+                    continue
+                self._seek(match.start(2))
+                try:
+                    row = self._parse_next_row()
+                except SplunkFormatParserException:
+                    continue
+                self._skip(error, start, match.start(1))
+                return row
+
+        match = self._result_end.search(text, start)
+        if match is not None:
+            self._seek(match.start(1))
+            self._next_keyword()
+            self._skip(error, start, match.start(1))
+        else:
+            # The result is cut off, everything after the last row is skipped.
+            self._seek(self._length)
+            self._keyword = self._row_end
+            self._skip(error, min(start, self._length), self._length)
+        return _SKIPPED
+
+
+    def _quoted(self, start, end, quoted):
+        # Whether end is inside quotes, given whether start is. Inside them an
+        # escape character escapes a quote or escape character after it.
+        text, special = self._text, self._value_special
+        while True:
+            match = special.search(text, start, end)
+            if match is None:
+                return quoted
+            index = match.start()
+            if text[index:index + 1] in ('"', b'"'):
+                quoted = not quoted
+                start = index + 1
+            elif quoted and special.match(text, index + 1):
+                start = index + 2
+            else:
+                start = index + 1
+
+
+    def _match_end(self):
+        start = self._char_index
+        try:
+            super()._match_end()
+        except SplunkFormatParserException as error:
+            self._skip(error, start + 1, self._length)
+
+
+    def _skip(self, error, start, end):
+        message, char_index = getattr(error, '_position', (str(error), None))
+        error = ParseError(message, char_index, start + self._offset, end + self._offset)
+        self._errors.append(error)
+        if self._on_error is not None:
+            self._on_error(error)
+
+
+    def _error(self, message, char_index):
+        error = super()._error(message, char_index)
+        error._position = (message, char_index + self._offset)
+        return error
+
+
+@lru_cache(maxsize=None)
+def _recovery_patterns(column_end, row_separator, column_prefix, row_end):
+    # Group 1 starts after the column end of the skipped row, and group 2 at
+    # the spaces before the column prefix of the next row.
+    row_break = re.compile(r' +%s( +%s)( +)%s(?= )' % (
+        re.escape(column_end), re.escape(row_separator), re.escape(column_prefix)))
+    result_end = re.compile(r' +%s( +)%s *\Z' % (re.escape(column_end),
+                                                 re.escape(row_end)))
+    return row_break, result_end
+
+
+class _IndexingParser:
+    """Fills the indexes and distinct values of index_by and distinct with every
+    row as it is built. Format.COLUMNAR is indexed a column at a time once its
+    columns are converted."""
+
+    def _parse_column(self):
+        row = super()._parse_column()
+        if row is not None:
+            self._index._add_row(row)
+        return row
+
+
+    def _parse_columnar(self):
+        columns = super()._parse_columnar()
+        self._index._add_columns(columns)
+        return columns
+
+
+class _RowIndex:
+    """The indexes and distinct values of a parse, by key."""
+
+    def __init__(self, index_by, distinct, nested=False, start=0):
+        self.indexes = {key: {} for key in index_by or ()}
+        self.distinct = {key: set() for key in distinct or ()}
+        self.position = start
+        # Rows of Format.JSON are looked up along the nested keys of a key.
+        self._nested = nested
+        self._paths = {key: tuple(key.split('.'))
+                       for key in [*self.indexes, *self.distinct]}
+
+
+    def _add_row(self, row):
+        position = self.position
+        self.position = position + 1
+        get = row.get if not self._nested else partial(_nested_value, row, self._paths)
+        for key, index in self.indexes.items():
+            value = get(key)
+            if value is None:
+                continue
+            if value.__class__ is not list:
+                positions = index.get(value)
+                if positions is None:
+                    index[value] = [position]
+                else:
+                    positions.append(position)
+                continue
+            for element in value:
+                positions = index.get(element)
+                if positions is None:
+                    index[element] = [position]
+                elif positions[-1] != position:
+                    positions.append(position)
+        for key, values in self.distinct.items():
+            value = get(key)
+            if value is None:
+                continue
+            if value.__class__ is list:
+                values.update(value)
+            else:
+                values.add(value)
+
+
+    def _add_columns(self, columns):
+        for key, index in self.indexes.items():
+            for position, value in _iter_column(columns.get(key)):
+                positions = index.get(value)
+                if positions is None:
+                    index[value] = [position]
+                elif positions[-1] != position:
+                    positions.append(position)
+        for key, values in self.distinct.items():
+            values.update(value for _, value in _iter_column(columns.get(key)))
+
+
+    def _merge(self, other, offset):
+        for key, index in other.indexes.items():
+            merged = self.indexes[key]
+            for value, positions in index.items():
+                shifted = [position + offset for position in positions]
+                if value in merged:
+                    merged[value].extend(shifted)
+                else:
+                    merged[value] = shifted
+        for key, values in other.distinct.items():
+            self.distinct[key] |= values
+
+
+def _nested_value(row, paths, key):
+    *parents, last = paths[key]
+    for name in parents:
+        row = row.get(name)
+        if row.__class__ not in (dict, NestedRow):
+            return None
+    value = row.get(last)
+    # A key with nested keys below it has no value of its own.
+    return None if value.__class__ in (dict, NestedRow) else value
+
+
+def _iter_column(column):
+    # The row number and value of every value of a column, element by element
+    # for multivalue columns.
+    if column is None:
+        return
+    if isinstance(column, dict):
+        offsets, values = column['offsets'], column['values']
+        for position in range(len(offsets) - 1):
+            for value in values[offsets[position]:offsets[position + 1]]:
+                yield position, value
+        return
+    for position, value in enumerate(column):
+        if value is None:
+            continue
+        if value.__class__ is list:
+            for element in value:
+                yield position, element
+        else:
+            yield position, value
+
+
+class _InstrumentedParser:
+    """Counts the ParseStats of a parse and calls its row hook.
+
+    The counts of a row are only added to the stats once the row is complete.
+    An IncrementalParser counts the fields of a row as its steps complete them,
+    see _start_row and _end_row.
+    """
+
+    def _start_stats(self, on_row):
+        self._stats = ParseStats()
+        self._on_row = on_row
+        # values, fields, multivalue groups, escapes and scan seconds of a row
+        self._row_counts = [0, 0, 0, 0, 0.0]
+
+
+    def _finish_stats(self):
+        stats = self._stats
+        stats.scanned = self._offset + min(max(self._char_index, 0), self._length)
+        stats.distinct_keys = len(self._selected_fields())
+        return stats
+
+
+    def _parse_column(self):
+        self._start_row()
+        return self._end_row(super()._parse_column())
+
+
+    def _start_row(self):
+        self._row_counts = [0, 0, 0, 0, 0.0]
+        self._row_start = time.perf_counter()
+
+
+    def _end_row(self, row):
+        elapsed = time.perf_counter() - self._row_start
+        counts = self._row_counts
+
+        stats = self._stats
+        stats.rows += 1
+        stats.values += counts[0]
+        stats.fields += counts[1]
+        stats.multivalue_groups += counts[2]
+        stats.escapes += counts[3]
+        stats.scan_seconds += counts[4]
+        stats.build_seconds += elapsed - counts[4]
+        if self._on_row is not None and row is not None:
+            self._on_row(row)
+        return row
+
+
+    def _get_key_multivalue(self):
+        values = self._row_counts[0]
+        key, value = super()._get_key_multivalue()
+        self._count_multivalue(self._row_counts[0] - values)
+        return key, value
+
+
+    def _count_multivalue(self, values):
+        counts = self._row_counts
+        counts[1] -= values - 1
+        counts[2] += 1
+
+
+    def _get_key_value(self):
+        start = time.perf_counter()
+        key, value = super()._get_key_value()
+        counts = self._row_counts
+        counts[0] += 1
+        counts[1] += 1
+        counts[4] += time.perf_counter() - start
+        return key, value
+
+
+    def _get_value(self):
+        start = self._char_index
+        value = super()._get_value()
+        # Every escape sequence between the quotes stands for one character.
+        size = (len(value.encode(self._encoding)) if isinstance(self, _BytesParser)
+                else len(value))
+        self._row_counts[3] += self._char_index - start - 2 - size
+        return value
+
+
+    def _convert(self, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._stats.convert_seconds += time.perf_counter() - start
+
+
+def _parse_format(parser, format):
+    if format == Format.FLAT_JSON:
+        return parser._parse_flat_json()
+    elif format == Format.CSV:
+        return parser._parse_csv()
+    elif format == Format.JSON:
+        return parser._parse_json()
+    elif format == Format.COLUMNAR:
+        return parser._parse_columnar()
+    else:
+        raise SplunkFormatParserException('unsupported format "%s"' % format)
+
+
+def _check_row_type(row_type, format):
+    try:
+        row_type = RowType(row_type)
+    except ValueError:
+        raise SplunkFormatParserException('unsupported row type "%s"' % row_type) from None
+    if (row_type == RowType.COMPACT and format not in (Format.FLAT_JSON, Format.CSV)
+            or row_type == RowType.LAZY and format != Format.JSON):
+        raise SplunkFormatParserException('row type "%s" is not supported by format "%s"'
+                                          % (row_type, format))
+    return row_type
+
+
+def _check_column_type(column_type, format):
+    try:
+        column_type = ColumnType(column_type)
+    except ValueError:
+        raise SplunkFormatParserException(
+            'unsupported column type "%s"' % column_type) from None
+    if column_type != ColumnType.LIST and format != Format.COLUMNAR:
+        raise SplunkFormatParserException(
+            'column type "%s" is not supported by format "%s"' % (column_type, format))
+    if column_type == ColumnType.NUMPY and numpy is None:
+        raise SplunkFormatParserException('column type "%s" needs NumPy' % column_type)
+    return column_type
+
+
+def _check_errors(errors, streamed=False):
+    if callable(errors):
+        return ParseErrors.SKIP
+    try:
+        errors = ParseErrors(errors)
+    except ValueError:
+        raise SplunkFormatParserException('unsupported errors "%s"' % errors) from None
+    if streamed and errors == ParseErrors.COLLECT:
+        raise SplunkFormatParserException(
+            'errors "%s" cannot be streamed, pass a callable instead' % errors)
+    return errors
+
+
+def _check_conversion_errors(conversion_errors):
+    try:
+        return ConversionErrors(conversion_errors)
+    except ValueError:
+        raise SplunkFormatParserException(
+            'unsupported conversion errors "%s"' % conversion_errors) from None
+
+
+def _to_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1'):
+        return True
+    if lowered in ('false', '0'):
+        return False
+    raise ValueError('not a bool: %r' % value)
+
+
+def _to_time(value):
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        time = datetime.fromisoformat(value)
+    # ISO 8601 strings without an offset are taken as UTC like epoch seconds.
+    return time if time.tzinfo else time.replace(tzinfo=timezone.utc)
+
+
+_CONVERTERS = {
+    ValueType.INT: int,
+    ValueType.FLOAT: float,
+    ValueType.BOOL: _to_bool,
+    ValueType.TIME: _to_time,
+}
+
+# The types tried in order when types are inferred.
+_INFERRED_TYPES = (ValueType.INT, ValueType.FLOAT, ValueType.BOOL, ValueType.TIME)
+
+# The fields tried as ValueType.TIME first, as Splunk's epoch seconds would
+# otherwise be inferred as numbers.
+_TIME_FIELDS = ('_time',)
+
+# The rows sampled with infer_types=True.
+_INFER_ROWS = 100
+
+
+def _resolve_types(result, dialect, engine, encoding, types, infer_types, fields,
+                   exclude):
+    converters = {}
+    if infer_types:
+        sample = _INFER_ROWS if infer_types is True else infer_types
+        # Malformed rows are left for the parse itself to raise or skip.
+        parser = _create_parser(result, dialect, engine, encoding, fields=fields,
+                                exclude=exclude, errors=ParseErrors.SKIP)
+        converters.update(_infer_types(islice(parser._iter_flat_json(), sample)))
+    for key, value_type in (types or {}).items():
+        if callable(value_type):
+            converters[key] = value_type
+            continue
+        try:
+            value_type = ValueType(value_type)
+        except ValueError:
+            raise SplunkFormatParserException(
+                'unsupported value type "%s"' % value_type) from None
+        if value_type == ValueType.STR:
+            converters.pop(key, None)
+        else:
+            converters[key] = _CONVERTERS[value_type]
+    return converters or None
+
+
+def _infer_types(rows):
+    samples = {}
+    for row in rows:
+        for key, value in row.items():
+            values = samples.setdefault(key, [])
+            if isinstance(value, list):
+                values += value
+            else:
+                values.append(value)
+
+    converters = {}
+    for key, values in samples.items():
+        value_types = _INFERRED_TYPES
+        if key in _TIME_FIELDS:
+            value_types = (ValueType.TIME,) + value_types
+        for value_type in value_types:
+            converter = _CONVERTERS[value_type]
+            try:
+                for value in values:
+                    converter(value)
+            except (ValueError, TypeError, OverflowError):
+                continue
+            converters[key] = converter
+            break
+    return converters
+
+
+def _type_name(converter):
+    for value_type, known in _CONVERTERS.items():
+        if converter is known:
+            return value_type.value
+    return getattr(converter, '__name__', repr(converter))
+
+
+def _convert_columns(columns, types):
+    for key, converter in types.items():
+        column = columns.get(key)
+        if column is None:
+            continue
+        if isinstance(column, dict):
+            column['values'] = _convert_column(column['values'], converter)
+        else:
+            columns[key] = _convert_column(column, converter)
+    return columns
+
+
+# The array typecodes and NumPy dtypes of the columns of each converter.
+_ARRAY_TYPES = {int: 'q', float: 'd'}
+_NUMPY_TYPES = {int: 'int64', float: 'float64', _to_bool: 'bool'}
+
+
+def _typed_columns(columns, types, column_type):
+    for key, converter in types.items():
+        column = columns.get(key)
+        if column is None:
+            continue
+        if isinstance(column, dict):
+            column['values'] = _typed_column(column['values'], converter, column_type)
+        else:
+            columns[key] = _typed_column(column, converter, column_type)
+    return columns
+
+
+def _typed_column(values, converter, column_type):
+    if column_type == ColumnType.NUMPY:
+        dtype = _NUMPY_TYPES.get(converter)
+    else:
+        dtype = _ARRAY_TYPES.get(converter)
+    value_type = bool if converter is _to_bool else converter
+    # Arrays have no null marker, so a column with a missing or unconverted
+    # value stays a list.
+    if dtype is None or any(type(value) is not value_type for value in values):
+        return values
+    try:
+        if column_type == ColumnType.NUMPY:
+            return numpy.array(values, dtype)
+        return array(dtype, values)
+    except OverflowError:
+        return values
+
+
+def _convert_column(values, converter):
+    try:
+        if None not in values:
+            return list(map(converter, values))
+        return [value if value is None else converter(value) for value in values]
+    except (ValueError, TypeError, OverflowError):
+        return [_convert_value(converter, value) for value in values]
+
+
+def _convert_value(converter, value):
+    if value is None:
+        return None
+    try:
+        return converter(value)
+    except (ValueError, TypeError, OverflowError):
+        return value
+
+
+# Rows joined into one write by SplunkFormatParser.format.
+_FORMAT_BATCH = 1024
+
+_PLAIN_KEY = re.compile(r'\w+')
+
+
+def _write_rows(rows, dialect, write):
+    escape_char, mvsep = dialect.escape_char, ' %s ' % dialect.mvsep
+    column_prefix = dialect.column_prefix + ' '
+    column_separator = ' %s ' % dialect.column_separator
+    column_end = ' ' + dialect.column_end
+    row_prefix, row_separator = dialect.row_prefix + ' ', ' %s ' % dialect.row_separator
+    keys = {}
+
+    def format_value(value):
+        if not isinstance(value, str):
+            value = str(value)
+        if escape_char == '"':
+            return '"%s"' % value.replace('"', '""')
+        if escape_char in value:
+            value = value.replace(escape_char, escape_char * 2)
+        if '"' in value:
+            value = value.replace('"', escape_char + '"')
+        return '"%s"' % value
+
+    def format_column(row):
+        fields = []
+        for key, value in _flatten(row):
+            if value is None:
+                continue
+            name = keys.get(key)
+            if name is None:
+                name = keys[key] = _format_key(key)
+            if isinstance(value, list):
+                values = [name + format_value(item) for item in value if item is not None]
+                if values:
+                    fields.append('( %s )' % mvsep.join(values))
+            else:
+                fields.append(name + format_value(value))
+        if not fields:
+            raise SplunkFormatParserException('row has no fields: %r' % (row,))
+        return column_prefix + column_separator.join(fields) + column_end
+
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(format_column(row))
+        count += 1
+        if len(batch) == _FORMAT_BATCH:
+            write((row_prefix if count == len(batch) else row_separator)
+                  + row_separator.join(batch))
+            batch = []
+    if not count:
+        write(dialect.emptystr)
+        return 0
+    if batch:
+        write((row_prefix if count == len(batch) else row_separator)
+              + row_separator.join(batch))
+    write(' ' + dialect.row_end)
+    return count
+
+
+def _format_key(key):
+    if '=' in key or key.startswith('"') or key.endswith('"'):
+        raise SplunkFormatParserException('key cannot be formatted: "%s"' % key)
+    return (key if _PLAIN_KEY.fullmatch(key) else '"%s"' % key) + '='
+
+
+def _to_csv(results, fields):
+    fields = sorted(fields)
+    res_lst = [fields]
+    for res in results:
+        values = []
+        for field in fields:
+            values.append(res.get(field, ''))
+        res_lst.append(values)
+    return res_lst
+
+
+class _Columns:
+    """One list of values per field, filled in row by row. Multivalue fields
+    are kept as lists in the column until to_dict lays them out as offsets and
+    values."""
+
+    def __init__(self):
+        self.values = {}
+        self.count = 0
+        self.multivalue = set()
+
+
+    def extend(self, other):
+        for key, column in other.values.items():
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [None] * self.count
+            values.extend(column)
+        self.count += other.count
+        for values in self.values.values():
+            if len(values) < self.count:
+                values.extend([None] * (self.count - len(values)))
+        self.multivalue |= other.multivalue
+
+
+    def to_dict(self):
+        columns = {}
+        for key, column in self.values.items():
+            if (key not in self.multivalue
+                    or not any(isinstance(value, list) for value in column)):
+                columns[key] = column
+                continue
+
+            offsets = array('q', [0])
+            values = []
+            for value in column:
+                if isinstance(value, list):
+                    values.extend(value)
+                elif value is not None:
+                    values.append(value)
+                offsets.append(len(values))
+            columns[key] = {'offsets': offsets, 'values': values}
+        return columns
+
+
+def _parse_parallel(result, dialect, format, engine, encoding, workers, options,
+                    executor=None):
+    if format not in (Format.FLAT_JSON, Format.JSON, Format.CSV, Format.COLUMNAR):
+        raise SplunkFormatParserException('unsupported format "%s"' % format)
+    if isinstance(result, memoryview):
+        result = bytes(result)
+
+    bounds = _split_rows(result, dialect, encoding, workers)
+    if len(bounds) <= 2:
+        return _parse_whole(result, dialect, format, engine, encoding, options)
+
+    piece_format = Format.FLAT_JSON if format == Format.CSV else format
+    last = len(bounds) - 2
+    interner = options['interner']
+    # The row hook cannot be sent to the pool, it is called once the pieces are back.
+    # Pieces are parsed strictly, a malformed result is skipped over as a whole
+    # below so that the skipped spans are the same as without workers.
+    # Pieces of Format.CSV are parsed as Format.FLAT_JSON, their positions count
+    # from the first row.
+    piece_options = dict(options, on_row=None, errors=ParseErrors.RAISE, on_error=None,
+                         format=piece_format)
+    index = None
+    if options['index_by'] is not None or options['distinct'] is not None:
+        index = _RowIndex(options['index_by'], options['distinct'])
+        if format == Format.COLUMNAR:
+            # The merged columns are indexed instead.
+            piece_options.update(index_by=None, distinct=None)
+    if interner is not None:
+        piece_options['interner'] = Interner(interner.max_values)
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        futures = [executor.submit(_parse_piece, result[start:end], dialect, engine,
+                                   encoding, piece_format, index == 0, index == last,
+                                   piece_options)
+                   for index, (start, end) in enumerate(zip(bounds, bounds[1:]))]
+        try:
+            pieces = [future.result() for future in futures]
+        except SplunkFormatParserException:
+            pieces = None
+
+    if pieces is None:
+        # Pieces of a valid result always parse, so the result is malformed. It is
+        # parsed again as a whole to raise the error a sequential parse raises.
+        return _parse_whole(result, dialect, format, engine, encoding, options)
+
+    stats = ParseStats() if options['stats'] else None
+    fields = set()
+    for _, piece_fields, piece_interner, piece_stats, _ in pieces:
+        fields.update(piece_fields)
+        if interner is not None:
+            interner._merge_counts(piece_interner)
+        if stats is not None:
+            stats._merge(piece_stats)
+    if stats is not None:
+        stats.distinct_keys = len(fields)
+
+    if format == Format.COLUMNAR:
+        start = time.perf_counter()
+        columns = _Columns()
+        for piece_columns, _, _, _, _ in pieces:
+            columns.extend(piece_columns)
+        data = columns.to_dict()
+        if options['types'] and options['conversion_errors'] == ConversionErrors.STR:
+            data = _convert_columns(data, options['types'])
+        if index is not None:
+            index._add_columns(data)
+    else:
+        data = []
+        for rows, _, _, _, piece_index in pieces:
+            if index is not None:
+                index._merge(piece_index, len(data) + (format == Format.CSV))
+            data.extend(rows)
+        if options['on_row'] is not None:
+            for row in data:
+                options['on_row'](row)
+        start = time.perf_counter()
+        if format == Format.CSV:
+            data = _to_csv(data, fields)
+    if stats is not None:
+        stats.convert_seconds += time.perf_counter() - start
+    return data, stats, [] if options['errors'] != ParseErrors.RAISE else None, index
+
+
+def _parse_whole(result, dialect, format, engine, encoding, options):
+    parser = _create_parser(result, dialect, engine, encoding, **options)
+    data = _parse_format(parser, format)
+    return (data, parser._finish_stats() if options['stats'] else None,
+            parser._errors if options['errors'] != ParseErrors.RAISE else None,
+            getattr(parser, '_index', None))
+
+
+def _parse_piece(piece, dialect, engine, encoding, format, first, last, options):
+    parser = _create_parser(piece, dialect, engine, encoding, **options)
+    if format == Format.COLUMNAR:
+        parser._columns = _Columns()
+    rows = list(parser._iter_piece(first, last))
+    if parser._stats is not None:
+        parser._finish_stats()
+    if format == Format.COLUMNAR:
+        rows = parser._columns
+    return (rows, parser._selected_fields(), parser._interner, parser._stats,
+            getattr(parser, '_index', None))
+
+
+def _split_rows(text, dialect, encoding, pieces):
+    """Find up to pieces - 1 row separators outside of quoted values, roughly
+    evenly spread over the text, and return the bounds of the pieces between them.
+
+    A quote is inside a value if an odd number of unescaped quotes comes before
+    it, so the quotes are counted with str.count and only the escape sequences
+    are looked at one by one.
+    """
+
+    column_end, quote, escape_char = dialect.column_end, '"', dialect.escape_char
+    separator = ' '.join((column_end, dialect.row_separator, dialect.column_prefix))
+    if not isinstance(text, str):
+        column_end, separator, quote, escape_char = (
+            column_end.encode(encoding), separator.encode(encoding), b'"',
+            escape_char.encode(encoding))
+    escape_pairs = _escape_pair_pattern(escape_char)
+    count = getattr(text, 'count', None) or (lambda sub, start, end: text[start:end].count(sub))
+
+    bounds = [0]
+    position = 0
+    inside = False
+    for piece in range(1, pieces):
+        index = text.find(separator, max(len(text) * piece // pieces, position + 1))
+        while index != -1:
+            quotes = count(quote, position, index)
+            if escape_char != quote and text.find(escape_char, position, index) != -1:
+                quotes -= sum(1 for pair in escape_pairs.finditer(text, position, index)
+                              if pair.group()[-1:] == quote)
+            inside ^= quotes % 2 == 1
+            position = index
+            if not inside:
+                break
+            index = text.find(separator, index + 1)
+        if index == -1:
+            break
+        bounds.append(index + len(column_end))
+    bounds.append(len(text))
+    return bounds
+
+
+def _iter_stream(parser, stream, encoding, size=1 << 16):
+    decoder = None
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        if not isinstance(chunk, str):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk)
+        yield from parser.feed(chunk)
+    if decoder is not None:
+        yield from parser.feed(decoder.decode(b'', final=True))
+    yield from parser.close()
+
+
+async def _aiter_chunks(stream, size):
+    if hasattr(stream, 'read'):
+        while True:
+            chunk = await stream.read(size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in stream:
+            yield chunk
+
+
+def _feed_chunk(parser, decoder, chunk):
+    if not isinstance(chunk, str):
+        chunk = decoder.decode(chunk)
+    return parser.feed(chunk)
+
+
+def _spill_rows(rows, file):
+    count = 0
+    for row in rows:
+        pickle.dump(row, file, pickle.HIGHEST_PROTOCOL)
+        count += 1
+    file.seek(0)
+    return (pickle.load(file) for _ in range(count))
+
+
+def _check_escape_char(escape_char):
+    if len(escape_char) != 1:
+        raise SplunkFormatParserException(
+            'escape character can only be 1 character long: "%s"'
+            % escape_char)
+
+
+@contextmanager
+def _map_file(path):
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+@lru_cache(maxsize=None)
+def _field_pattern(column_separator, column_end, mvsep, escape_char):
+    # A field, either key="value" or a multivalue group of one key, followed by
+    # the column separator or the column end. Keywords are followed by a space
+    # or the end of the text as _next_keyword reads them.
+    escape = re.escape(escape_char)
+    if escape_char == '"':
+        value = '"[^"]*(?:""[^"]*)*"(?!")'
+    else:
+        value = '"[^"%s]*(?:%s(?:["%s]|(?!["%s]))[^"%s]*)*"' % ((escape,) * 5)
+    single = '[^ (][^=]*=' + value
+    group = r'\((?P<group>) *(?P<key>[^ ][^=]*)=%s(?: *%s(?= ) *(?P=key)=%s)+ *\)(?= |\Z)' % (
+        value, re.escape(mvsep), value)
+    return re.compile(r' *(?:%s|%s) *(?:%s(?= ) *|(?P<end>)%s(?= |\Z))' % (
+        single, group, re.escape(column_separator), re.escape(column_end)))
+
+
+def _value_special_pattern(escape_char):
+    if isinstance(escape_char, bytes):
+        return re.compile(b'[%s]' % re.escape(b'"' + escape_char))
+    return re.compile('[%s]' % re.escape('"' + escape_char))
+
+
+@lru_cache(maxsize=None)
+def _escape_pair_pattern(escape_char):
+    if isinstance(escape_char, bytes):
+        return re.compile(re.escape(escape_char) + b'[%s]' % re.escape(b'"' + escape_char))
+    return re.compile(re.escape(escape_char) + '[%s]' % re.escape('"' + escape_char))
+
+
+class _IteratorParser(_Parser):
+    """Character by character scanning engine, kept for comparison with the
+    slice based engine of _Parser."""
+
+    def __init__(self, text, dialect):
+        super().__init__(text, dialect)
+        self._iterator = iter(text)
+
+
+    def _get_key(self):       
+        # At the end of the text the key is empty, as for the slice engine, and
+        # the missing value is reported by _get_value.
+        key_lst = []
+        if self._token is not None:
+            key_lst.append(self._token)
+            self._next_token()
+        while self._token and self._token != '=':
+            key_lst.append(self._token)
+            self._next_token()
+        
+        self._next_token()
+        key = ''.join(key_lst).strip('"')
+        key = self._fields.setdefault(key, key)
+        return key
+
+
+    def _get_value(self):
+        self._match_token('"')
+        self._next_token()
+
+        value_lst = []
+        while self._token:
+            cur_char = self._token
+            self._next_token()
+            
+            if cur_char == self._escape_char and \
+               (self._token == '"' or self._token == self._escape_char):
+                value_lst.append(self._token)
+                self._next_token()
+                continue
+            
+            if cur_char == '"':
+                break
+            value_lst.append(cur_char)
+
+        return ''.join(value_lst)
+
+
+    def _skip_value(self):
+        self._get_value()
+
+
+    def _next_keyword(self):
+        while self._token and self._token == ' ':
+            self._next_token()
+        if not self._token:
+            self._keyword = None
+            return
+        
+        keyword_lst = [self._token]
+        self._next_token()
+        while self._token and self._token != ' ':
+            keyword_lst.append(self._token)
+            self._next_token()
+        
+        self._keyword = ''.join(keyword_lst)
+   
+
+    def _skip_spaces(self):
+        while self._token and self._token == ' ':
+            self._next_token()
+
+
+    def _next_token(self):
+        self._token = next(self._iterator, None)
+        self._char_index += 1
+
+
+    def _seek(self, char_index):
+        self._iterator = iter(self._text[char_index:])
+        self._char_index = char_index - 1
+        self._next_token()
+
+
+class _BytesParser(_Parser):
+    """Slice based scanning engine for a bytes-like buffer such as bytes,
+    memoryview or mmap. Delimiters and escape characters are matched as bytes
+    and only the keys and values are decoded. Character offsets count bytes."""
+
+    def __init__(self, buffer, dialect, encoding):
+        if isinstance(buffer, memoryview):
+            buffer = buffer.cast('B')
+        super().__init__(buffer, dialect)
+
+        escape_byte, self._value_special, self._keywords = \
+            dialect._byte_scanner(encoding)
+        self._encoding = encoding
+        self._escape_byte = escape_byte[0]
+        self._escaped_bytes = (b'"', escape_byte)
+
+
+    def _get_key(self):
+        text, start = self._text, self._char_index
+        match = _EQUALS_PATTERN.search(text, start + 1)
+        if match:
+            end = match.start()
+        else:
+            self._end_of_text()
+            end = self._length
+
+        self._char_index = index = end + 1
+        self._token = chr(text[index]) if index < self._length else self._end_of_text()
+        key = str(text[start:end], self._encoding).strip('"')
+        key = self._fields.setdefault(key, key)
+        return key
+
+
+    def _get_value(self):
+        self._match_token('"')
+
+        text, start = self._text, self._char_index + 1
+        match = self._value_special.search(text, start)
+        end = match.start() if match else -1
+        if end != -1 and text[end] == _QUOTE_BYTE and (
+                self._escape_byte != _QUOTE_BYTE or text[end + 1:end + 2] != b'"'):
+            value = str(text[start:end], self._encoding)
+            index = end + 1
+        else:
+            value, index = self._get_escaped_value(start)
+
+        self._char_index = index
+        self._token = chr(text[index]) if index < self._length else self._end_of_text()
+        return value
+
+
+    def _skip_value(self):
+        self._match_token('"')
+
+        text, start = self._text, self._char_index + 1
+        match = self._value_special.search(text, start)
+        end = match.start() if match else -1
+        if end != -1 and text[end] == _QUOTE_BYTE and (
+                self._escape_byte != _QUOTE_BYTE or text[end + 1:end + 2] != b'"'):
+            index = end + 1
+        else:
+            index = self._skip_escaped_value(start)
+
+        self._char_index = index
+        self._token = chr(text[index]) if index < self._length else self._end_of_text()
+
+
+    def _skip_escaped_value(self, start):
+        text, escape_byte = self._text, self._escape_byte
+        while True:
+            match = self._value_special.search(text, start)
+            if not match:
+                self._end_of_text()
+                return self._length
+
+            index = match.start()
+            byte = text[index]
+            if byte == escape_byte:
+                if index + 1 >= self._length:
+                    self._end_of_text()
+                if text[index + 1:index + 2] in self._escaped_bytes:
+                    start = index + 2
+                    continue
+
+            if byte == _QUOTE_BYTE:
+                return index + 1
+            start = index + 1
+
+
+    def _get_escaped_value(self, start):
+        text, escape_byte = self._text, self._escape_byte
+        value_lst = []
+        while True:
+            match = self._value_special.search(text, start)
+            if not match:
+                self._end_of_text()
+                value_lst.append(text[start:])
+                return str(b''.join(value_lst), self._encoding), self._length
+
+            index = match.start()
+            byte = text[index]
+            if byte == escape_byte:
+                if index + 1 >= self._length:
+                    self._end_of_text()
+                if text[index + 1:index + 2] in self._escaped_bytes:
+                    value_lst.append(text[start:index])
+                    value_lst.append(text[index + 1:index + 2])
+                    start = index + 2
+                    continue
+
+            if byte == _QUOTE_BYTE:
+                value_lst.append(text[start:index])
+                return str(b''.join(value_lst), self._encoding), index + 1
+            value_lst.append(text[start:index + 1])
+            start = index + 1
+
+
+    def _next_keyword(self):
+        text, index, length = self._text, self._char_index, self._length
+        while index < length and text[index] == _SPACE_BYTE:
+            index += 1
+        if index >= length:
+            self._end_of_text()
+            self._char_index = index
+            self._token = None
+            self._keyword = None
+            return
+
+        match = _SPACE_PATTERN.search(text, index)
+        if match:
+            end = match.start()
+        else:
+            self._end_of_text()
+            end = length
+        keyword = bytes(text[index:end])
+        self._keyword = self._keywords.get(keyword)
+        if self._keyword is None:
+            self._keyword = str(keyword, self._encoding, 'replace')
+        self._char_index = end
+        self._token = chr(text[end]) if end < length else None
+
+
+    def _skip_spaces(self):
+        if self._token != ' ':
+            return
+        text, index, length = self._text, self._char_index + 1, self._length
+        while index < length and text[index] == _SPACE_BYTE:
+            index += 1
+        self._char_index = index
+        self._token = chr(text[index]) if index < length else self._end_of_text()
+
+
+    def _next_token(self):
+        self._char_index += 1
+        self._token = (chr(self._text[self._char_index]) if self._char_index < self._length
+                       else self._end_of_text())
+
+
+_SPACE_PATTERN = re.compile(b' ')
+_EQUALS_PATTERN = re.compile(b'=')
+_SPACE_BYTE = ord(' ')
+_QUOTE_BYTE = ord('"')
+
+
+class _PrescanningParser:
+    """Scanning engine of Engine.PRESCAN, mixed into _Parser or _BytesParser.
+
+    The positions of the unescaped quotes are found with NumPy one window of
+    _PRESCAN_CHUNK characters at a time, as the rows reach it, so every quoted
+    key and value of the window is known up front while memory stays bounded
+    by the window. The rows are built from the gaps between the values, such as
+    ' AND host=' or ' ) OR ( host='. A gap is parsed once into the steps it
+    takes, such as ending the row or starting a multivalue, and looked up by its
+    text after that, so a field costs a dict lookup and two slices.
+
+    A row with a gap that is not just keywords and a key, such as an error, and
+    the last row are parsed by the grammar methods of the engine instead, which
+    raise the errors at their usual offsets, and the rows after it are scanned
+    again.
+    """
+
+    def _start_prescan(self):
+        if isinstance(self._text, str):
+            self._decode, self._escape_code = None, ord(self._escape_char)
+        else:
+            self._decode, self._escape_code = self._encoding, self._escape_byte
+        self._window = None
+        self._gap_steps = ({}, {}, {})
+
+
+    def _parse_rows(self):
+        while self._token:
+            start = yield from self._scan_rows()
+            self._seek(start)
+            self._next_keyword()
+            yield self._parse_column()
+
+            self._next_keyword()
+            if self._keyword != self._row_separator:
+                break
+
+
+    def _scan_rows(self):
+        """Yields the rows from the current position on, up to the last row or a
+        row it cannot build, and returns the position that row starts at."""
+        text, decode = self._text, self._decode
+        quote, equals = ('"', '=') if decode is None else (b'"', b'=')
+        view = text.__class__ is memoryview
+        doubled = self._escape_char == '"'
+        escape_char, unescape = self._escape_char, _escape_pair_pattern(self._escape_char).sub
+        gap_steps, fields, columns = self._gap_steps, self._fields, self._columns
+        project, skips, types, strict = (self._project, self._skips, self._types,
+                                         self._strict_types)
+        nested, set_nested = self._nested_paths, self._set_nested
+        intern = self._interner._intern if self._interner is not None else None
+
+        row_start = end = self._char_index
+        next_quote = chain.from_iterable(self._quote_batches(end)).__next__
+        state = 0
+        row = {}
+        multivalue_key = values = None
+        try:
+            while True:
+                opening = next_quote()
+                closing = next_quote()
+                gap = text[end:opening]
+                if view:
+                    gap = bytes(gap)
+                step = gap_steps[state].get(gap)
+                if step is None:
+                    step = gap_steps[state][gap] = self._parse_gap(gap, state)
+
+                if step.__class__ is str:
+                    key = step
+                elif not step:
+                    return row_start
+                else:
+                    close_multivalue, end_row, offset, state, key = step
+                    if close_multivalue:
+                        if columns is not None:
+                            columns.multivalue.add(multivalue_key)
+                        if not (project and skips(multivalue_key)):
+                            if nested is None or '.' not in multivalue_key:
+                                row[multivalue_key] = values
+                            else:
+                                set_nested(row, multivalue_key, values)
+                        multivalue_key = None
+                    if end_row:
+                        yield self._build_row(row)
+                        row = {}
+                        row_start = end + offset
+                    if key is None:
+                        key = text[opening + 1:closing]
+                        key = (str(key, decode) if decode is not None else key).strip('"')
+                        end = closing + 1
+                        opening = next_quote()
+                        closing = next_quote()
+                        if '=' in key or text[end:opening] != equals:
+                            return row_start
+                        key = fields.setdefault(key, key)
+                if doubled:
+                    while text[closing + 1:closing + 2] == quote:
+                        next_quote()
+                        closing = next_quote()
+                end = closing + 1
+
+                if state == 2:
+                    if multivalue_key is None:
+                        multivalue_key, values = key, []
+                    elif key != multivalue_key:
+                        return row_start
+                if project and skips(key):
+                    continue
+                value = text[opening + 1:closing]
+                if decode is not None:
+                    value = str(value, decode)
+                if doubled:
+                    if '"' in value:
+                        value = value.replace('""', '"')
+                elif escape_char in value:
+                    value = unescape(_unescape_pair, value)
+                if types is not None and key in types:
+                    try:
+                        value = types[key](value)
+                    except (ValueError, TypeError, OverflowError):
+                        if strict:
+                            return row_start
+                elif intern is not None:
+                    value = intern(value)
+
+                if state == 2:
+                    values.append(value)
+                elif nested is None or '.' not in key:
+                    row[key] = value
+                else:
+                    set_nested(row, key, value)
+        except (StopIteration, UnicodeDecodeError):
+            return row_start
+
+
+    def _quote_batches(self, start):
+        """Yields the positions of the unescaped quotes from start on in lists,
+        scanning the text one window at a time. The last window is kept, as
+        the scan usually starts again inside it after a row it cannot build."""
+
+        window = self._window
+        if window is None or not window[0] <= start < window[1]:
+            window = self._scan_window(start, _escape_run(self._text, start,
+                                                          self._escape_code))
+        base, end, quotes, run = window
+        index = int(numpy.searchsorted(quotes, start - base))
+        # The batches start small, as the scan may stop again a few rows later.
+        size = 64
+        while True:
+            offset = numpy.intp(base)
+            while index < len(quotes):
+                yield (quotes[index:index + size] + offset).tolist()
+                index += size
+                size = min(size * 2, _QUOTE_BATCH)
+            if end == len(self._text):
+                return
+            base, end, quotes, run = self._scan_window(end, run)
+            index = 0
+
+
+    def _scan_window(self, start, run):
+        """Finds the unescaped quotes of the window from start on, given the
+        run of escape characters right before it. A quote is escaped if an odd
+        run of escape characters comes right before it.
+
+        Returns:
+            Tuple: The start and end of the window, the quotes as int32 offsets
+                from its start and the run of escape characters at its end.
+        """
+
+        text, escape = self._text, self._escape_code
+        end = min(start + _PRESCAN_CHUNK, len(text))
+        chunk = _code_points(text, start, end)
+        quotes = numpy.flatnonzero(chunk == _QUOTE_BYTE)
+        if escape != _QUOTE_BYTE:
+            quotes, run = _unescaped_quotes(quotes, numpy.flatnonzero(chunk == escape),
+                                            run, len(chunk))
+        del chunk
+        self._window = start, end, quotes.astype(numpy.int32), run
+        return self._window
+
+
+    def _parse_gap(self, gap, state):
+        """Parses the text before a quoted key or value into the steps it takes.
+        state is 0 at the start of a row, 1 after a value and 2 after a value
+        of a multivalue.
+
+        Returns:
+            The key if the value is the next field or multivalue value, else a
+            tuple of whether a multivalue and the row end, the offset the next
+            row starts at, the next state and the key, or None if the key is
+            quoted. False if the gap is anything else.
+        """
+
+        if self._decode is not None:
+            try:
+                gap = str(gap, self._decode)
+            except UnicodeDecodeError:
+                return False
+        if gap.endswith('='):
+            gap, _, key = gap.rpartition(' ')
+            key = key[:-1]
+            if not key or '=' in key or key.startswith('('):
+                return False
+        elif gap.endswith(' '):
+            key = None
+        else:
+            return False
+
+        words = [(match.group(), match.end()) for match in _WORD_PATTERN.finditer(gap)]
+        words.append((None, 0))
+        close_multivalue = end_row = False
+        offset = index = 0
+        if state == 2:
+            if words[0][0] == self._mvsep and len(words) == 2:
+                return key if key is not None else (False, False, 0, 2, None)
+            if words[0][0] != ')':
+                return False
+            close_multivalue, index = True, 1
+        if state == 0:
+            if words[index][0] != self._column_prefix:
+                return False
+            index += 1
+        elif words[index][0] == self._column_separator:
+            index += 1
+        elif ([word for word, _ in words[index:index + 3]]
+              == [self._column_end, self._row_separator, self._column_prefix]):
+            end_row, offset = True, words[index + 1][1]
+            index += 3
+        else:
+            return False
+
+        next_state = 1
+        if words[index][0] == '(':
+            next_state = 2
+            index += 1
+        if index != len(words) - 1:
+            return False
+        if key is not None:
+            key = key.strip('"')
+            key = self._fields.setdefault(key, key)
+        if state == next_state == 1 and not end_row and key is not None:
+            return key
+        return close_multivalue, end_row, offset, next_state, key
+
+
+    def _build_row(self, row):
+        columns = self._columns
+        if columns is None:
+            if self._schemas is not None:
+                return self._compact_row(row)
+            if self._lazy_paths is not None:
+                return NestedRow(row.items(), self._lazy_paths)
+            return row
+
+        values, count = columns.values, columns.count
+        for key, value in row.items():
+            column = values.get(key)
+            if column is None:
+                column = values[key] = [None] * count
+            column.append(value)
+        columns.count = count = count + 1
+        if len(row) != len(values):
+            for column in values.values():
+                if len(column) < count:
+                    column.append(None)
+        return None
+
+
+_WORD_PATTERN = re.compile(r'[^ ]+')
+_PRESCAN_MIN_LENGTH = 1 << 12
+_PRESCAN_CHUNK = 1 << 16
+_QUOTE_BATCH = 1 << 16
+
+
+def _unescape_pair(match):
+    return match.group()[1:]
+
+
+def _escape_run(text, end, escape):
+    # The number of escape characters right before end.
+    code = ord if isinstance(text, str) else int
+    run = 0
+    while run < end and code(text[end - run - 1]) == escape:
+        run += 1
+    return run
+
+
+def _code_points(text, start, end):
+    if not isinstance(text, str):
+        return numpy.frombuffer(text, numpy.uint8, end - start, start)
+    chunk = text[start:end]
+    try:
+        return numpy.frombuffer(chunk.encode('latin-1'), numpy.uint8)
+    except UnicodeEncodeError:
+        return numpy.frombuffer(chunk.encode('utf-32-le'), numpy.uint32)
+
+
+def _unescaped_quotes(quotes, escapes, run, length):
+    """Drops the quotes that an odd run of escapes comes right before. run is
+    the length of the run at the end of the previous chunk. Returns the quotes
+    left and the length of the run at the end of this chunk."""
+
+    if not len(escapes):
+        if run % 2 and len(quotes) and quotes[0] == 0:
+            quotes = quotes[1:]
+        return quotes, 0
+
+    # The position each run of consecutive escapes starts at, for every escape.
+    firsts = numpy.flatnonzero(numpy.diff(escapes, prepend=-2) != 1)
+    run_starts = numpy.repeat(escapes[firsts], numpy.diff(firsts, append=len(escapes)))
+    if run_starts[0] == 0:
+        run_starts[run_starts == 0] = -run
+
+    before = numpy.searchsorted(escapes, quotes) - 1
+    escaped = ((before >= 0) & (escapes[before] == quotes - 1)
+               & ((quotes - run_starts[before]) % 2 == 1))
+    if run % 2 and len(quotes) and quotes[0] == 0:
+        escaped[0] = True
+    run = length - run_starts[-1] if escapes[-1] == length - 1 else 0
+    return quotes[~escaped], int(run)
+
+
+class _NeedMoreText(Exception):
+    pass
+
+
+class IncrementalParser(_Parser):
+    """Parses a Splunk search result string from a format command that arrives
+    in chunks, e.g. from an HTTP response.
+
+    Chunks can be split anywhere, including in the middle of a key, a value,
+    an escape sequence or a multivalue field. Rows are returned as soon as they
+    are complete and character offsets in errors count from the first chunk.
+    A row is parsed one field at a time, so a row that spans many chunks is
+    resumed at its last complete field or multivalue value, not parsed again
+    from its start.
+
+    Example:
+    parser = IncrementalParser()
+    for chunk in response.iter_content(decode_unicode=True):
+        for row in parser.feed(chunk):
+            print(row['host'])
+    rows = parser.close()
+    """
+
+    def __init__(self,
+                 row_prefix: str = '(',
+                 column_prefix: str ='(',
+                 column_separator: str ='AND',
+                 column_end: str =')',
+                 row_separator: str ='OR',
+                 row_end: str =')',
+                 mvsep: str ='OR',
+                 emptystr: str ='NOT()',
+                 escape_char: str ='\\',
+                 format: Format = Format.FLAT_JSON,
+                 dialect: Dialect = None,
+                 fields: list = None,
+                 exclude: list = None,
+                 interner: Interner = None,
+                 row_type: RowType = RowType.DICT,
+                 *,
+                 stats: bool = False,
+                 on_row: Callable = None,
+                 types: dict = None,
+                 conversion_errors: ConversionErrors = ConversionErrors.RAISE):
+        """Args:
+            format (Format, optional): The format of the returned rows, either
+                Format.FLAT_JSON or Format.JSON. Format.CSV and Format.COLUMNAR need
+                every row before they can be returned and cannot be parsed
+                incrementally.
+            stats (bool, optional): Collect the ParseStats of the chunks fed so
+                far, see the stats property. Defaults to False.
+            The other arguments are the same as for SplunkFormatParser.parse.
+            Types cannot be inferred, as the rows arrive after the parser is
+            created.
+        """
+
+        if dialect is None:
+            dialect = SplunkFormatParser.compile(row_prefix, column_prefix,
+                                                 column_separator, column_end,
+                                                 row_separator, row_end, mvsep,
+                                                 emptystr, escape_char)
+        if format in (Format.CSV, Format.COLUMNAR):
+            raise SplunkFormatParserException('format "%s" cannot be streamed' % format)
+        elif format not in (Format.FLAT_JSON, Format.JSON):
+            raise SplunkFormatParserException('unsupported format "%s"' % format)
+
+        super().__init__('', dialect)
+        self._configure(fields=fields, exclude=exclude, interner=interner,
+                        row_type=_check_row_type(row_type, format), format=format,
+                        types=_resolve_types(None, dialect, None, None, types, False,
+                                             fields, exclude),
+                        conversion_errors=_check_conversion_errors(conversion_errors))
+        if stats or on_row is not None:
+            self._start_stats(on_row)
+        self._format = format
+        self._closed = False
+        self._step = self._step_start
+        self._checkpoint = (self._char_index, self._keyword)
+        self._chunks = []
+        self._open_value = None
+        self._row = None
+        self._multivalue = None
+        self._idle_since = None
+
+
+    def __new__(cls, *args, stats: bool = False, on_row: Callable = None, **kwargs):
+        if stats or on_row is not None:
+            cls = _mixed(_InstrumentedParser, cls)
+        return super().__new__(cls)
+
+
+    @property
+    def stats(self) -> 'ParseStats':
+        """The ParseStats of the chunks fed so far, or None if not collected."""
+        return self._finish_stats() if self._stats is not None else None
+
+
+    def feed(self, chunk: str) -> list:
+        """Add the next chunk of the Splunk search result string.
+
+        Args:
+            chunk (str): The next part of the Splunk search result string.
+
+        Returns:
+            List: The rows completed by this chunk.
+        """
+
+        if self._closed:
+            raise SplunkFormatParserException('parser is already closed')
+
+        self._chunks.append(chunk)
+        if self._open_value is not None:
+            # The last run stopped inside a value, and only a quote can end it,
+            # so the row is not run again before a chunk that ends the value.
+            self._open_value = self._scan_value(chunk, 0, self._open_value)
+            if self._open_value is not None:
+                return []
+        self._join_chunks()
+        return self._run()
+
+
+    def close(self) -> list:
+        """Mark the end of the Splunk search result string.
+
+        Raises SplunkFormatParserException if the string ends in the middle of
+        the result.
+
+        Returns:
+            List: The rows completed by the end of the string.
+        """
+
+        if self._closed:
+            return []
+        self._closed = True
+        self._join_chunks()
+        return self._run()
+
+
+    def _join_chunks(self):
+        # Drop everything before the last checkpoint, it is never read again.
+        char_index, keyword = self._checkpoint
+        consumed = max(char_index, 0)
+        self._text = ''.join([self._text[consumed:]] + self._chunks)
+        self._chunks.clear()
+        self._length = len(self._text)
+        self._offset += consumed
+        self._checkpoint = (char_index - consumed, keyword)
+
+
+    def _run(self):
+        rows = []
+        self._open_value = None
+        char_index, self._keyword = self._checkpoint
+        self._char_index = char_index
+        if self._idle_since is not None:
+            # The time spent waiting for this chunk is not counted for the row.
+            self._row_start += time.perf_counter() - self._idle_since
+            self._idle_since = None
+        try:
+            if char_index >= 0:
+                self._token = (self._text[char_index] if char_index < self._length
+                               else self._end_of_text())
+            while self._step:
+                self._step = self._step(rows)
+                self._checkpoint = (self._char_index, self._keyword)
+        except _NeedMoreText:
+            if self._stats is not None and self._row is not None:
+                self._idle_since = time.perf_counter()
+        return rows
+
+
+    def _step_start(self, rows):
+        self._next_token()
+        self._next_keyword()
+        if not self._keyword:
+            return None
+        if self._keyword == self._emptystr:
+            self._match_token(None)
+            return None
+        self._match_keyword(self._row_prefix)
+        return self._step_row
+
+
+    def _step_row(self, rows):
+        if not self._token:
+            return self._step_end
+        self._next_keyword()
+        self._match_keyword(self._column_prefix)
+        self._row = {}
+        self._start_row()
+        return self._step_field
+
+
+    # A row is parsed in the same steps as _parse_column, each of which only
+    # changes the row after its last read, so that a run stopped by the end of
+    # a chunk only has to repeat its last step.
+
+    def _step_field(self, rows):
+        if not self._token:
+            return self._step_column_end(rows)
+        self._skip_spaces()
+        if self._token == '(':
+            self._next_token()
+            key, value = self._get_key_value()
+            self._multivalue = (key, [value] if value is not _SKIPPED else None, [1])
+            return self._step_multivalue
+        key, value = self._get_key_value()
+        self._add_value(key, value)
+        return self._step_column_separator
+
+
+    def _step_multivalue(self, rows):
+        self._next_keyword()
+        main_key, values, count = self._multivalue
+        if self._keyword == self._mvsep:
+            key, value = self._get_key_value()
+            if key != main_key:
+                raise self._error(
+                    'multivalue contains different key string: "%s" != "%s"'
+                    % (main_key, key), self._char_index-1)
+            if values is not None:
+                values.append(value)
+            count[0] += 1
+            return self._step_multivalue
+
+        self._match_keyword(')')
+        self._multivalue = None
+        self._count_multivalue(count[0])
+        self._add_value(main_key, values if values is not None else _SKIPPED)
+        return self._step_column_separator
+
+
+    def _step_column_separator(self, rows):
+        self._next_keyword()
+        if self._keyword == self._column_separator:
+            return self._step_field
+        return self._step_column_end(rows)
+
+
+    def _step_column_end(self, rows):
+        self._match_keyword(self._column_end)
+        row, self._row = self._row, None
+        rows.append(self._end_row(self._finish_row(row)))
+        return self._step_row_separator
+
+
+    def _add_value(self, key, value):
+        if value is _SKIPPED:
+            return
+        if self._nested_paths is None or '.' not in key:
+            self._row[key] = value
+        else:
+            self._set_nested(self._row, key, value)
+
+
+    def _start_row(self):
+        pass
+
+
+    def _end_row(self, row):
+        return row
+
+
+    def _count_multivalue(self, values):
+        pass
+
+
+    def _step_row_separator(self, rows):
+        self._next_keyword()
+        if self._keyword != self._row_separator:
+            return self._step_end
+        return self._step_row
+
+
+    def _step_end(self, rows):
+        self._match_keyword(self._row_end)
+        self._match_end()
+        return None
+
+
+    def _end_of_text(self):
+        if not self._closed:
+            raise _NeedMoreText()
+        return None
+
+
+    def _get_escaped_value(self, start):
+        try:
+            return super()._get_escaped_value(start)
+        except _NeedMoreText:
+            self._open_value = self._scan_value(self._text, start, False)
+            raise
+
+
+    def _skip_escaped_value(self, start):
+        try:
+            return super()._skip_escaped_value(start)
+        except _NeedMoreText:
+            self._open_value = self._scan_value(self._text, start, False)
+            raise
+
+
+    def _scan_value(self, text, start, pending):
+        """Scans text from start on for the end of a value that is still open.
+        pending tells whether the text before start ended in an escape
+        character, or a quote for the escape character '"', that pairs with
+        the next character.
+
+        Returns:
+            None if the value ends in text, else whether text ends in such a
+            character.
+        """
+
+        escape_char = self._escape_char
+        if pending:
+            if start >= len(text):
+                return True
+            if text[start] in ('"', escape_char):
+                start += 1
+            elif escape_char == '"':
+                return None
+        while True:
+            match = self._value_special.search(text, start)
+            if not match:
+                return False
+            index = match.start()
+            char = text[index]
+            if index + 1 >= len(text):
+                return None if char == '"' and escape_char != '"' else True
+            if char == escape_char and text[index + 1] in ('"', escape_char):
+                start = index + 2
+                continue
+            if char == '"':
+                return None
+            start = index + 1
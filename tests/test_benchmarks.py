@@ -0,0 +1,47 @@
+import pytest
+
+from benchmarks import DIALECTS, generate_result, generate_rows, format_rows
+from benchmarks.__main__ import compare, run_crossover, run_scenario
+from splunk_format_parser import Engine, Format, SplunkFormatParser
+
+# Test generator
+
+@pytest.mark.parametrize('dialect', DIALECTS.values())
+def test_generate_rows_round_trip(dialect):
+    rows = generate_rows(rows=50, columns=7, multivalue_ratio=0.3, value_length=8,
+                         escape_density=0.2, escape_char=dialect.escape_char, seed=1)
+    actual = dialect.parse(format_rows(rows, dialect))
+    assert actual == rows
+
+def test_generate_result_shape():
+    rows = SplunkFormatParser.parse(generate_result(rows=20, columns=4, seed=2))
+    assert len(rows) == 20
+    assert list(rows[0]) == ['field0', 'group1.field1', 'field2', 'group0.field3']
+
+def test_format_rows_empty():
+    assert format_rows([]) == 'NOT()'
+
+# Test runner
+
+def test_run_scenario():
+    results = run_scenario('tiny', dict(rows=10, columns=3), [Format.FLAT_JSON], 1)
+    assert len(results) == 1
+    assert results[0]['rows'] == 10
+    assert results[0]['mb_per_s'] > 0 and results[0]['peak_memory'] > 0
+
+def test_run_scenario_engine():
+    results = run_scenario('tiny', dict(rows=10, columns=3), [Format.JSON], 1, Engine.PRESCAN)
+    assert results[0]['format'] == 'json' and results[0]['seconds'] > 0
+
+def test_run_crossover():
+    results = run_crossover((1, 20), 1)
+    assert [result['rows'] for result in results] == [1, 20]
+    assert results[0]['bytes'] < results[1]['bytes']
+    assert all(result['speedup'] > 0 for result in results)
+
+def test_compare():
+    baseline = {'results': [{'scenario': 'small', 'format': 'json', 'seconds': 1.0}]}
+    results = [{'scenario': 'small', 'format': 'json', 'seconds': 1.2},
+               {'scenario': 'small', 'format': 'csv', 'seconds': 9.0}]
+    assert compare(results, baseline, 0.1) == [(results[0], baseline['results'][0])]
+    assert compare(results, baseline, 0.5) == []
@@ -1,9 +1,32 @@
+import asyncio
+import io
+import mmap
+import pickle
 import pytest
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
+from splunk_format_parser.__main__ import main
 from splunk_format_parser import (
     SplunkFormatParser, 
     SplunkFormatParserException,
-    Format
+    Format,
+    Engine,
+    RowType,
+    ColumnType,
+    ValueType,
+    ConversionErrors,
+    ParseErrors,
+    Dialect,
+    IncrementalParser,
+    Interner,
+    Row,
+    NestedRow,
+    ParseStats,
+    ParseResult,
+    ParseError,
+    ResultCache
 )
 
 # Test parse flat json
@@ -46,6 +69,12 @@ def test_parse_multivalue():
     actual = SplunkFormatParser.parse(input)
     assert actual == expected
 
+def test_parse_single_multivalue():
+    input = '( ( host="mylaptop" AND ( source="syslog.log" ) ) )'
+    expected = [{'host': 'mylaptop', 'source': ['syslog.log']}]
+    for engine in Engine:
+        assert SplunkFormatParser.parse(input, engine=engine) == expected
+
 def test_quoted_key():
     input = '( ( "host.dev"="mylaptop" ) )'
     expected = [{'host.dev': 'mylaptop'}]
@@ -184,6 +213,1543 @@ def test_parse_csv_order():
     actual = SplunkFormatParser.parse(input, format=Format.CSV)
     assert actual == expected
 
+# Test parse columnar
+
+def test_parse_columnar_basic():
+    input = '( ( host="mylaptop" AND source="syslog.log" ) OR '\
+            '( host="bobslaptop" AND source="bob-syslog.log" ) )'
+    expected = {'host': ['mylaptop', 'bobslaptop'],
+                'source': ['syslog.log', 'bob-syslog.log']}
+    actual = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    assert actual == expected
+
+def test_parse_columnar_missing_field():
+    input = '( ( host="mylaptop" ) OR ( source="bob-syslog.log" ) OR ( host="ip" ) )'
+    expected = {'host': ['mylaptop', None, 'ip'],
+                'source': [None, 'bob-syslog.log', None]}
+    actual = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    assert actual == expected
+
+def test_parse_columnar_multivalue():
+    input = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+            '( host="bobslaptop" ) OR ( source="bob-syslog.log" ) )'
+    actual = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    assert actual['host'] == ['mylaptop', 'bobslaptop', None]
+    assert list(actual['source']['offsets']) == [0, 2, 2, 3]
+    assert actual['source']['values'] == ['syslog.log.1', 'syslog.log.2', 'bob-syslog.log']
+
+def test_parse_columnar_bytes():
+    input = '( ( host="mylaptop" ) OR ( source="bob-syslog.log" ) )'
+    expected = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    actual = SplunkFormatParser.parse(input.encode(), format=Format.COLUMNAR)
+    assert actual == expected
+
+_typed_columns_input = '( ( n="1" AND f="1.5" AND b="true" AND ( m="1" OR m="2" ) ) OR '\
+                       '( n="2" AND f="2" AND b="0" AND m="3" AND s="x" ) OR ( n="3" AND f="x" ) )'
+
+_typed_columns_types = {'n': 'int', 'f': 'float', 'b': 'bool', 'm': 'int'}
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parse_columnar_array(workers):
+    actual = SplunkFormatParser.parse(_typed_columns_input, format=Format.COLUMNAR,
+                                      types=_typed_columns_types, conversion_errors='str',
+                                      column_type=ColumnType.ARRAY, workers=workers)
+    assert actual['n'] == array('q', [1, 2, 3])
+    assert actual['m']['values'] == array('q', [1, 2, 3])
+    # Missing and unconverted values and bools have no array type.
+    assert actual['f'] == [1.5, 2.0, 'x']
+    assert actual['b'] == [True, False, None]
+    assert actual['s'] == [None, 'x', None]
+
+def test_parse_columnar_numpy():
+    numpy = pytest.importorskip('numpy')
+    actual = SplunkFormatParser.parse(_typed_columns_input, format=Format.COLUMNAR,
+                                      types=_typed_columns_types, conversion_errors='str',
+                                      column_type='numpy')
+    assert actual['n'].dtype == numpy.int64 and actual['n'].tolist() == [1, 2, 3]
+    assert actual['m']['values'].tolist() == [1, 2, 3]
+    assert actual['f'] == [1.5, 2.0, 'x']
+
+@pytest.mark.parametrize('options, expected', [
+    ({'column_type': 'tuple', 'format': Format.COLUMNAR}, 'unsupported column type "tuple"'),
+    ({'column_type': 'array'},
+     'column type "ColumnType.ARRAY" is not supported by format "Format.FLAT_JSON"'),
+])
+def test_parse_columnar_raise_column_type(options, expected):
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(_typed_columns_input, **options)
+    assert str(exc_info.value) == expected
+
+def test_parse_columnar_numpy_missing(monkeypatch):
+    monkeypatch.setattr('splunk_format_parser.splunk_format_parser.numpy', None)
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.parse(_typed_columns_input, format=Format.COLUMNAR,
+                                 column_type=ColumnType.NUMPY)
+
+def test_parse_columnar_empty_res():
+    input = 'NOT()'
+    actual = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    assert actual == {}
+
+# Test format
+
+def test_format():
+    rows = [{'host': 'mylaptop', 'source': ['syslog.log.1', 'syslog.log.2']},
+            {'host': 'bobslaptop', 'source': 'bob-syslog.log'}]
+    expected = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+               '( host="bobslaptop" AND source="bob-syslog.log" ) )'
+    assert SplunkFormatParser.format(rows) == expected
+    assert SplunkFormatParser.parse(expected) == rows
+
+def test_format_empty_res():
+    assert SplunkFormatParser.format([]) == 'NOT()'
+    assert SplunkFormatParser.format([], emptystr='NOT( )') == 'NOT( )'
+
+def test_format_escape():
+    rows = [{'host': 'my"laptop\\', 'src': 'a\\"b'}]
+    for escape_char in ('\\', '"', '&'):
+        actual = SplunkFormatParser.format(rows, escape_char=escape_char)
+        assert SplunkFormatParser.parse(actual, escape_char=escape_char) == rows
+    assert SplunkFormatParser.format(rows, escape_char='"') == '( ( host="my""laptop\\" AND src="a\\""b" ) )'
+
+def test_format_keys():
+    rows = [{'host name': 'a', '(src': 'b', '': 'c', 'a.b': 'd'}]
+    actual = SplunkFormatParser.format(rows)
+    assert actual == '( ( "host name"="a" AND "(src"="b" AND ""="c" AND "a.b"="d" ) )'
+    assert SplunkFormatParser.parse(actual) == rows
+
+def test_format_json_rows():
+    rows = [{'host': {'src': {'ip': ['1.1.1.1', '2.2.2.2']}, 'dst': 'x'}, 'count': 3,
+             'none': None, 'empty': [], 'single': ['a']}]
+    actual = SplunkFormatParser.format(rows)
+    assert SplunkFormatParser.parse(actual, format=Format.JSON) == \
+        [{'host': {'src': {'ip': ['1.1.1.1', '2.2.2.2']}, 'dst': 'x'}, 'count': '3', 'single': ['a']}]
+
+def test_format_row_types():
+    input = SplunkFormatParser.format([{'host': 'a', 'src.ip': ['1', '2']}, {'host': 'b'}])
+    for options in ({'row_type': 'compact'}, {'format': Format.JSON, 'row_type': 'lazy'}):
+        rows = SplunkFormatParser.parse(input, **options)
+        assert SplunkFormatParser.format(rows) == input
+
+def test_format_out_file():
+    rows = [{'host': 'host%d' % i, 'source': ['a', 'b']} for i in range(2500)]
+    out_file = io.StringIO()
+    assert SplunkFormatParser.format(iter(rows), out_file) == 2500
+    assert out_file.getvalue() == SplunkFormatParser.format(rows)
+    assert SplunkFormatParser.parse(out_file.getvalue()) == rows
+
+def test_format_dialect():
+    dialect = SplunkFormatParser.compile('[', '[', '&&', ']', '||', ']', '||')
+    rows = [{'host': 'a', 'source': ['b', 'c']}, {'host': 'd'}]
+    actual = dialect.format(rows)
+    assert actual == '[ [ host="a" && ( source="b" || source="c" ) ] || [ host="d" ] ]'
+    assert dialect.parse(actual) == rows
+
+def test_format_single_multivalue():
+    rows = [{'host': ['a'], 'source': 'b'}, {'host': ['c', 'd']}]
+    actual = SplunkFormatParser.format(rows)
+    assert actual == '( ( ( host="a" ) AND source="b" ) OR ( ( host="c" OR host="d" ) ) )'
+    for result in (actual, actual.encode()):
+        for engine in Engine:
+            assert SplunkFormatParser.parse(result, engine=engine) == rows
+    dialect = SplunkFormatParser.compile('[', '[', '&&', ']', '||', ']', '||')
+    assert dialect.parse(dialect.format(rows)) == rows
+
+def test_raise_format_exception():
+    for rows, expected in (([{'a=b': 'c'}], 'key cannot be formatted: "a=b"'),
+                           ([{'"a': 'c'}], 'key cannot be formatted: ""a"'),
+                           ([{'host': None}], "row has no fields: {'host': None}")):
+        with pytest.raises(SplunkFormatParserException) as exc_info:
+            SplunkFormatParser.format(rows)
+        assert str(exc_info.value) == expected
+
+# Test write csv
+
+_csv_input = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+             '( "host.dev"="my\\"laptop" ) )'
+
+def test_write_csv():
+    out_file = io.StringIO()
+    expected = 'host,host.dev,source\r\nmylaptop,,"syslog.log.1\nsyslog.log.2"\r\n'\
+               ',"my""laptop",\r\n'
+    count = SplunkFormatParser.write_csv(_csv_input, out_file)
+    assert out_file.getvalue() == expected
+    assert count == 2
+
+def test_write_csv_fields():
+    out_file = io.StringIO()
+    expected = 'host.dev,host\r\n,mylaptop\r\n"my""laptop",\r\n'
+    SplunkFormatParser.write_csv(_csv_input, out_file, fields=['host.dev', 'host'])
+    assert out_file.getvalue() == expected
+
+@pytest.mark.parametrize('fields', [None, ['host', 'host.dev', 'source']])
+def test_write_csv_stream(fields):
+    expected = io.StringIO()
+    SplunkFormatParser.write_csv(_csv_input, expected)
+    for stream in (io.StringIO(_csv_input), io.BytesIO(_csv_input.encode())):
+        out_file = io.StringIO()
+        SplunkFormatParser.write_csv(stream, out_file, fields=fields)
+        assert out_file.getvalue() == expected.getvalue()
+
+def test_write_csv_mmap(tmp_path, monkeypatch):
+    path = tmp_path / 'result.txt'
+    path.write_text(_csv_input)
+    expected = io.StringIO()
+    SplunkFormatParser.write_csv(_csv_input, expected)
+    # The mapped file is scanned in place, not read in chunks as a stream.
+    monkeypatch.setattr('splunk_format_parser.splunk_format_parser.IncrementalParser', None)
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        out_file = io.StringIO()
+        SplunkFormatParser.write_csv(buffer, out_file)
+    assert out_file.getvalue() == expected.getvalue()
+
+def test_write_csv_path(tmp_path):
+    path = tmp_path / 'result.csv'
+    dialect = Dialect.for_output_mode('csv')
+    count = dialect.write_csv('( ( host="my""laptop" ) )', str(path))
+    assert path.read_text() == 'host\n"my""laptop"\n'
+    assert count == 1
+
+def test_write_csv_raise_exception():
+    out_file = io.StringIO()
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.write_csv('( ( host="mylaptop" ) ) )', out_file)
+    assert out_file.getvalue() == ''
+
+# Test field projection
+
+_projection_input = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) '\
+                    'AND sourcetype="sys\\"log\\"" ) OR ( host="bobslaptop" AND sourcetype="" ) )'
+
+def test_parse_fields():
+    expected = [{'host': 'mylaptop'}, {'host': 'bobslaptop'}]
+    actual = SplunkFormatParser.parse(_projection_input, fields=['host'])
+    assert actual == expected
+
+def test_parse_exclude():
+    expected = [{'host': 'mylaptop', 'sourcetype': 'sys"log"'},
+                {'host': 'bobslaptop', 'sourcetype': ''}]
+    actual = SplunkFormatParser.parse(_projection_input, exclude=['source'])
+    assert actual == expected
+
+def test_parse_fields_exclude():
+    expected = [{'source': ['syslog.log.1', 'syslog.log.2']}, {}]
+    actual = SplunkFormatParser.parse(_projection_input, fields=['host', 'source'],
+                                      exclude=['host'])
+    assert actual == expected
+
+def test_parse_fields_csv():
+    expected = [['source', 'sourcetype'],
+                [['syslog.log.1', 'syslog.log.2'], 'sys"log"'],
+                ['', '']]
+    actual = SplunkFormatParser.parse(_projection_input, format=Format.CSV,
+                                      exclude=['host'])
+    assert actual == expected
+
+@pytest.mark.parametrize('input, kwargs', [
+    (_projection_input, {}),
+    (_projection_input, {'engine': Engine.ITERATOR}),
+    (_projection_input.encode(), {}),
+    (_projection_input.replace('\\"', '""'), {'escape_char': '"'}),
+])
+def test_parse_fields_engines(input, kwargs):
+    expected = [{'sourcetype': 'sys"log"'}, {'sourcetype': ''}]
+    actual = SplunkFormatParser.parse(input, fields=['sourcetype'], **kwargs)
+    assert actual == expected
+
+def test_iter_parse_fields():
+    expected = [{'host': 'mylaptop'}, {'host': 'bobslaptop'}]
+    actual = SplunkFormatParser.iter_parse(_projection_input, exclude=['source', 'sourcetype'])
+    assert list(actual) == expected
+
+def test_incremental_parse_fields():
+    expected = [{'host': 'mylaptop'}, {'host': 'bobslaptop'}]
+    parser = IncrementalParser(fields=['host'])
+    actual = []
+    for index in range(0, len(_projection_input), 3):
+        actual += parser.feed(_projection_input[index:index + 3])
+    actual += parser.close()
+    assert actual == expected
+
+def test_parse_fields_raise_exception():
+    input = '( ( host="mylaptop" AND source="syslog.log ) )'
+    expected = 'expecting keyword ")" but found "None" (char 45)'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(input, fields=['host'])
+    assert str(exc_info.value) == expected
+
+# Test interner
+
+_intern_input = '( ( host="mylaptop" AND sourcetype="syslog" ) OR '\
+                '( host="bobslaptop" AND sourcetype="syslog" ) OR '\
+                '( host="mylaptop" AND ( sourcetype="syslog" OR sourcetype="json" ) ) )'
+
+@pytest.mark.parametrize('input', [_intern_input, _intern_input.encode()])
+def test_parse_shared_keys(input):
+    actual = SplunkFormatParser.parse(input)
+    keys = [next(iter(row)) for row in actual]
+    assert keys[0] is keys[1] is keys[2]
+
+def test_parse_interner():
+    interner = Interner()
+    actual = SplunkFormatParser.parse(_intern_input, interner=interner)
+    assert actual[0]['sourcetype'] is actual[1]['sourcetype'] is actual[2]['sourcetype'][0]
+    assert actual[0]['host'] is actual[2]['host']
+    assert (interner.hits, interner.misses, len(interner)) == (3, 4, 4)
+    assert interner.hit_rate == 3 / 7
+    assert interner.saved_bytes > 0
+
+def test_parse_interner_max_values():
+    interner = Interner(max_values=1)
+    actual = SplunkFormatParser.parse(_intern_input, interner=interner)
+    assert actual[0]['host'] is actual[2]['host']
+    assert actual[0]['sourcetype'] is not actual[1]['sourcetype']
+    assert (interner.hits, interner.misses, len(interner)) == (1, 6, 1)
+
+def test_parse_interner_shared():
+    interner = Interner()
+    first = SplunkFormatParser.parse(_intern_input, interner=interner)
+    second = SplunkFormatParser.iter_parse(_intern_input, interner=interner)
+    assert next(second)['host'] is first[0]['host']
+    interner.clear()
+    assert (interner.hits, interner.misses, len(interner)) == (0, 0, 0)
+
+def test_parse_parallel_interner():
+    interner = Interner()
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input)
+    actual = SplunkFormatParser.parse(input, workers=2, interner=interner)
+    assert actual == expected
+    assert interner.hits + interner.misses == 40 * 4 + 1
+
+# Test compact rows
+
+_compact_input = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+                 '( host="bobslaptop" AND source="bob-syslog.log" ) OR ( source="log" AND host="ip" ) )'
+
+def test_parse_compact():
+    expected = SplunkFormatParser.parse(_compact_input)
+    actual = SplunkFormatParser.parse(_compact_input, row_type=RowType.COMPACT)
+    assert all(isinstance(row, Row) for row in actual)
+    assert actual == expected
+    assert [row.to_dict() for row in actual] == expected
+    assert [list(row) for row in actual] == [list(row) for row in expected]
+
+def test_parse_compact_shared_schema():
+    actual = SplunkFormatParser.parse(_compact_input, row_type='compact')
+    assert actual[0]._schema is actual[1]._schema
+    assert actual[1]._schema is not actual[2]._schema
+
+def test_parse_compact_mapping():
+    row = SplunkFormatParser.parse(_compact_input, row_type='compact')[1]
+    assert row['host'] == 'bobslaptop'
+    assert row.get('sourcetype') is None
+    assert 'source' in row and 'sourcetype' not in row
+    assert len(row) == 2
+    assert list(row.items()) == [('host', 'bobslaptop'), ('source', 'bob-syslog.log')]
+    with pytest.raises(KeyError):
+        row['sourcetype']
+
+def test_parse_compact_csv():
+    expected = SplunkFormatParser.parse(_compact_input, format=Format.CSV)
+    actual = SplunkFormatParser.parse(_compact_input, format=Format.CSV, row_type='compact')
+    assert actual == expected
+
+def test_parse_compact_streaming():
+    expected = SplunkFormatParser.parse(_compact_input)
+    parser = IncrementalParser(row_type='compact')
+    actual = parser.feed(_compact_input) + parser.close()
+    assert all(isinstance(row, Row) for row in actual)
+    assert actual == expected
+    actual = list(SplunkFormatParser.iter_parse(_compact_input, row_type='compact'))
+    assert all(isinstance(row, Row) for row in actual)
+    assert actual == expected
+
+def test_parse_parallel_compact():
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input)
+    actual = SplunkFormatParser.parse(input, workers=2, row_type='compact')
+    assert all(isinstance(row, Row) for row in actual)
+    assert actual == expected
+
+def test_raise_compact_format_exception():
+    expected = 'row type "RowType.COMPACT" is not supported by format "Format.JSON"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(_compact_input, format=Format.JSON, row_type='compact')
+    assert str(exc_info.value) == expected
+
+def test_raise_unsupported_row_type_exception():
+    expected = 'unsupported row type "tuple"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(_compact_input, row_type='tuple')
+    assert str(exc_info.value) == expected
+
+# Test lazy nested rows
+
+_nested_input = '( ( ( "host.src.ip"="1.1.1.1" OR "host.src.ip"="2.2.2.2" ) AND '\
+                '"host.dst.ip"="8.8.8.8" AND source="log" ) OR ( "host.dst.ip"="9.9.9.9" ) )'
+
+def test_parse_json_lazy():
+    expected = SplunkFormatParser.parse(_nested_input, format=Format.JSON)
+    actual = SplunkFormatParser.parse(_nested_input, format=Format.JSON, row_type=RowType.LAZY)
+    assert all(isinstance(row, NestedRow) for row in actual)
+    assert actual == expected
+    assert [row.to_dict() for row in actual] == expected
+
+def test_parse_json_lazy_pickle():
+    expected = SplunkFormatParser.parse(_nested_input, format=Format.JSON)
+    actual = SplunkFormatParser.parse(_nested_input, format=Format.JSON, row_type=RowType.LAZY)
+    assert actual[0]['host']['src']['ip'] == ['1.1.1.1', '2.2.2.2']
+    assert pickle.loads(pickle.dumps(actual)) == expected
+    assert pickle.loads(pickle.dumps(actual[0]['host'])) == expected[0]['host']
+
+def test_parse_json_lazy_access():
+    row = SplunkFormatParser.parse(_nested_input, format=Format.JSON, row_type='lazy')[0]
+    assert list(row) == ['host', 'source']
+    assert isinstance(row['host'], NestedRow)
+    assert row['host']['src']['ip'] == ['1.1.1.1', '2.2.2.2']
+    assert row['host']['dst'] == {'ip': '8.8.8.8'}
+    assert row['host'] is row['host']
+    assert row.get('dst') is None
+    assert len(row['host']) == 2
+
+def test_parse_json_lazy_streaming():
+    expected = SplunkFormatParser.parse(_nested_input, format=Format.JSON)
+    parser = IncrementalParser(format=Format.JSON, row_type='lazy')
+    actual = parser.feed(_nested_input[:40]) + parser.feed(_nested_input[40:]) + parser.close()
+    assert all(isinstance(row, NestedRow) for row in actual)
+    assert actual == expected
+    actual = SplunkFormatParser.iter_parse(_nested_input, format=Format.JSON, row_type='lazy')
+    assert list(actual) == expected
+
+def test_raise_lazy_format_exception():
+    expected = 'row type "RowType.LAZY" is not supported by format "Format.FLAT_JSON"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(_nested_input, row_type='lazy')
+    assert str(exc_info.value) == expected
+
+# Test result cache
+
+_cache_input = '( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+               '( host="bobs.laptop" AND "src.ip"="1.1.1.1" ) )'
+
+def test_cache_hit():
+    cache = ResultCache()
+    expected = SplunkFormatParser.parse(_cache_input)
+    assert SplunkFormatParser.parse(_cache_input, cache=cache) == expected
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+    assert SplunkFormatParser.parse(_cache_input, cache=cache) == expected
+    assert SplunkFormatParser.parse(_cache_input.encode(), cache=cache) == expected
+    assert SplunkFormatParser.parse(_cache_input.encode(), cache=cache) == expected
+    assert (cache.hits, cache.misses, len(cache)) == (2, 2, 2)
+    assert cache.hit_rate == 0.5
+
+def test_cache_copy_on_read():
+    cache = ResultCache()
+    first = SplunkFormatParser.parse(_cache_input, cache=cache)
+    first[0]['host'] = 'changed'
+    second = SplunkFormatParser.parse(_cache_input, cache=cache)
+    second[0]['source'].append('changed')
+    assert SplunkFormatParser.parse(_cache_input, cache=cache) == SplunkFormatParser.parse(_cache_input)
+
+def test_cache_options():
+    cache = ResultCache()
+    for options in ({}, {'format': Format.JSON}, {'format': Format.CSV}, {'format': Format.COLUMNAR},
+                    {'fields': ['host']}, {'exclude': ['host']}, {'row_type': 'compact'},
+                    {'format': Format.JSON, 'row_type': 'lazy'}, {'escape_char': '"'}):
+        expected = SplunkFormatParser.parse(_cache_input, **options)
+        assert SplunkFormatParser.parse(_cache_input, cache=cache, **options) == expected
+        assert SplunkFormatParser.parse(_cache_input, cache=cache, **options) == expected
+    assert (cache.hits, cache.misses) == (9, 9)
+
+def test_cache_infer_types(monkeypatch):
+    import splunk_format_parser.splunk_format_parser as module
+    samples = []
+    infer_types = module._infer_types
+    monkeypatch.setattr(module, '_infer_types', lambda rows: samples.append(1) or infer_types(rows))
+    input = '( ( count="1" AND host="a" ) OR ( count="2" AND host="b" ) )'
+    cache = ResultCache()
+    assert SplunkFormatParser.parse(input, cache=cache) == SplunkFormatParser.parse(input)
+    for _ in range(2):
+        actual = SplunkFormatParser.parse(input, cache=cache, infer_types=True)
+        assert actual == [{'count': 1, 'host': 'a'}, {'count': 2, 'host': 'b'}]
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(samples) == 1
+
+def test_cache_eviction():
+    inputs = ['( ( host="host%d" ) )' % i for i in range(4)]
+    cache = ResultCache(max_entries=2)
+    for input in inputs + inputs[-1:]:
+        SplunkFormatParser.parse(input, cache=cache)
+    assert (cache.hits, len(cache)) == (1, 2)
+    SplunkFormatParser.parse(inputs[0], cache=cache)
+    assert cache.misses == 5
+
+    cache = ResultCache(max_bytes=1)
+    SplunkFormatParser.parse(inputs[0], cache=cache)
+    assert (len(cache), cache.bytes) == (0, 0)
+
+def test_cache_skipped_for_stats():
+    cache = ResultCache()
+    SplunkFormatParser.parse(_cache_input, cache=cache, stats=True)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+def test_cache_path(tmp_path):
+    expected = SplunkFormatParser.parse(_cache_input, format=Format.JSON, row_type='lazy')
+    cache = ResultCache(path=str(tmp_path))
+    SplunkFormatParser.parse(_cache_input, format=Format.JSON, row_type='lazy', cache=cache)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    restarted = ResultCache(path=str(tmp_path))
+    actual = SplunkFormatParser.parse(_cache_input, format=Format.JSON, row_type='lazy', cache=restarted)
+    assert (restarted.hits, restarted.misses) == (1, 0)
+    assert all(isinstance(row, NestedRow) for row in actual)
+    assert [row.to_dict() for row in actual] == [row.to_dict() for row in expected]
+
+def test_cache_path_eviction(tmp_path):
+    inputs = ['( ( host="%s" ) )' % host for host in ('a', 'b', 'c')]
+    cache = ResultCache(path=str(tmp_path))
+    SplunkFormatParser.parse(inputs[0], cache=cache)
+    size = cache.disk_bytes
+    cache = ResultCache(max_entries=1, path=str(tmp_path), max_disk_bytes=2 * size)
+    assert cache.disk_bytes == size
+    SplunkFormatParser.parse(inputs[1], cache=cache)
+    # Reading the first result back from its file makes it the most recent.
+    SplunkFormatParser.parse(inputs[0], cache=cache)
+    SplunkFormatParser.parse(inputs[2], cache=cache)
+    assert len(list(tmp_path.iterdir())) == 2
+    assert cache.disk_bytes == 2 * size
+
+    restarted = ResultCache(path=str(tmp_path), max_disk_bytes=size)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert restarted.disk_bytes == size
+
+def test_cache_clear():
+    cache = ResultCache()
+    SplunkFormatParser.parse(_cache_input, cache=cache)
+    cache.clear()
+    assert (cache.hits, cache.misses, cache.bytes, len(cache)) == (0, 0, 0, 0)
+
+# Test parse stats
+
+_stats_input = r'( ( host="my\"laptop" AND ( source="a.log" OR source="b.log" ) ) OR ( host="bob\\s" ) )'
+
+def test_parse_stats():
+    actual = SplunkFormatParser.parse(_stats_input, stats=True)
+    assert isinstance(actual, ParseResult)
+    assert actual.data == SplunkFormatParser.parse(_stats_input)
+    stats = actual.stats
+    assert isinstance(stats, ParseStats)
+    assert stats.scanned == len(_stats_input)
+    assert stats.rows == 2
+    assert stats.fields == 3
+    assert stats.values == 4
+    assert stats.distinct_keys == 2
+    assert stats.multivalue_groups == 1
+    assert stats.escapes == 2
+    assert stats.total_seconds == stats.scan_seconds + stats.build_seconds + stats.convert_seconds
+
+def test_parse_stats_bytes():
+    stats = SplunkFormatParser.parse(_stats_input.encode(), stats=True).stats
+    assert stats.scanned == len(_stats_input)
+    assert stats.escapes == 2
+
+def test_parse_stats_callback():
+    reported = []
+    actual = SplunkFormatParser.parse(_stats_input, format=Format.CSV, stats=reported.append)
+    assert actual == SplunkFormatParser.parse(_stats_input, format=Format.CSV)
+    assert len(reported) == 1
+    assert reported[0].rows == 2
+    assert reported[0].convert_seconds > 0
+
+def test_parse_on_row():
+    rows = []
+    actual = SplunkFormatParser.parse(_stats_input, on_row=rows.append)
+    assert rows == actual
+
+def test_iter_parse_stats():
+    reported = []
+    rows = SplunkFormatParser.iter_parse(_stats_input, stats=reported.append)
+    assert next(rows) == {'host': 'my"laptop', 'source': ['a.log', 'b.log']}
+    assert reported == []
+    list(rows)
+    assert reported[0].rows == 2
+
+def test_incremental_stats():
+    parser = IncrementalParser(stats=True)
+    rows = []
+    for position in range(0, len(_stats_input), 3):
+        rows += parser.feed(_stats_input[position:position + 3])
+    rows += parser.close()
+    expected = SplunkFormatParser.parse(_stats_input, stats=True).stats
+    assert rows == SplunkFormatParser.parse(_stats_input)
+    for name in ('scanned', 'rows', 'fields', 'values', 'distinct_keys', 'multivalue_groups', 'escapes'):
+        assert getattr(parser.stats, name) == getattr(expected, name)
+
+def test_incremental_no_stats():
+    assert IncrementalParser().stats is None
+
+def test_parse_parallel_stats():
+    input = _parallel_input()
+    rows = []
+    expected = SplunkFormatParser.parse(input, stats=True)
+    actual = SplunkFormatParser.parse(input, workers=2, stats=True, on_row=rows.append)
+    assert actual.data == expected.data
+    assert rows == expected.data
+    for name in ('scanned', 'rows', 'fields', 'values', 'distinct_keys', 'multivalue_groups', 'escapes'):
+        assert getattr(actual.stats, name) == getattr(expected.stats, name)
+
+# Test validate
+
+_validate_input = '( ( host="my\\"laptop" AND ( source="a.log" OR source="b.log" ) ) OR '\
+                  '( host="bob" AND "src.ip"="1.1.1.1" ) OR ( host="x=y" ) )'
+
+def test_validate():
+    for input, engine in ((_validate_input, Engine.SLICE), (_validate_input, Engine.ITERATOR),
+                          (_validate_input.encode(), Engine.SLICE)):
+        stats = SplunkFormatParser.validate(input, engine=engine)
+        assert isinstance(stats, ParseStats)
+        assert (stats.scanned, stats.rows, stats.fields, stats.multivalue_groups) == \
+               (len(_validate_input), 3, 5, 1)
+
+def test_validate_empty_res():
+    assert SplunkFormatParser.validate('NOT()').rows == 0
+    assert SplunkFormatParser.validate('').rows == 0
+
+def test_validate_dialect():
+    dialect = SplunkFormatParser.compile(column_separator='&&', escape_char='"')
+    stats = dialect.validate('( ( host="my""laptop" && source="a" ) )')
+    assert (stats.rows, stats.fields) == (1, 2)
+
+@pytest.mark.parametrize('input', [
+    '( ( host="mylaptop" ) OR ( host="bobslaptop" ) ] ',
+    '( ( host="mylaptop" AND source="log ) )',
+    '( ( host="mylaptop" AND ( source="a" OR src="b" ) ) )',
+    '( ( host="mylaptop" AND source="log" ) ) extra',
+    '( ( host="mylaptop" AND ) )',
+    '( ( host=mylaptop ) )',
+    '( ( host="my\\"laptop" ) ',
+])
+def test_validate_raise_parse_exception(input):
+    for result in (input, input.encode()):
+        with pytest.raises(SplunkFormatParserException) as parse_info:
+            SplunkFormatParser.parse(result)
+        with pytest.raises(SplunkFormatParserException) as validate_info:
+            SplunkFormatParser.validate(result)
+        assert str(validate_info.value) == str(parse_info.value)
+
+# Test types
+
+_types_input = '( ( count="3" AND ok="true" AND _time="1700000000" AND ( port="80" OR port="443" ) ) OR '\
+               '( count="x4" AND ok="0" AND _time="2024-01-02T03:04:05" AND ( port="22" OR port="25" ) ) )'
+
+_types = {'count': 'int', 'ok': ValueType.BOOL, '_time': 'time', 'port': int}
+
+def test_types():
+    expected = [{'count': 3, 'ok': True, '_time': datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc),
+                 'port': [80, 443]}]
+    input = _types_input[:_types_input.index(' OR ( count')] + ' )'
+    for result in (input, input.encode()):
+        for engine in Engine:
+            assert SplunkFormatParser.parse(result, types=_types, engine=engine) == expected
+
+def test_types_callable_and_str():
+    actual = SplunkFormatParser.parse(_types_input, types={'count': 'str', 'port': lambda value: value * 2})
+    assert actual[0]['count'] == '3'
+    assert actual[1]['port'] == ['2222', '2525']
+
+def test_types_raise_parse_exception():
+    for engine in Engine:
+        with pytest.raises(SplunkFormatParserException) as info:
+            SplunkFormatParser.parse(_types_input, types=_types, engine=engine)
+        assert 'cannot convert value "x4" of field "count" to int' in str(info.value)
+        assert '(char %d)' % _types_input.index('"x4"') in str(info.value)
+
+def test_types_conversion_errors_str():
+    actual = SplunkFormatParser.parse(_types_input, types=_types, conversion_errors=ConversionErrors.STR)
+    assert [row['count'] for row in actual] == [3, 'x4']
+    assert actual[1]['_time'] == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+def test_types_columnar():
+    for workers in (1, 2):
+        actual = SplunkFormatParser.parse(_types_input, types=_types, conversion_errors='str',
+                                          format=Format.COLUMNAR, workers=workers)
+        assert actual['count'] == [3, 'x4']
+        assert actual['ok'] == [True, False]
+        assert actual['port']['values'] == [80, 443, 22, 25]
+
+def test_infer_types():
+    actual = SplunkFormatParser.parse(_types_input, infer_types=True)
+    assert [row['count'] for row in actual] == ['3', 'x4']
+    assert [row['ok'] for row in actual] == [True, False]
+    assert actual[1]['port'] == [22, 25]
+    assert isinstance(actual[1]['_time'], datetime)
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.parse(_types_input, infer_types=1)
+    actual = SplunkFormatParser.parse(_types_input, infer_types=1, types={'port': 'str'},
+                                      conversion_errors='str')
+    assert [row['count'] for row in actual] == [3, 'x4']
+    assert actual[0]['port'] == ['80', '443']
+
+def test_types_time_offset():
+    actual = SplunkFormatParser.parse('( ( _time="2024-01-02T03:04:05+02:00" ) )', types={'_time': 'time'})
+    assert actual[0]['_time'] == datetime(2024, 1, 2, 1, 4, 5, tzinfo=timezone.utc)
+    assert actual[0]['_time'].utcoffset() == timedelta(hours=2)
+
+def test_infer_types_epoch_time():
+    actual = SplunkFormatParser.parse('( ( _time="1700000000.5" AND time="1700000000.5" ) )',
+                                      infer_types=True)
+    assert actual == [{'_time': datetime(2023, 11, 14, 22, 13, 20, 500000, tzinfo=timezone.utc),
+                       'time': 1700000000.5}]
+
+def test_types_iter_parse_and_incremental():
+    assert list(SplunkFormatParser.iter_parse(_types_input, types=_types, conversion_errors='str')) == \
+           SplunkFormatParser.parse(_types_input, types=_types, conversion_errors='str')
+    parser = IncrementalParser(types={'count': 'int'}, conversion_errors='str')
+    rows = parser.feed(_types_input[:60]) + parser.feed(_types_input[60:]) + parser.close()
+    assert [row['count'] for row in rows] == [3, 'x4']
+
+def test_types_cache():
+    cache = ResultCache()
+    assert SplunkFormatParser.parse(_types_input, cache=cache)[0]['count'] == '3'
+    assert SplunkFormatParser.parse(_types_input, cache=cache, types=_types,
+                                    conversion_errors='str')[0]['count'] == 3
+    assert cache.misses == 2
+
+@pytest.mark.parametrize('options', [
+    {'types': {'count': 'complex'}},
+    {'types': _types, 'conversion_errors': 'ignore'},
+])
+def test_types_raise_unsupported(options):
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.parse(_types_input, **options)
+
+# Test skip errors
+
+_errors_input = '( ( host="a" ) OR ( host="b ) OR ( host="c" ) OR ( host="d" ! ) OR ( host="e" ) )'
+
+def test_errors_skip():
+    expected = [{'host': 'a'}, {'host': 'c'}, {'host': 'e'}]
+    for result in (_errors_input, _errors_input.encode()):
+        for engine in Engine:
+            assert SplunkFormatParser.parse(result, engine=engine, errors='skip') == expected
+
+@pytest.mark.parametrize('engine', list(Engine))
+def test_errors_collect(engine):
+    actual = SplunkFormatParser.parse(_errors_input, engine=engine, errors=ParseErrors.COLLECT)
+    assert isinstance(actual, ParseResult)
+    assert actual.data == [{'host': 'a'}, {'host': 'c'}, {'host': 'e'}]
+    assert [_errors_input[error.start:error.end] for error in actual.errors] == \
+           ['( host="b )', '( host="d" ! )']
+    with pytest.raises(SplunkFormatParserException) as info:
+        SplunkFormatParser.parse(_errors_input, engine=engine)
+    first = actual.errors[0]
+    assert isinstance(first, ParseError)
+    assert str(info.value) == '%s (char %d)' % (first.message, first.char_index)
+
+def test_errors_valid_input():
+    input = '( ( host="a" AND ( port="1" OR port="2" ) ) OR ( host="b" ) )'
+    actual = SplunkFormatParser.parse(input, errors='collect')
+    assert actual.data == SplunkFormatParser.parse(input)
+    assert actual.errors == []
+
+@pytest.mark.parametrize('engine', list(Engine))
+@pytest.mark.parametrize('input,expected,skipped', [
+    ('( ( host="a" ) OR ( host="b', [{'host': 'a'}], '( host="b'),
+    ('( ( host="a" ) OR ( ', [{'host': 'a'}], '( '),
+    # The value of the skipped row holds a row, which is not taken out of it.
+    ('( ( host="a" ) OR ( msg="say ) OR ( k="v" ) OR ( z" ) OR ( host="c" ) )',
+     [{'host': 'a'}, {'host': 'c'}], '( msg="say ) OR ( k="v" ) OR ( z" )'),
+    ('( ( host="a" ) OR ( host="x ) OR ( y" ) OR ( host="c" ) )',
+     [{'host': 'a'}, {'host': 'x ) OR ( y'}, {'host': 'c'}], None),
+    ('( ( host="a" ) OR ( host="b" AND ( v="1" OR w="2" ) ) OR ( host="c" ) )',
+     [{'host': 'a'}, {'host': 'c'}], '( host="b" AND ( v="1" OR w="2" ) )'),
+    ('( ( host="a" ) ) extra', [{'host': 'a'}], 'extra'),
+])
+def test_errors_recovery(input, expected, skipped, engine):
+    for result in (input, input.encode()):
+        actual = SplunkFormatParser.parse(result, engine=engine, errors='collect')
+        assert actual.data == expected
+        assert [input[error.start:error.end] for error in actual.errors] == \
+            ([skipped] if skipped else [])
+
+def test_errors_columnar_and_csv():
+    columns = SplunkFormatParser.parse('( ( host="a" ) OR ( host="b" AND port="1" ! ) OR ( host="c" ) )',
+                                       format=Format.COLUMNAR, errors='skip')
+    assert columns == {'host': ['a', 'c']}
+    actual = SplunkFormatParser.parse(_errors_input, format=Format.CSV, errors='skip')
+    assert actual == [['host'], ['a'], ['c'], ['e']]
+
+def test_errors_callable_and_iter_parse():
+    errors = []
+    rows = list(SplunkFormatParser.iter_parse(_errors_input, errors=errors.append))
+    assert [row['host'] for row in rows] == ['a', 'c', 'e']
+    assert len(errors) == 2
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.iter_parse(_errors_input, errors='collect')
+
+def test_errors_types_and_workers():
+    input = '( ( n="1" ) OR ( n="x" ) OR ( n="3" ) )'
+    assert SplunkFormatParser.parse(input, types={'n': 'int'}, errors='skip') == [{'n': 1}, {'n': 3}]
+    actual = SplunkFormatParser.parse(_errors_input, errors='collect', workers=2)
+    expected = SplunkFormatParser.parse(_errors_input, errors='collect')
+    assert actual.data == expected.data
+    assert [vars(error) for error in actual.errors] == [vars(error) for error in expected.errors]
+
+def test_errors_raise_before_rows():
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.parse('[ ( host="a" ) ]', errors='skip')
+    with pytest.raises(SplunkFormatParserException):
+        SplunkFormatParser.parse(_errors_input, errors='ignore')
+
+# Test indexes
+
+_index_input = '( ( host="a" AND "src.ip"="1" AND ( tag="x" OR tag="y" ) ) OR '\
+               '( host="b" AND "src.ip"="2" AND tag="x" ) OR ( host="a" AND "src.ip"="1" ) )'
+
+def test_index_by():
+    actual = SplunkFormatParser.parse(_index_input, index_by=['host', 'tag'])
+    assert isinstance(actual, ParseResult)
+    assert actual.indexes == {'host': {'a': [0, 2], 'b': [1]}, 'tag': {'x': [0, 1], 'y': [0]}}
+    assert actual.distinct is None
+    assert actual.lookup('host', 'b') == [actual.data[1]]
+    assert actual.lookup('host', 'c') == []
+    with pytest.raises(SplunkFormatParserException):
+        actual.lookup('src.ip', '1')
+
+def test_distinct():
+    actual = SplunkFormatParser.parse(_index_input, distinct=['tag', 'src.ip', 'missing'])
+    assert actual.distinct == {'tag': {'x', 'y'}, 'src.ip': {'1', '2'}, 'missing': set()}
+    assert actual.indexes is None
+
+@pytest.mark.parametrize('format,row_type', [
+    (Format.FLAT_JSON, RowType.DICT),
+    (Format.FLAT_JSON, RowType.COMPACT),
+    (Format.JSON, RowType.DICT),
+    (Format.JSON, RowType.LAZY),
+    (Format.CSV, RowType.DICT),
+    (Format.COLUMNAR, RowType.DICT),
+])
+def test_index_by_formats(format, row_type):
+    expected = {'src.ip': {'1': [0, 2], '2': [1]}, 'tag': {'x': [0, 1], 'y': [0]}}
+    if format == Format.CSV:
+        expected = {key: {value: [position + 1 for position in positions]
+                          for value, positions in index.items()}
+                    for key, index in expected.items()}
+    for workers in (1, 2):
+        for result in (_index_input, _index_input.encode()):
+            actual = SplunkFormatParser.parse(result, format=format, row_type=row_type, workers=workers,
+                                              index_by=['src.ip', 'tag'], distinct=['src'])
+            assert actual.indexes == expected
+            assert actual.distinct == {'src': set()}
+            if format != Format.COLUMNAR:
+                assert [actual.data.index(row) for row in actual.lookup('tag', 'x')] == expected['tag']['x']
+
+def test_index_by_types_and_errors():
+    input = '( ( n="1" ) OR ( n="x" ) OR ( n="3" AND ( m="1" OR m="1" ) ) )'
+    actual = SplunkFormatParser.parse(input, types={'n': 'int'}, errors='skip', index_by=['n', 'm'])
+    assert actual.indexes == {'n': {1: [0], 3: [1]}, 'm': {'1': [1]}}
+    actual = SplunkFormatParser.parse(input, types={'n': 'int'}, conversion_errors='str',
+                                      format=Format.COLUMNAR, index_by=['n'])
+    assert actual.indexes == {'n': {1: [0], 'x': [1], 3: [2]}}
+
+# Test iter parse
+
+def test_iter_parse_basic():
+    input = '( ( host="mylaptop" AND source="syslog.log" ) OR '\
+            '( host="bobslaptop" AND source="bob-syslog.log" ) )'
+    expected = [{'host': 'mylaptop', 'source': 'syslog.log'},
+                {'host': 'bobslaptop', 'source': 'bob-syslog.log'}]
+    actual = SplunkFormatParser.iter_parse(input)
+    assert next(actual) == expected[0]
+    assert list(actual) == expected[1:]
+
+def test_iter_parse_empty_res():
+    input = 'NOT()'
+    expected = []
+    actual = list(SplunkFormatParser.iter_parse(input))
+    assert actual == expected
+
+def test_iter_parse_json():
+    input = '[ [ "host.src"="1.1.1.1" && source="log" ] || [ "host.src"="2.2.2.2" ] ]'
+    expected = [{'host': {'src': '1.1.1.1'}, 'source': 'log'},
+                {'host': {'src': '2.2.2.2'}}]
+    actual = list(SplunkFormatParser.iter_parse(input, "[", "[", "&&", "]", "||", "]",
+                                                format=Format.JSON))
+    assert actual == expected
+
+def test_iter_parse_rows_before_exception():
+    input = '( ( host="mylaptop" ) OR ( host="bobslaptop" ) ) )'
+    expected = 'extra data ")" (char 49)'
+
+    actual = SplunkFormatParser.iter_parse(input)
+    assert next(actual) == {'host': 'mylaptop'}
+    assert next(actual) == {'host': 'bobslaptop'}
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        next(actual)
+    assert str(exc_info.value) == expected
+
+def test_iter_parse_raise_csv_exception():
+    expected = 'format "Format.CSV" cannot be streamed'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.iter_parse('', format=Format.CSV)
+    assert str(exc_info.value) == expected
+
+def test_iter_parse_raise_columnar_exception():
+    expected = 'format "Format.COLUMNAR" cannot be streamed'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.iter_parse('', format=Format.COLUMNAR)
+    assert str(exc_info.value) == expected
+
+def test_iter_parse_raise_escape_char_exception():
+    expected = 'escape character can only be 1 character long: "&&"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.iter_parse('', escape_char='&&')
+    assert str(exc_info.value) == expected
+
+# Test dialect
+
+def test_dialect_parse():
+    input = '[ [ host="my""laptop""" && source="syslog.log" ] || [ host="bobslaptop" ] ]'
+    expected = [{'host': 'my"laptop"', 'source': 'syslog.log'}, {'host': 'bobslaptop'}]
+    dialect = SplunkFormatParser.compile("[", "[", "&&", "]", "||", "]", escape_char='"')
+    assert dialect.parse(input) == expected
+    assert list(dialect.iter_parse(input)) == expected
+    assert dialect.parse(input.encode()) == expected
+    assert SplunkFormatParser.parse(input, dialect=dialect) == expected
+
+def test_dialect_parse_format():
+    input = '( ( "host.src"="1.1.1.1" ) )'
+    expected = [['host.src'], ['1.1.1.1']]
+    actual = SplunkFormatParser.compile().parse(input, format=Format.CSV)
+    assert actual == expected
+
+def test_dialect_cached():
+    dialect = SplunkFormatParser.compile(escape_char='"')
+    assert SplunkFormatParser.compile(escape_char='"') is dialect
+    assert Dialect.for_output_mode('csv') is dialect
+    assert Dialect.for_output_mode('json') is SplunkFormatParser.compile()
+
+def test_dialect_incremental():
+    parser = Dialect.for_output_mode('csv').incremental(format=Format.JSON)
+    actual = parser.feed('( ( "host.src"="1.1.""1.1" ) ') + parser.feed(')') + parser.close()
+    assert actual == [{'host': {'src': '1.1."1.1'}}]
+
+def test_dialect_parse_many_process_pool():
+    inputs = ['[ [ host="host%s" ] ]' % i for i in range(10)]
+    expected = [[{'host': 'host%s' % i}] for i in range(10)]
+    dialect = SplunkFormatParser.compile("[", "[", "&&", "]", "||", "]")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        actual = dialect.parse_many(inputs, executor=executor)
+    assert actual == expected
+
+def test_dialect_equal():
+    dialect = Dialect(escape_char='"')
+    assert dialect == Dialect.for_output_mode('csv')
+    assert dialect != Dialect.for_output_mode('json')
+    assert repr(dialect) == 'Dialect(row_prefix=\'(\', column_prefix=\'(\', ' \
+        'column_separator=\'AND\', column_end=\')\', row_separator=\'OR\', ' \
+        'row_end=\')\', mvsep=\'OR\', emptystr=\'NOT()\', escape_char=\'"\')'
+
+def test_raise_dialect_escape_char_exception():
+    expected = 'escape character can only be 1 character long: "&&"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.compile(escape_char='&&')
+    assert str(exc_info.value) == expected
+
+def test_raise_unsupported_output_mode_exception():
+    expected = 'unsupported output mode "xml"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        Dialect.for_output_mode('xml')
+    assert str(exc_info.value) == expected
+
+# Test parse bytes
+
+def test_parse_bytes():
+    input = '( ( host="my\\"läptop\\"" AND ( source="syslog.log.1" OR source="sys\\\\log" ) ) OR '\
+            '( host="bobslaptop" ) )'
+    expected = SplunkFormatParser.parse(input)
+    actual = SplunkFormatParser.parse(input.encode())
+    assert actual == expected
+
+def test_parse_bytes_memoryview():
+    input = b'[ [ host="mylaptop" && source="syslog.log" ] || [ host="bobslaptop" ] ]'
+    expected = [{'host': 'mylaptop', 'source': 'syslog.log'}, {'host': 'bobslaptop'}]
+    actual = SplunkFormatParser.parse(memoryview(input), "[", "[", "&&", "]", "||", "]")
+    assert actual == expected
+
+def test_parse_bytes_encoding():
+    input = '( ( host="my""läptop""" ) )'.encode('latin-1')
+    expected = [{'host': 'my"läptop"'}]
+    actual = SplunkFormatParser.parse(input, escape_char='"', encoding='latin-1')
+    assert actual == expected
+
+def test_parse_bytes_csv():
+    input = b'( ( "host.src"="1.1.1.1" AND source="log" ) OR ( source="log" ) )'
+    expected = [['host.src', 'source'], ['1.1.1.1', 'log'], ['', 'log']]
+    actual = SplunkFormatParser.parse(input, format=Format.CSV)
+    assert actual == expected
+
+def test_parse_file(tmp_path):
+    input = '( ( "host.src"="1.1.1.1" AND source="läptop" ) OR ( "host.src"="2.2.2.2" ) )'
+    expected = [{'host': {'src': '1.1.1.1'}, 'source': 'läptop'},
+                {'host': {'src': '2.2.2.2'}}]
+    path = tmp_path / 'result.txt'
+    path.write_bytes(input.encode())
+    assert SplunkFormatParser.parse_file(path, format=Format.JSON) == expected
+    assert list(SplunkFormatParser.iter_parse_file(path, format=Format.JSON)) == expected
+
+def test_parse_file_empty(tmp_path):
+    path = tmp_path / 'result.txt'
+    path.write_bytes(b'')
+    assert SplunkFormatParser.parse_file(path) == []
+
+def test_raise_bytes_offset_exception():
+    input = '( ( host="läptop" ) ]'.encode()
+    expected = 'expecting keyword ")" but found "]" (char 21)'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(input)
+    assert str(exc_info.value) == expected
+
+def test_raise_bytes_escape_char_exception():
+    expected = 'escape character has to be encoded as 1 byte: "ä"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(b'', escape_char='ä')
+    assert str(exc_info.value) == expected
+
+# Test incremental parser
+
+def test_incremental_parse_chunks():
+    input = '( ( host="my\\"laptop\\\\" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+            '( host="bobslaptop" AND source="bob-syslog.log" ) )'
+    expected = SplunkFormatParser.parse(input)
+    for size in range(1, 10):
+        parser = IncrementalParser()
+        actual = []
+        for i in range(0, len(input), size):
+            actual += parser.feed(input[i:i + size])
+        actual += parser.close()
+        assert actual == expected
+
+def test_incremental_parse_complete_rows():
+    parser = IncrementalParser()
+    assert parser.feed('( ( host="mylap') == []
+    assert parser.feed('top" ) OR ( host="bobs') == [{'host': 'mylaptop'}]
+    assert parser.feed('laptop" ) ') == [{'host': 'bobslaptop'}]
+    assert parser.feed(')') == []
+    assert parser.close() == []
+
+def test_incremental_parse_escape_boundary():
+    parser = IncrementalParser(escape_char='"')
+    actual = parser.feed('( ( host="my"') + parser.feed('"laptop"') + \
+             parser.feed('"" ) )') + parser.close()
+    assert actual == [{'host': 'my"laptop"'}]
+
+@pytest.mark.parametrize('escape_char', ['\\', '"'])
+def test_incremental_parse_long_value(escape_char):
+    value = ('a%s"b%s%s' % (escape_char, escape_char, escape_char)) * 5000
+    input = '( ( host="%s" AND source="log" ) )' % value
+    expected = SplunkFormatParser.parse(input, escape_char=escape_char)
+    parser = IncrementalParser(escape_char=escape_char)
+    actual = []
+    for i in range(0, len(input), 7):
+        actual += parser.feed(input[i:i + 7])
+    actual += parser.close()
+    assert actual == expected
+    assert actual[0]['host'] == 'a"b%s' % escape_char * 5000
+
+@pytest.mark.parametrize('input', [
+    '( ( ( %s ) ) OR ( host="b" ) )' % ' OR '.join('host="h%d"' % i for i in range(20000)),
+    '( ( %s ) OR ( host="b" ) )' % ' AND '.join('f%d="v%d"' % (i, i) for i in range(20000)),
+    '( ( %s ) OR ( host="b" ) )' % ' AND '.join('( f%d="a" OR f%d="b" )' % (i, i)
+                                               for i in range(8000)),
+])
+def test_incremental_parse_long_row(monkeypatch, input):
+    keys = []
+    get_key = IncrementalParser._get_key
+    monkeypatch.setattr(IncrementalParser, '_get_key', lambda self: keys.append(1) or get_key(self))
+    parser = IncrementalParser()
+    actual = []
+    chunks = range(0, len(input), 64)
+    for i in chunks:
+        actual += parser.feed(input[i:i + 64])
+    actual += parser.close()
+    assert actual == SplunkFormatParser.parse(input)
+    # A run resumes at the last complete value, so each chunk reads at most
+    # one key again.
+    assert len(keys) <= input.count('=') + len(chunks)
+
+def test_incremental_parse_row_before_separator():
+    parser = IncrementalParser()
+    assert parser.feed('( ( host="%s" )' % ('a' * 1000)) == []
+    assert parser.feed(' OR') == [{'host': 'a' * 1000}]
+    assert parser.feed(' ( host="b" ) )') == [{'host': 'b'}]
+    assert parser.close() == []
+
+def test_incremental_parse_row_dialect_end():
+    parser = IncrementalParser(dialect=SplunkFormatParser.compile('[', '[', '&&', ']', '||', ']'))
+    assert parser.feed('[ [ host="b" ]') == []
+    assert parser.feed(' ') == [{'host': 'b'}]
+    assert parser.feed(']') == []
+    assert parser.close() == []
+
+def test_incremental_parse_empty_res():
+    parser = IncrementalParser()
+    actual = parser.feed('NO') + parser.feed('T()') + parser.close()
+    assert actual == []
+
+def test_incremental_parse_json():
+    parser = IncrementalParser(format=Format.JSON)
+    actual = parser.feed('( ( "host.src"="1.1.1.1" AND source="log" ) ') + parser.feed(')')
+    actual += parser.close()
+    assert actual == [{'host': {'src': '1.1.1.1'}, 'source': 'log'}]
+
+def test_incremental_parse_raise_offset_exception():
+    input = '( ( host="mylaptop" ) OR ( host="bobslaptop" ) ] '
+    expected = 'expecting keyword ")" but found "]" (char 47)'
+
+    parser = IncrementalParser()
+    assert parser.feed(input[:30]) == [{'host': 'mylaptop'}]
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        parser.feed(input[30:])
+    assert str(exc_info.value) == expected
+
+def test_incremental_parse_raise_truncated_exception():
+    expected = 'expecting keyword ")" but found "None" (char 18)'
+
+    parser = IncrementalParser()
+    assert parser.feed('( ( host="mylaptop"') == []
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        parser.close()
+    assert str(exc_info.value) == expected
+
+def test_incremental_parse_raise_closed_exception():
+    expected = 'parser is already closed'
+
+    parser = IncrementalParser()
+    parser.close()
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        parser.feed('( ')
+    assert str(exc_info.value) == expected
+
+# Test async parse
+
+_async_input = '( ( host="my\\"laptöp" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '\
+               '( host="bobslaptop" AND source="bob-syslog.log" ) )'
+
+async def _chunks(data, size):
+    for i in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[i:i + size]
+
+async def _collect(stream, **kwargs):
+    return [row async for row in SplunkFormatParser.aparse(stream, **kwargs)]
+
+def test_aparse_async_iterator():
+    expected = SplunkFormatParser.parse(_async_input)
+    for size in (1, 3, 1000):
+        assert asyncio.run(_collect(_chunks(_async_input, size))) == expected
+        assert asyncio.run(_collect(_chunks(_async_input.encode(), size))) == expected
+
+def test_aparse_stream_reader():
+    async def parse():
+        reader = asyncio.StreamReader()
+        rows = SplunkFormatParser.aparse(reader, read_size=7)
+        split = _async_input.index(') OR (') + 2
+        reader.feed_data(_async_input[:split].encode())
+        first = await rows.__anext__()
+        reader.feed_data(_async_input[split:].encode())
+        reader.feed_eof()
+        return [first] + [row async for row in rows]
+
+    assert asyncio.run(parse()) == SplunkFormatParser.parse(_async_input)
+
+def test_aparse_local_server():
+    async def parse():
+        async def send(reader, writer):
+            for i in range(0, len(_async_input), 16):
+                writer.write(_async_input[i:i + 16].encode())
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(send, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+            rows = await _collect(reader, fields=['host'])
+            writer.close()
+            return rows
+
+    assert asyncio.run(parse()) == SplunkFormatParser.parse(_async_input, fields=['host'])
+
+def test_aparse_executor():
+    reported = []
+    with ThreadPoolExecutor(1) as executor:
+        actual = asyncio.run(_collect(_chunks(_async_input.encode(), 20), format=Format.JSON,
+                                      executor=executor, offload_size=10,
+                                      stats=reported.append))
+    assert actual == SplunkFormatParser.parse(_async_input, format=Format.JSON)
+    assert reported[0].rows == 2
+
+def test_aparse_raise_process_pool_exception():
+    expected = 'aparse needs a ThreadPoolExecutor, not "ProcessPoolExecutor"'
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(SplunkFormatParserException) as exc_info:
+            asyncio.run(_collect(_chunks(_async_input, 20), executor=executor))
+    assert str(exc_info.value) == expected
+
+def test_aparse_dialect():
+    async def parse(dialect, input):
+        return [row async for row in dialect.aparse(_chunks(input, 4))]
+
+    dialect = SplunkFormatParser.compile(escape_char='"')
+    assert asyncio.run(parse(dialect, '( ( host="my""laptop" ) )')) == [{'host': 'my"laptop'}]
+
+def test_aparse_raise_exception():
+    expected = 'expecting keyword ")" but found "]" (char 47)'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        asyncio.run(_collect(_chunks('( ( host="mylaptop" ) OR ( host="bobslaptop" ) ] ', 5)))
+    assert str(exc_info.value) == expected
+
+# Test parse many
+
+def _many_inputs():
+    inputs = ['( ( host="host%s" AND ( source="log%s.1" OR source="log%s.2" ) ) )'
+              % (i, i, i) for i in range(50)]
+    expected = [[{'host': 'host%s' % i, 'source': ['log%s.1' % i, 'log%s.2' % i]}]
+                for i in range(50)]
+    return inputs, expected
+
+def test_parse_many():
+    inputs, expected = _many_inputs()
+    actual = SplunkFormatParser.parse_many(inputs)
+    assert actual == expected
+
+def test_parse_many_thread_pool():
+    inputs, expected = _many_inputs()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        actual = SplunkFormatParser.parse_many(inputs * 20, executor=executor)
+    assert actual == expected * 20
+
+def test_parse_many_process_pool():
+    inputs, expected = _many_inputs()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        actual = SplunkFormatParser.parse_many(inputs, executor=executor, chunksize=10)
+    assert actual == expected
+
+def test_parse_many_options():
+    inputs = ['[ [ "host.src"="1.1.1.1" ] ]', '[ [ "host.src"="2.2.2.2" ] ]']
+    expected = [[{'host': {'src': '1.1.1.1'}}], [{'host': {'src': '2.2.2.2'}}]]
+    actual = SplunkFormatParser.parse_many(inputs, row_prefix='[', column_prefix='[',
+                                           column_end=']', row_end=']',
+                                           format=Format.JSON)
+    assert actual == expected
+
+def test_parse_concurrent_threads():
+    inputs, expected = _many_inputs()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        actual = list(executor.map(SplunkFormatParser.parse, inputs * 20))
+    assert actual == expected * 20
+
+# Test parallel parse
+
+def _parallel_input():
+    rows = ['( host="host%s" AND source="a ) OR ( b" AND '
+            '( tag="x\\" ) OR ( y" OR tag="z%s" ) )' % (i, i) for i in range(40)]
+    rows.append('( "host.dev"="bobslaptop" )')
+    return '( ' + ' OR '.join(rows) + ' )'
+
+@pytest.mark.parametrize('format', [Format.FLAT_JSON, Format.JSON, Format.CSV])
+def test_parse_parallel(format):
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input, format=format)
+    actual = SplunkFormatParser.parse(input, format=format, workers=4)
+    assert actual == expected
+
+def test_parse_parallel_escape_char():
+    input = _parallel_input().replace('\\"', '""')
+    expected = SplunkFormatParser.parse(input, escape_char='"')
+    actual = SplunkFormatParser.parse(input, escape_char='"', workers=3)
+    assert actual == expected
+
+def test_parse_parallel_columnar():
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input, format=Format.COLUMNAR)
+    actual = SplunkFormatParser.parse(input, format=Format.COLUMNAR, workers=3)
+    assert actual == expected
+
+def test_parse_parallel_bytes():
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input)
+    actual = SplunkFormatParser.parse(input.encode(), workers=2)
+    assert actual == expected
+
+def test_parse_parallel_single_row():
+    input = '( ( host="mylaptop" AND source="a ) OR ( b" ) )'
+    expected = [{'host': 'mylaptop', 'source': 'a ) OR ( b'}]
+    actual = SplunkFormatParser.parse(input, workers=4)
+    assert actual == expected
+
+def test_parse_parallel_raise_exception():
+    input = _parallel_input().replace('host="host30"', 'host=host30')
+    with pytest.raises(SplunkFormatParserException) as expected:
+        SplunkFormatParser.parse(input)
+    with pytest.raises(SplunkFormatParserException) as actual:
+        SplunkFormatParser.parse(input, workers=4)
+    assert str(actual.value) == str(expected.value)
+
+def test_parse_parallel_executor():
+    input = _parallel_input()
+    expected = SplunkFormatParser.parse(input)
+    with ProcessPoolExecutor(2) as executor:
+        for _ in range(2):
+            assert SplunkFormatParser.parse(input, workers=2, executor=executor) == expected
+
+def test_parse_parallel_raise_other_exception():
+    calls = []
+    def convert(value):
+        calls.append(value)
+        raise RuntimeError('broken converter')
+    with ThreadPoolExecutor(2) as executor, pytest.raises(RuntimeError):
+        SplunkFormatParser.parse(_parallel_input(), types={'tag': convert}, workers=2,
+                                 executor=executor)
+    # Only the pieces ran, the result was not parsed again as a whole.
+    assert len(calls) == 2
+
+# Test command line
+
+_cli_input = '( ( host="my\\"laptop" AND ( source="a.log" OR source="b.log" ) ) OR '\
+             '( host="bob" AND "src.ip"="1.1.1.1" ) )\n'
+
+def _write_inputs(tmp_path, count):
+    for i in range(count):
+        (tmp_path / ('result%d.txt' % i)).write_text(_cli_input)
+
+def test_main_ndjson(tmp_path, capsys):
+    _write_inputs(tmp_path, 1)
+    assert main([str(tmp_path / '*.txt')]) == 0
+    out, err = capsys.readouterr()
+    assert out == '{"host": "my\\"laptop", "source": ["a.log", "b.log"]}\n'\
+                  '{"host": "bob", "src.ip": "1.1.1.1"}\n'
+    assert err.startswith('1 files, 2 rows, ') and err.endswith(', 0 errors\n')
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_main_output_dir(tmp_path, capsys, jobs):
+    _write_inputs(tmp_path, 3)
+    (tmp_path / 'bad.txt').write_text('( ( host="a" ) ] ')
+    output_dir = tmp_path / 'out'
+    assert main([str(tmp_path / '*.txt'), '--to', 'csv', '--output-dir', str(output_dir),
+                 '--jobs', str(jobs)]) == 1
+    assert sorted(path.name for path in output_dir.iterdir()) == \
+        ['result0.csv', 'result1.csv', 'result2.csv']
+    assert (output_dir / 'result0.csv').read_text() == \
+        'host,source,src.ip\n"my""laptop","a.log\nb.log",\nbob,,1.1.1.1\n'
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert 'error: %s: expecting keyword ")" but found "]" (char 15)' % (tmp_path / 'bad.txt') in err
+    assert '3 files, 6 rows, ' in err and err.endswith(', 1 errors\n')
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_main_stdout_files(tmp_path, capsys, jobs):
+    _write_inputs(tmp_path, 3)
+    assert main([str(tmp_path / '*.txt'), '--jobs', str(jobs)]) == 0
+    out, err = capsys.readouterr()
+    assert out == '{"host": "my\\"laptop", "source": ["a.log", "b.log"]}\n'\
+                  '{"host": "bob", "src.ip": "1.1.1.1"}\n' * 3
+    assert err.startswith('3 files, 6 rows, ')
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_main_stdout_partial(tmp_path, capsys, jobs):
+    _write_inputs(tmp_path, 1)
+    (tmp_path / 'bad.txt').write_text('( ( host="a" ) OR ( host="b" ) ] ')
+    assert main([str(tmp_path / '*.txt'), '--jobs', str(jobs)]) == 1
+    out, err = capsys.readouterr()
+    # Rows are written as they are parsed, before the error is found, and
+    # are counted, with or without workers.
+    assert '{"host": "a"}\n{"host": "b"}\n' in out
+    assert out.count('\n') == 4
+    assert 'expecting keyword ")" but found "]"' in err
+    assert '1 files, 4 rows, ' in err and err.endswith(', 1 errors\n')
+
+@pytest.mark.parametrize('to, expected', [
+    ('ndjson', '{"host": "my\\"laptop", "source": ["a.log", "b.log"]}\n'
+               '{"host": "bob", "src.ip": "1.1.1.1"}\n'),
+    ('csv', 'host,source,src.ip\r\n"my""laptop","a.log\nb.log",\r\nbob,,1.1.1.1\r\n'),
+])
+def test_main_stdin_chunks(monkeypatch, capsys, to, expected):
+    monkeypatch.setattr('sys.stdin', io.TextIOWrapper(io.BytesIO(_cli_input.encode() + b'\r\n')))
+    monkeypatch.setattr('splunk_format_parser.__main__._STDIN_CHUNK', 3)
+    assert main(['-', '--to', to]) == 0
+    out, err = capsys.readouterr()
+    assert out == expected
+    assert err.startswith('1 files, 2 rows, ')
+
+def test_main_stdin_json(monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.TextIOWrapper(io.BytesIO(_cli_input.encode())))
+    assert main(['--to', 'json', '--field', 'src.ip', '--field', 'host']) == 0
+    out, _ = capsys.readouterr()
+    assert out == '[\n{"host": "my\\"laptop"},\n{"host": "bob", "src": {"ip": "1.1.1.1"}}\n]\n'
+
+def test_main_dialect(tmp_path, capsys):
+    (tmp_path / 'result.txt').write_text('[ [ host="my""laptop" ] ]')
+    assert main([str(tmp_path / 'result.txt'), '--escape-char', '"', '--column-prefix', '[',
+                 '--column-end', ']', '--row-prefix', '[', '--row-end', ']']) == 0
+    assert capsys.readouterr()[0] == '{"host": "my\\"laptop"}\n'
+
+@pytest.mark.parametrize('to', ['json', 'csv'])
+def test_main_several_files_stdout(tmp_path, capsys, to):
+    _write_inputs(tmp_path, 2)
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / '*.txt'), '--to', to])
+    assert 'use --output-dir for --to %s' % to in capsys.readouterr()[1]
+
+def test_main_empty_and_line_breaks(tmp_path, capsys):
+    (tmp_path / 'empty.txt').write_text('')
+    (tmp_path / 'result.txt').write_text(_cli_input + '\r\n\n')
+    assert main([str(tmp_path / '*.txt')]) == 0
+    out, err = capsys.readouterr()
+    assert out.count('\n') == 2
+    assert err.startswith('2 files, 2 rows, ')
+
+def test_main_no_match(tmp_path, capsys):
+    assert main([str(tmp_path / '*.txt')]) == 1
+    assert 'no files match' in capsys.readouterr()[1]
+
+# Test engines
+
+@pytest.mark.parametrize('input, kwargs', [
+    ('( ( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) ) OR '
+     '( "host.dev"="bobslaptop" AND source="bob-syslog.log" ) )', {}),
+    ('( ( host="my\\"lap\\top\\\\" AND source="lone\\ escape" ) )', {}),
+    ('( ( host="""mylaptop""" AND source="" ) )', {'escape_char': '"'}),
+    ('( ( host="&my&"lap&&top&"" ) )', {'escape_char': '&'}),
+    ('[ [ host="mylaptop" && source="syslog.log" ] || [ host="bobslaptop" ] ]',
+     {'row_prefix': '[', 'column_prefix': '[', 'column_separator': '&&',
+      'column_end': ']', 'row_separator': '||', 'row_end': ']'}),
+])
+def test_parse_engines_equal(input, kwargs):
+    expected = SplunkFormatParser.parse(input, engine=Engine.ITERATOR, **kwargs)
+    actual = SplunkFormatParser.parse(input, engine=Engine.SLICE, **kwargs)
+    assert actual == expected
+
+@pytest.mark.parametrize('input', [
+    '( ( host="mylaptop" ) ]',
+    '( ( host="mylaptop"',
+    '( ( host="mylaptop" AND source ) )',
+    '( ( host=mylaptop ) )',
+    '( ( ( source1="syslog.log.1" OR source2="syslog.log.2" ) ) )',
+    '( ( host="mylaptop" ) ) )',
+    'NOT() ',
+])
+def test_parse_engines_equal_exception(input):
+    with pytest.raises(SplunkFormatParserException) as expected:
+        SplunkFormatParser.parse(input, engine=Engine.ITERATOR)
+    with pytest.raises(SplunkFormatParserException) as actual:
+        SplunkFormatParser.parse(input, engine=Engine.SLICE)
+    assert str(actual.value) == str(expected.value)
+
+@pytest.mark.parametrize('engine', list(Engine))
+@pytest.mark.parametrize('input, expected', [
+    ('( ( host="a" ) OR ( ', 'expecting token """ but found "None" (char 21)'),
+    ('( ( host="a" AND ', 'expecting token """ but found "None" (char 18)'),
+    ('( ( ( host="a" OR ', 'expecting token """ but found "None" (char 19)'),
+    ('( ( ho', 'expecting token """ but found "None" (char 7)'),
+    ('( ( host=', 'expecting token """ but found "None" (char 9)'),
+])
+def test_parse_engines_truncated(input, expected, engine):
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse(input, engine=engine)
+    assert str(exc_info.value) == expected
+
+def _prescan_input(rows, row_prefix='( ', row_separator=' OR ', row_end=' )'):
+    # Long enough for Engine.PRESCAN to scan the quotes first.
+    return row_prefix + row_separator.join(rows * 200) + row_end
+
+@pytest.mark.parametrize('input, kwargs', [
+    (_prescan_input(['( host="mylaptop" AND ( source="syslog.log.1" OR source="syslog.log.2" ) )',
+                     '( "host.dev"="bobslaptop" AND source="bob-syslog.log" )',
+                     '( ( host="a" OR host="b" ) AND "src.ip"="10.0.0.1" )']), {}),
+    (_prescan_input(['( host="my\\"lap\\top\\\\" AND source="lone\\ escape" )',
+                     '( host="\\\\\\"" AND source="\\\\" )']), {}),
+    (_prescan_input(['( host="""mylaptop""" AND source="" )', '( host="a""" )']),
+     {'escape_char': '"'}),
+    (_prescan_input(['[ host="mylaptop" && source="syslog.log" ]', '[ host="bobslaptop" ]'],
+                    '[ ', ' || ', ' ]'),
+     {'row_prefix': '[', 'column_prefix': '[', 'column_separator': '&&',
+      'column_end': ']', 'row_separator': '||', 'row_end': ']'}),
+    (_prescan_input(['( host="mylaptop" AND (source="syslog.log" ) )',
+                     '(  host="bobslaptop"  AND  source="bob-syslog.log"  )']), {}),
+])
+@pytest.mark.parametrize('options', [
+    {}, {'format': Format.JSON}, {'format': Format.CSV}, {'format': Format.COLUMNAR},
+    {'fields': ['host']}, {'row_type': RowType.COMPACT}, {'interner': Interner()},
+])
+def test_parse_prescan_equal(input, kwargs, options):
+    pytest.importorskip('numpy')
+    expected = SplunkFormatParser.parse(input, engine=Engine.SLICE, **kwargs, **options)
+    for result in (input, input.encode(), memoryview(input.encode())):
+        actual = SplunkFormatParser.parse(result, engine=Engine.PRESCAN, **kwargs, **options)
+        assert actual == expected
+
+@pytest.mark.parametrize('input', [
+    _prescan_input(['( host="mylaptop" )']) + ' ]',
+    _prescan_input(['( host="mylaptop" )'])[:-4],
+    _prescan_input(['( host="mylaptop" )'] * 50 + ['( host="mylaptop" AND source )']),
+    _prescan_input(['( host="mylaptop" )'] * 50 + ['( host=mylaptop )']),
+    _prescan_input(['( host="mylaptop" )'] * 50 + ['( ( host="a" OR source="b" ) )']),
+    _prescan_input(['( host="mylaptop" )'] * 50 + ['( host="a" AND source="b" ) )']),
+])
+def test_parse_prescan_equal_exception(input):
+    pytest.importorskip('numpy')
+    with pytest.raises(SplunkFormatParserException) as expected:
+        SplunkFormatParser.parse(input, engine=Engine.SLICE)
+    with pytest.raises(SplunkFormatParserException) as actual:
+        SplunkFormatParser.parse(input, engine=Engine.PRESCAN)
+    assert str(actual.value) == str(expected.value)
+
+@pytest.mark.parametrize('window', [1, 3, 64])
+def test_parse_prescan_windows(monkeypatch, tmp_path, window):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr('splunk_format_parser.splunk_format_parser._PRESCAN_CHUNK', window)
+    input = _prescan_input(['( host="my\\"lap\\top\\\\" AND source="lone\\ escape" )',
+                            '( host="\\\\\\"" AND ( source="\\\\" OR source="b" ) )'])
+    expected = SplunkFormatParser.parse(input, engine=Engine.SLICE)
+    assert list(SplunkFormatParser.iter_parse(input, engine=Engine.PRESCAN)) == expected
+    (tmp_path / 'result.txt').write_text(input)
+    assert list(SplunkFormatParser.iter_parse_file(tmp_path / 'result.txt',
+                                                   engine=Engine.PRESCAN)) == expected
+
+def test_parse_prescan_types():
+    pytest.importorskip('numpy')
+    input = _prescan_input(['( count="1" AND host="a" )'] * 50 + ['( count="x" AND host="b" )'])
+    with pytest.raises(SplunkFormatParserException) as expected:
+        SplunkFormatParser.parse(input, types={'count': int})
+    with pytest.raises(SplunkFormatParserException) as actual:
+        SplunkFormatParser.parse(input, engine=Engine.PRESCAN, types={'count': int})
+    assert str(actual.value) == str(expected.value)
+    actual = SplunkFormatParser.parse(input, engine=Engine.PRESCAN, types={'count': int},
+                                      conversion_errors='str')
+    assert actual[0] == {'count': 1, 'host': 'a'}
+    assert actual[50] == {'count': 'x', 'host': 'b'}
+    assert len(actual) == 51 * 200
+
+def test_parse_prescan_without_numpy(monkeypatch):
+    monkeypatch.setattr('splunk_format_parser.splunk_format_parser.numpy', None)
+    input = _prescan_input(['( host="mylaptop" AND source="syslog.log" )'])
+    assert (SplunkFormatParser.parse(input, engine=Engine.PRESCAN)
+            == SplunkFormatParser.parse(input))
+
 # Test exceptions
 
 def test_raise_unsupported_format_exception():
@@ -193,6 +1759,13 @@ def test_raise_unsupported_format_exception():
         SplunkFormatParser.parse('', format='unsupported')
     assert str(exc_info.value) == expected
 
+def test_raise_unsupported_engine_exception():
+    expected = 'unsupported engine "unsupported"'
+
+    with pytest.raises(SplunkFormatParserException) as exc_info:
+        SplunkFormatParser.parse('', engine='unsupported')
+    assert str(exc_info.value) == expected
+
 def test_raise_row_prefix_exception():
     input = '[ ( host="mylaptop" ) )'
     expected = 'expecting keyword "(" but found "[" (char 0)'